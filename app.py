@@ -12,14 +12,29 @@ from components.breathing_exercises import render_breathing_exercises
 from components.psychoeducation import render_psychoeducation
 from utils.data_manager import DataManager
 from utils.crisis_detection import CrisisDetector
+from utils.metrics import start_metrics_server
+from utils.exporter import available_formats, write_export
+from utils.snapshot import open_session_snapshot, restore_session_values
 
-# Initialize session state for anonymous user
+# Expose Prometheus metrics when METRICS_PORT is set (once per process)
+start_metrics_server()
+
+# Initialize session state for anonymous user, picking the session back up
+# from its snapshot if the server restarted since the URL token was issued
+if 'user_id' not in st.session_state:
+    st.session_state.session_snapshot = open_session_snapshot()
+    restore_session_values(st.session_state.session_snapshot.load().values, st.session_state)
 if 'user_id' not in st.session_state:
     st.session_state.user_id = str(uuid.uuid4())
     st.session_state.session_start = datetime.now()
 
 if 'data_manager' not in st.session_state:
-    st.session_state.data_manager = DataManager(st.session_state.user_id)
+    st.session_state.data_manager = DataManager(
+        st.session_state.user_id, snapshot=st.session_state.get("session_snapshot")
+    )
+
+# Pick up changes another replica made to this user's data
+st.session_state.data_manager.refresh()
 
 if 'crisis_detector' not in st.session_state:
     st.session_state.crisis_detector = CrisisDetector()
@@ -66,7 +81,8 @@ page = st.sidebar.selectbox(
         "🫁 Breathing & Mindfulness",
         "📚 Learn About Mental Health",
         "⚙️ Privacy Settings"
-    ]
+    ],
+    key="nav_page"  # set by chat deep links
 )
 
 # Crisis resources always visible
@@ -114,17 +130,42 @@ elif page == "⚙️ Privacy Settings":
         if st.button("📊 View Data Summary"):
             data_summary = st.session_state.data_manager.get_data_summary()
             st.json(data_summary)
+            memory = st.session_state.data_manager.memory_usage()
+            st.caption(f"Held in memory for this session: {memory['total'] / 1024:.0f} KB")
     
     with col2:
+        export_format = st.selectbox("Export format", available_formats())
+        compress_export = st.checkbox("Compress (gzip)")
         if st.button("💾 Export My Data"):
-            export_data = st.session_state.data_manager.export_user_data()
+            export_file, file_name, mime = write_export(
+                st.session_state.data_manager, export_format, compress=compress_export
+            )
             st.download_button(
                 label="Download Data",
-                data=export_data,
-                file_name=f"wellness_data_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json"
+                data=export_file,
+                file_name=file_name,
+                mime=mime
             )
     
+    st.subheader("Restore Data")
+    uploaded_export = st.file_uploader(
+        "Import a previous export (JSON, NDJSON or CSV, optionally gzipped)",
+        type=["json", "ndjson", "csv", "gz"]
+    )
+    if uploaded_export is not None and st.button("📥 Import Data"):
+        with st.spinner("Importing your data..."):
+            report = st.session_state.data_manager.import_user_data(uploaded_export)
+        if report.total:
+            st.success(f"Imported {report.total} records.")
+        else:
+            st.info("No new records found in this file.")
+        if report.duplicates:
+            st.caption(f"Skipped {report.duplicates} records that were already here.")
+        if report.error_count:
+            st.warning(f"{report.error_count} records could not be imported.")
+            with st.expander("Details"):
+                st.text("\n".join(report.errors))
+    
     st.subheader("Privacy Information")
     st.markdown("""
     **How we protect your privacy:**
@@ -154,3 +195,6 @@ st.markdown("""
 💙 Remember: You're not alone. Taking care of your mental health is a sign of strength.
 </div>
 """, unsafe_allow_html=True)
+
+# Snapshot session values changed during this run (e.g. the chat persona)
+st.session_state.data_manager.sync_snapshot()
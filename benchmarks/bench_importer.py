@@ -0,0 +1,113 @@
+"""Restore time for a multi-year export, JSON vs NDJSON, into SQLite.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_importer [--years N]
+"""
+import argparse
+import base64
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from utils.importer import import_file
+from utils.record_cipher import RecordCipher, generate_master_key
+from utils.storage import KINDS, SQLiteBackend
+
+# Daily habits of a heavy user: two mood check-ins, a journal entry and a
+# dozen chat messages
+PER_DAY = {"mood": 2, "journal": 1, "chat": 12}
+
+
+def make_records(years):
+    start = datetime(2021, 1, 1, 8)
+    records = {kind: [] for kind in PER_DAY}
+    for day in range(365 * years):
+        for kind, count in PER_DAY.items():
+            for n in range(count):
+                ts = (start + timedelta(days=day, minutes=37 * n)).isoformat()
+                if kind == "mood":
+                    record = {"timestamp": ts, "overall_mood": day % 10 + 1, "emotions": ["Calm", "Tired"],
+                              "intensity": 4, "triggers": ["Work"], "notes": "Long day but okay."}
+                elif kind == "journal":
+                    record = {"timestamp": ts, "prompt": "What went well today?", "focus_area": "gratitude",
+                              "content": "Walked to work and called my sister. " * 8, "insights": []}
+                else:
+                    record = {"timestamp": ts, "role": "user" if n % 2 == 0 else "assistant",
+                              "content": "That sounds like a lot to carry. " * 3, "persona": None, "risk_level": None}
+                records[kind].append({"id": len(records[kind]), **record})
+    return records
+
+
+def as_json(records):
+    sections = ",\n".join(
+        f'  "{KINDS[kind]}": [\n    ' + ",\n    ".join(json.dumps(r) for r in rows) + "\n  ]"
+        for kind, rows in records.items()
+    )
+    return ('{\n  "export_timestamp": "2024-01-01T00:00:00",\n' + sections + "\n}\n").encode()
+
+
+def as_ndjson(records):
+    lines = [json.dumps({"kind": "export"})]
+    lines.extend(json.dumps({"kind": kind, **r}) for kind, rows in records.items() for r in rows)
+    return ("\n".join(lines) + "\n").encode()
+
+
+class Target:
+    """The slice of DataManager that import_file writes through"""
+
+    def __init__(self, storage, user_id):
+        self.storage = storage
+        self.user_id = user_id
+
+    def count_records(self, kind):
+        return self.storage.count(self.user_id, kind)
+
+    def import_records(self, kind, records):
+        self.storage.append_many(self.user_id, kind, records)
+
+
+def run_import(data, cipher):
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteBackend(os.path.join(tmp, "bench.db"), cipher=cipher)
+        started = time.perf_counter()
+        report = import_file(Target(storage, "bench-user"), io.BytesIO(data))
+        elapsed = time.perf_counter() - started
+        storage.close()
+    return elapsed, report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=3)
+    args = parser.parse_args()
+
+    records = make_records(args.years)
+    total = sum(len(rows) for rows in records.values())
+    cipher = RecordCipher(base64.urlsafe_b64decode(generate_master_key()))
+    print(f"{total} records over {args.years} years")
+    print(f"{'format':>10} {'file MB':>8} {'seconds':>8} {'records/s':>10} {'peak MB':>8}")
+
+    for name, encode in (("json", as_json), ("ndjson", as_ndjson)):
+        for compress in (False, True):
+            data = encode(records)
+            if compress:
+                data = gzip.compress(data)
+            elapsed, report = run_import(data, cipher)
+            assert report.total == total and not report.error_count, report.errors[:3]
+            # Second run under tracemalloc, which slows it down too much to time
+            tracemalloc.start()
+            run_import(data, cipher)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            label = name + (".gz" if compress else "")
+            print(f"{label:>10} {len(data) / 1e6:>8.1f} {elapsed:>8.2f} {total / elapsed:>10.0f} {peak / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Throughput of the PII scrubber on chat-sized and large inputs.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pii_scrubber [--names 5000]
+"""
+import argparse
+import random
+import string
+import timeit
+
+from utils.pii_scrubber import PIIScrubber
+
+WORDS = (
+    "i feel so tired today and my mind keeps racing about work and the exam "
+    "nobody really listens when i try to explain what is going on with me"
+).split()
+
+PII_SAMPLES = [
+    "asha.k@example.com", "+91 98765 43210", "9876543210", "2345 6789 0123",
+    "https://example.org/profile", "@night_owl", "www.example.net",
+]
+
+
+def random_names(count, rng):
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))).title() for _ in range(count)]
+
+
+def make_text(words, names, rng, pii_rate=0.02):
+    out = []
+    for _ in range(words):
+        roll = rng.random()
+        if roll < pii_rate:
+            out.append(rng.choice(PII_SAMPLES))
+        elif names and roll < pii_rate * 2:
+            out.append(rng.choice(names))
+        else:
+            out.append(rng.choice(WORDS))
+    return " ".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=5000, help="gazetteer size")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = random_names(args.names, rng)
+    scrubber = PIIScrubber(names)
+
+    print(f"gazetteer: {len(names)} names")
+    for label, words in (("chat message", 60), ("long message", 600), ("large input", 60_000)):
+        text = make_text(words, names, rng)
+        runs = max(3, 20_000 // words)
+        seconds = min(timeit.repeat(lambda: scrubber.scrub(text), number=runs, repeat=5)) / runs
+        scrubbed, mapping = scrubber.scrub(text)
+        assert scrubber.restore(scrubbed, mapping) == text
+        print(
+            f"{label:>13}: {len(text):>8} chars  {seconds * 1e6:10.1f} µs/call  "
+            f"{len(text) / seconds / 1e6:6.1f} MB/s  {len(mapping)} placeholders"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Fernet vs AES-GCM record encryption at typical record sizes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_record_cipher
+"""
+import base64
+import json
+import random
+import string
+import timeit
+
+from cryptography.fernet import Fernet
+
+from utils.record_cipher import RecordCipher, generate_master_key
+
+# Serialized sizes of a quick mood entry, a short and a long journal entry
+SIZES = (256, 2048, 8192)
+BATCH = 200
+
+
+def make_record(size, rng):
+    record = {"timestamp": "2024-05-01T21:14:03.120044", "focus_area": "emotions", "mood_before": 4}
+    overhead = len(json.dumps(record)) + len(', "content": ""')
+    record["content"] = "".join(rng.choices(string.ascii_letters + " ", k=max(0, size - overhead)))
+    return record
+
+
+def per_record(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main():
+    rng = random.Random(3)
+    fernet = Fernet(Fernet.generate_key())
+    cipher = RecordCipher(base64.urlsafe_b64decode(generate_master_key()))
+
+    print(f"{'size':>6} {'scheme':>14} {'encrypt µs':>11} {'decrypt µs':>11} {'stored bytes':>13}")
+    for size in SIZES:
+        record = make_record(size, rng)
+        batch = [make_record(size, rng) for _ in range(BATCH)]
+
+        token = fernet.encrypt(json.dumps(record).encode())
+        envelope = cipher.encrypt("user", "journal", record)
+        envelopes = cipher.encrypt_many("user", "journal", batch)
+        rows = [
+            ("Fernet", lambda: fernet.encrypt(json.dumps(record).encode()),
+             lambda: json.loads(fernet.decrypt(token)), len(token)),
+            ("AES-GCM", lambda: cipher.encrypt("user", "journal", record),
+             lambda: cipher.decrypt("user", "journal", envelope), len(envelope)),
+            (f"AES-GCM x{BATCH}", lambda: cipher.encrypt_many("user", "journal", batch),
+             lambda: cipher.decrypt_many("user", "journal", envelopes), len(envelope)),
+        ]
+        for scheme, encrypt, decrypt, stored in rows:
+            records = BATCH if "x" in scheme else 1
+            number = max(5, 20_000 // size // records)
+            enc = per_record(encrypt, number) / records
+            dec = per_record(decrypt, number) / records
+            print(f"{size:>6} {scheme:>14} {enc * 1e6:>11.1f} {dec * 1e6:>11.1f} {stored:>13}")
+
+
+if __name__ == "__main__":
+    main()
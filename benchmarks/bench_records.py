@@ -0,0 +1,82 @@
+"""Memory per record: plain dicts vs the slotted record types.
+
+Builds a 10k-entry session of each kind both ways, the dicts decoded from
+JSON the way the SQLite backend used to return them, and reports the
+bytes each record holds on average (the record, its private strings and
+containers; interned names are counted once).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_records [--entries N]
+"""
+import argparse
+import json
+import random
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+from utils.records import RECORD_TYPES
+
+EMOTIONS = ["happy", "sad", "anxious", "calm", "angry", "excited", "frustrated", "grateful", "lonely"]
+TRIGGERS = ["Work/School", "Relationships", "Health", "Family", "Money", "Sleep", "Nothing specific"]
+
+
+def make_dicts(kind, count, rng):
+    start = datetime(2022, 1, 1, 8)
+    rows = []
+    for i in range(count):
+        row = {"id": i, "timestamp": (start + timedelta(minutes=90 * i, microseconds=i)).isoformat()}
+        if kind == "chat":
+            row.update(role="user" if i % 2 == 0 else "assistant", content="How was your day? " * 4,
+                       persona=rng.choice(["peer", "mentor", "therapist"]), risk_level="low" if i % 2 else None)
+        elif kind == "mood":
+            row.update(overall_mood=rng.randint(1, 10), emotions=rng.sample(EMOTIONS, 2), intensity=rng.randint(1, 10),
+                       triggers=rng.sample(TRIGGERS, 1), notes="")
+        elif kind == "journal":
+            row.update(prompt="What went well today?", content="Wrote for a while. " * 10,
+                       focus_area=rng.choice(["gratitude", "self_reflection", "goals", "emotions"]),
+                       mood_before=rng.randint(1, 10), mood_after=rng.randint(1, 10), insights=[])
+        elif kind == "cbt":
+            row.update(situation="Meeting ran late", thoughts="I always mess up", emotions=rng.sample(EMOTIONS, 2),
+                       intensity_before=8, evidence_for="", evidence_against="It went fine last week",
+                       balanced_thought="One late meeting is not a pattern", intensity_after=4, ai_insights=None)
+        elif kind == "crisis":
+            row.update(type=rng.choice(["immediate", "support", "resolved"]), session_id="3f2a9c1e")
+        else:
+            row.update(technique=rng.choice(["Box Breathing", "4-7-8 Breathing", "Belly Breathing"]),
+                       duration=rng.choice(["1 minute", "2 minutes", "5 minutes"]), cycles_completed=rng.randint(3, 12),
+                       relaxation_after=rng.randint(1, 10), anxiety_after=rng.randint(1, 10))
+        rows.append(row)
+    return rows
+
+
+def measure(build):
+    """Bytes still allocated once build() returns, and the result"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=10_000)
+    args = parser.parse_args()
+    rng = random.Random(5)
+
+    print(f"{args.entries} entries per kind")
+    print(f"{'kind':>10} {'dict B':>8} {'slotted B':>10} {'saved':>6} {'to_dict µs':>11}")
+    for kind, record_type in RECORD_TYPES.items():
+        encoded = [json.dumps(row) for row in make_dicts(kind, args.entries, rng)]
+        dict_bytes, dicts = measure(lambda: [json.loads(line) for line in encoded])
+        slotted_bytes, records = measure(lambda: [record_type.from_dict(json.loads(line)) for line in encoded])
+        to_dict = min(timeit.repeat(lambda: [r.to_dict() for r in records[:1000]], number=5, repeat=3)) / 5000
+        per_dict, per_record = dict_bytes / len(dicts), slotted_bytes / len(records)
+        print(f"{kind:>10} {per_dict:>8.0f} {per_record:>10.0f} {1 - per_record / per_dict:>6.0%} {to_dict * 1e6:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
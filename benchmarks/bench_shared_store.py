@@ -0,0 +1,90 @@
+"""Several replicas on one SQLite file: write throughput and consistency.
+
+Starts N worker processes, each standing in for an app replica with its
+own SQLiteBackend (and connection pool) on a shared database file. Every
+worker saves chat messages for the same set of users, so each user's
+writes arrive from all replicas at once. Each write is handed to the next
+worker, which must be able to read it straight away (read-your-writes
+across replicas). At the end, every user must have every message, in
+order, and a version equal to the number of writes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_shared_store [--replicas N] [--writes N]
+"""
+import argparse
+import base64
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from utils.record_cipher import RecordCipher, generate_master_key
+from utils.storage import SQLiteBackend
+
+USERS = 8
+
+
+def worker(index, path, master_key, writes, outbox, inbox, results):
+    storage = SQLiteBackend(path, cipher=RecordCipher(master_key))
+    start = datetime(2024, 1, 1)
+    stale = 0
+    started = time.perf_counter()
+    for n in range(writes):
+        user_id = f"user-{n % USERS}"
+        timestamp = (start + timedelta(microseconds=n * 1000 + index)).isoformat()
+        storage.append(user_id, "chat", {"timestamp": timestamp, "role": "user", "content": f"{index}:{n}"})
+        outbox.put((user_id, timestamp))
+        # A write another replica just finished must already be visible here
+        other_user, other_timestamp = inbox.get()
+        if other_timestamp not in {r["timestamp"] for r in storage.records(other_user, "chat", since=other_timestamp)}:
+            stale += 1
+    results.put((time.perf_counter() - started, stale))
+    storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=500)
+    args = parser.parse_args()
+    master_key = base64.urlsafe_b64decode(generate_master_key())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.db")
+        SQLiteBackend(path).close()  # create the schema once
+        queues = [multiprocessing.Queue() for _ in range(args.replicas)]
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=worker, args=(
+                i, path, master_key, args.writes, queues[(i + 1) % args.replicas], queues[i], results,
+            ))
+            for i in range(args.replicas)
+        ]
+        for process in workers:
+            process.start()
+        outcomes = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+
+        storage = SQLiteBackend(path, cipher=RecordCipher(master_key))
+        total_writes = args.replicas * args.writes
+        for u in range(USERS):
+            user_id = f"user-{u}"
+            records = storage.records(user_id, "chat")
+            expected = args.replicas * len(range(u, args.writes, USERS))
+            timestamps = [r["timestamp"] for r in records]
+            assert len(records) == expected, (user_id, len(records), expected)
+            assert timestamps == sorted(timestamps)
+            assert storage.version(user_id) == expected
+        storage.close()
+
+    elapsed = max(seconds for seconds, _ in outcomes)
+    stale = sum(count for _, count in outcomes)
+    print(f"{args.replicas} replicas x {args.writes} writes over {USERS} shared users")
+    print(f"  {total_writes / elapsed:.0f} writes/s overall, {stale} stale reads")
+
+
+if __name__ == "__main__":
+    main()
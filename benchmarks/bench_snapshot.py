@@ -0,0 +1,64 @@
+"""Cost per saved change: append-only snapshot deltas vs rewriting the state.
+
+Simulates a session saving one mood entry at a time on top of an existing
+history, with the snapshot journaling each save, against writing the whole
+state on every save.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_snapshot [--history N] [--saves N]
+"""
+import argparse
+import tempfile
+import time
+
+from utils.snapshot import SessionSnapshot, new_token
+
+
+def mood(i):
+    return {"id": i, "timestamp": f"2024-01-01T00:00:{i % 60:02d}.{i:06d}", "overall_mood": i % 10 + 1,
+            "emotions": ["calm", "tired"], "intensity": 4, "triggers": ["Work/School"], "notes": "Quick check-in"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, default=2000)
+    parser.add_argument("--saves", type=int, default=2500)
+    args = parser.parse_args()
+    values = {"user_id": "3f2a9c1e-0000-4000-8000-000000000000", "current_persona": "peer"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        records = [mood(i) for i in range(args.history)]
+        snapshot = SessionSnapshot(new_token(), tmp)
+        snapshot.write_base(values, {"mood": records})
+        started = time.perf_counter()
+        compactions = 0
+        for i in range(args.history, args.history + args.saves):
+            records.append(mood(i))
+            if snapshot.append({"op": "append", "kind": "mood", "records": [records[-1]]}):
+                snapshot.write_base(values, {"mood": records})
+                compactions += 1
+        deltas = time.perf_counter() - started
+
+        records = [mood(i) for i in range(args.history)]
+        rewrite = SessionSnapshot(new_token(), tmp)
+        started = time.perf_counter()
+        for i in range(args.history, args.history + args.saves):
+            records.append(mood(i))
+            rewrite.write_base(values, {"mood": records})
+        full = time.perf_counter() - started
+
+        restored = SessionSnapshot(snapshot.token, tmp)
+        started = time.perf_counter()
+        state = restored.load()
+        load = time.perf_counter() - started
+        assert len(state.records["mood"]) == args.history + args.saves
+
+    print(f"{args.saves} saves on a {args.history}-entry history")
+    print(f"  deltas + compaction: {deltas / args.saves * 1e6:8.0f} µs/save ({compactions} compactions)")
+    print(f"  full rewrite:        {full / args.saves * 1e6:8.0f} µs/save")
+    print(f"  restore:             {load * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
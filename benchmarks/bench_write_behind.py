@@ -0,0 +1,81 @@
+"""Save latency: writing straight to SQLite vs through the write-behind queue.
+
+Each simulated click saves one mood entry and then edits it twice (the
+rapid edits a form produces), for several users at once. As in
+DataManager, the entry's id is reserved first with allocate_ids, which
+stays a synchronous transaction even behind the queue. Reports what the
+caller waits per click, and for the queue, how long the final flush and
+sync take and how many writes coalescing saved.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_write_behind [--clicks N] [--users N]
+"""
+import argparse
+import base64
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from utils.record_cipher import RecordCipher, generate_master_key
+from utils.storage import SQLiteBackend
+from utils.write_behind import COALESCED, WriteBehindStore
+
+
+def click(storage, user_id, i, start):
+    record = {"id": storage.allocate_ids(user_id, "mood"), "timestamp": (start + timedelta(seconds=i)).isoformat(),
+              "overall_mood": i % 10 + 1, "emotions": ["calm"], "notes": ""}
+    storage.append(user_id, "mood", record)
+    for note in ("draft", "final"):
+        storage.update(user_id, "mood", {**record, "notes": note})
+
+
+def run(storage, clicks, users):
+    start = datetime(2024, 1, 1)
+    latencies = []
+    for i in range(clicks):
+        started = time.perf_counter()
+        click(storage, f"user-{i % users}", i, start)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"  {name:<14} p50 {statistics.median(latencies) * 1e3:7.3f} ms   p99 {p99 * 1e3:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clicks", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+    cipher = RecordCipher(base64.urlsafe_b64decode(generate_master_key()))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        direct = SQLiteBackend(os.path.join(tmp, "direct.db"), cipher=cipher)
+        direct_latencies = run(direct, args.clicks, args.users)
+        direct.close()
+
+        backend = SQLiteBackend(os.path.join(tmp, "queued.db"), cipher=cipher)
+        queued = WriteBehindStore(backend)
+        queued_latencies = run(queued, args.clicks, args.users)
+        started = time.perf_counter()
+        queued.sync()
+        drain = time.perf_counter() - started
+        stored = sum(backend.count(f"user-{u}", "mood") for u in range(args.users))
+        assert stored == args.clicks, stored
+        queued.close()
+
+    print(f"{args.clicks} clicks (save + 2 edits) over {args.users} users")
+    report("direct", direct_latencies)
+    report("write-behind", queued_latencies)
+    print(f"  final flush + sync {drain * 1e3:.1f} ms, {COALESCED.value():.0f} writes coalesced"
+          f" of {args.clicks * 3}")
+
+
+if __name__ == "__main__":
+    main()
@@ -105,10 +105,6 @@ def render_guided_breathing():
     # Start breathing exercise
     if st.button("🫁 Start Breathing Exercise", type="primary"):
         
-        # Initialize session tracking
-        if 'breathing_sessions' not in st.session_state:
-            st.session_state.breathing_sessions = []
-        
         # Create containers for the exercise
         instruction_container = st.empty()
         progress_container = st.empty()
@@ -132,7 +128,7 @@ def render_guided_breathing():
                 "duration": duration,
                 "cycles_completed": total_cycles
             }
-            st.session_state.breathing_sessions.append(session_data)
+            session_data = st.session_state.data_manager.save_breathing_session(session_data)
             
             st.success(f"🎉 Great job! You completed {total_cycles} cycles of {technique}!")
             st.balloons()
@@ -162,7 +158,7 @@ def render_guided_breathing():
             if st.button("💾 Save Session"):
                 session_data["relaxation_after"] = relaxation_level
                 session_data["anxiety_after"] = anxiety_level
-                st.session_state.breathing_sessions[-1] = session_data
+                st.session_state.data_manager.update_last_breathing_session(session_data)
                 st.success("Session saved!")
             
         except Exception as e:
@@ -484,20 +480,18 @@ IST_TIMEZONE = pytz.timezone('Asia/Kolkata')
 def render_practice_tracking():
     """Track and display breathing/mindfulness practice history"""
     
-    if 'breathing_sessions' not in st.session_state:
-        st.session_state.breathing_sessions = []
-    
-    if not st.session_state.breathing_sessions:
+    sessions = st.session_state.data_manager.get_records("breathing")
+    if not sessions:
         st.info("🌱 Your breathing and mindfulness practice history will appear here!")
         return
     
     st.subheader("📊 Your Practice History")
     
     # Practice statistics
-    total_sessions = len(st.session_state.breathing_sessions)
+    total_sessions = len(sessions)
     total_time = sum(
         {"1 minute": 1, "2 minutes": 2, "5 minutes": 5, "10 minutes": 10}.get(session.get("duration", "1 minute"), 1)
-        for session in st.session_state.breathing_sessions
+        for session in sessions
     )
     
     col1, col2, col3 = st.columns(3)
@@ -510,14 +504,14 @@ def render_practice_tracking():
     
     with col3:
         if total_sessions > 0:
-            avg_per_day = total_sessions / max(1, (datetime.now() - datetime.fromisoformat(st.session_state.breathing_sessions[0]["timestamp"])).days or 1)
+            avg_per_day = total_sessions / max(1, (datetime.now() - datetime.fromisoformat(sessions[0]["timestamp"])).days or 1)
             st.metric("Sessions/Day", f"{avg_per_day:.1f}")
     
     # Recent sessions
     st.markdown("### 📅 Recent Sessions")
     
     recent_sessions = sorted(
-        st.session_state.breathing_sessions,
+        sessions,
         key=lambda x: x["timestamp"],
         reverse=True
     )[:10]
@@ -556,11 +550,11 @@ def render_practice_tracking():
                     st.write(f"**Anxiety Level:** {session['anxiety_after']}/10")
     
     # Practice insights
-    if len(st.session_state.breathing_sessions) >= 5:
+    if len(sessions) >= 5:
         st.markdown("### 💡 Practice Insights")
         
         # Most used technique
-        techniques = [s.get("technique", "Unknown") for s in st.session_state.breathing_sessions]
+        techniques = [s.get("technique", "Unknown") for s in sessions]
         most_common = max(set(techniques), key=techniques.count)
         st.write(f"**Favorite technique:** {most_common}")
         
@@ -570,7 +564,7 @@ def render_practice_tracking():
             st.success("🌟 Great job building a consistent practice!")
         
         # Effectiveness tracking
-        relaxation_scores = [s.get('relaxation_after') for s in st.session_state.breathing_sessions if 'relaxation_after' in s]
+        relaxation_scores = [s.get('relaxation_after') for s in sessions if 'relaxation_after' in s]
         if relaxation_scores:
             avg_relaxation = sum(relaxation_scores) / len(relaxation_scores)
             st.write(f"**Average relaxation level:** {avg_relaxation:.1f}/10")
@@ -109,7 +109,9 @@
 
 import streamlit as st
 from datetime import datetime
-from utils.gemini_client import GeminiClient
+from utils.gemini_client import GeminiUnavailable
+from utils.ai_worker import create_gemini_client
+from utils.llm_scheduler import get_scheduler
 from data.cbt_prompts import CBT_EXERCISES, COGNITIVE_DISTORTIONS
 
 def render_cbt_exercises():
@@ -123,7 +125,7 @@ def render_cbt_exercises():
 
     # Initialize Gemini client
     if 'gemini_client' not in st.session_state:
-        st.session_state.gemini_client = GeminiClient()
+        st.session_state.gemini_client = create_gemini_client()
     
     # Create tabs
     tab1, tab2, tab3, tab4 = st.tabs(
@@ -194,9 +196,11 @@ def render_thought_record():
             ai_insights = {}
             with st.spinner("Getting AI insights..."):
                 try:
-                    ai_insights = st.session_state.gemini_client.generate_cbt_insight(thought_record)
-                    if "balanced_thoughts" in ai_insights and isinstance(ai_insights["balanced_thoughts"], str): 
-                        ai_insights["balanced_thoughts"] = [ai_insights["balanced_thoughts"]]
+                    ai_insights = get_scheduler().run(
+                        st.session_state.gemini_client.generate_cbt_insight, thought_record, feature="cbt"
+                    )
+                    if isinstance(ai_insights, GeminiUnavailable):
+                        ai_insights = {"error": "AI insights are temporarily unavailable. Your record is saved — try again in a moment."}
                 except Exception as e:
                     ai_insights = {"error": f"AI call failed: {e}"}
                     st.warning("AI insights are temporarily unavailable.")
@@ -329,3 +333,22 @@ def render_cbt_progress():
     st.markdown("### Situations Logged")
     for i, record in enumerate(records, 1):
         st.write(f"Record {i}: {record['situation']}")
+
+    st.markdown("### Manage Your Records")
+    for record in reversed(records):
+        record_id = record.get("id")
+        key = f"{record_id}_{record['timestamp']}"
+        with st.expander(f"🧠 {datetime.fromisoformat(record['timestamp']).strftime('%B %d, %Y')} - {(record.get('situation') or '')[:40]}"):
+            st.write(f"**Automatic thought:** {record.get('thoughts') or ''}")
+            balanced_thought = st.text_area(
+                "Balanced thought", value=record.get("balanced_thought") or "", key=f"cbt_balanced_{key}"
+            )
+            col_save, col_delete = st.columns(2)
+            with col_save:
+                if st.button("💾 Save Changes", key=f"cbt_save_{key}"):
+                    st.session_state.data_manager.update("cbt", record_id, {"balanced_thought": balanced_thought})
+                    st.rerun()
+            with col_delete:
+                if st.button("🗑️ Delete Record", key=f"cbt_delete_{key}"):
+                    st.session_state.data_manager.delete_one("cbt", record_id)
+                    st.rerun()
@@ -1,11 +1,30 @@
 # components/chat_interface.py
 
 import streamlit as st # type: ignore
-from utils.gemini_client import GeminiClient
+from utils.gemini_client import GeminiUnavailable
+from utils.ai_worker import create_gemini_client
 from utils.crisis_detection import CrisisDetector
 from utils.data_manager import DataManager
+from utils.llm_scheduler import get_scheduler
+from utils.intent_router import CHAT_TURNS, route_intent
+from utils.local_responder import LOCAL_RESPONDER
+from utils.output_safety import enforce_reply_safety
 import uuid
 
+# Chat messages shown at first, and added by each "Show earlier messages"
+CHAT_PAGE = 50
+
+def _go_to_page(page):
+    """Deep-link callback: switch the sidebar page before the next run"""
+    st.session_state.nav_page = page
+
+def _show_earlier_messages():
+    st.session_state.chat_messages_shown = st.session_state.get("chat_messages_shown", CHAT_PAGE) + CHAT_PAGE
+
+def render_deep_link(route):
+    st.button(f"➡️ Open {route['page']}", key=f"deep_link_{route['intent']}",
+              on_click=_go_to_page, args=(route["page"],))
+
 def render_chat_interface():
     st.header("💬 Chat Support")
     st.markdown("Choose your support style and start a conversation.")
@@ -21,7 +40,7 @@ def render_chat_interface():
     # Initialize Gemini client (show friendly message if missing)
     if 'gemini_client' not in st.session_state:
         try:
-            st.session_state.gemini_client = GeminiClient()
+            st.session_state.gemini_client = create_gemini_client()
         except Exception as e:
             st.error(f"Gemini client init error: {e}")
             st.session_state.gemini_client = None
@@ -48,14 +67,18 @@ def render_chat_interface():
     persona_names = {"peer": "Peer Support", "mentor": "Mentor", "therapist": "Therapist"}
     st.info(f"Current support style: {persona_names.get(st.session_state.current_persona, 'Therapist')}")
     
-    # Chat history display
-    for message in st.session_state.get('chat_history', []):
+    # Chat history display: only the newest messages, which the working set
+    # already holds; older pages are read from storage when asked for
+    shown = st.session_state.get("chat_messages_shown", CHAT_PAGE)
+    messages = st.session_state.data_manager.last_n("chat", shown)
+    if st.session_state.data_manager.count_records("chat") > shown:
+        st.button("⬆️ Show earlier messages", key="chat_show_earlier", on_click=_show_earlier_messages)
+    for message in messages:
         with st.chat_message(message["role"]):
             st.write(message["content"])
 
     # Chat input
     user_input = st.chat_input("What's on your mind?")
-    print("DEBUG-SENDING-TO-GEMINI:", user_input) ##added lines
 
     if user_input:
         # Save user message
@@ -68,32 +91,62 @@ def render_chat_interface():
         risk_assessment = st.session_state.crisis_detector.analyze_text_for_crisis(user_input)
         crisis_detected = st.session_state.crisis_detector.trigger_crisis_intervention(risk_assessment)
         
+        # Exercise requests are answered locally, but only once crisis handling is clear
+        route = None if crisis_detected else route_intent(user_input, risk_assessment["final_risk_level"])
+        if route is not None:
+            CHAT_TURNS.inc(path="local_intent")
+            st.session_state.data_manager.save_chat_message("assistant", route["reply"], persona=st.session_state.current_persona)
+            with st.chat_message("assistant"):
+                st.write(route["reply"])
+                render_deep_link(route)
+            return
+
         conversation_history = st.session_state.data_manager.get_conversation_history()
-        
+        persona = st.session_state.current_persona
+        risk_level = risk_assessment["final_risk_level"]
+
+        degraded = None
         try:
             if st.session_state.gemini_client is None:
                 raise RuntimeError("Gemini client unavailable. Check API key.")
             
-            ai_response = st.session_state.gemini_client.get_empathetic_response(
-                user_input, 
-                st.session_state.current_persona,
-                conversation_history
+            ai_response = get_scheduler().run(
+                st.session_state.gemini_client.get_empathetic_response,
+                user_input,
+                persona,
+                conversation_history,
+                feature="chat",
+                risk_level=risk_level
             )
-            print("DEBUG-GEMINI-RESPONSE:", ai_response) ##added lines
-
-            if crisis_detected:
-                follow_up = st.session_state.crisis_detector.get_crisis_follow_up_message(risk_assessment["final_risk_level"])
-                ai_response = f"{ai_response}\n\n{follow_up}"
-            
-            st.session_state.data_manager.save_chat_message("assistant", ai_response, persona=st.session_state.current_persona)
+            if isinstance(ai_response, GeminiUnavailable):
+                # Breaker open or deadline exceeded: answer locally instead of apologising
+                degraded = LOCAL_RESPONDER.respond(user_input, persona, risk_level, reason=ai_response.reason)
+            else:
+                # Model output never reaches the screen or storage unchecked
+                ai_response, _ = enforce_reply_safety(ai_response)
         except Exception as e:
             st.error(f"Error getting assistant response: {e}")
-            # Save fallback assistant message so user gets something instead of nothing
-            fallback = "Sorry — I'm having trouble generating a response right now. Please try again in a moment."
-            try:
-                st.session_state.data_manager.save_chat_message("assistant", fallback, persona=st.session_state.current_persona)
-            except Exception:
-                pass
+            degraded = LOCAL_RESPONDER.respond(user_input, persona, risk_level, reason="error")
+
+        if degraded is not None:
+            CHAT_TURNS.inc(path="local_degraded")
+            ai_response = degraded["reply"]
+        else:
+            CHAT_TURNS.inc(path="llm")
+
+        if crisis_detected:
+            follow_up = st.session_state.crisis_detector.get_crisis_follow_up_message(risk_level)
+            ai_response = f"{ai_response}\n\n{follow_up}"
+
+        try:
+            st.session_state.data_manager.save_chat_message("assistant", ai_response, persona=persona)
+        except Exception as e:
+            st.error(f"Error saving assistant message: {e}")
+
+        if degraded is not None and degraded["page"]:
+            with st.chat_message("assistant"):
+                st.write(ai_response)
+                render_deep_link(degraded)
 
         # Do not call st.rerun() immediately — let the UI update normally.
 
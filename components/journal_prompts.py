@@ -1,6 +1,8 @@
 import streamlit as st # type: ignore
 from datetime import datetime
-from utils.gemini_client import GeminiClient  # 🌟 CHANGE: Import GeminiClient
+from utils.gemini_client import GeminiUnavailable
+from utils.ai_worker import create_gemini_client
+from utils.prompt_pool import generate_prompt_now, get_prompt_pool, prefetch_journal_prompts
 from data.journal_prompts import JOURNAL_PROMPTS, CBT_PROMPTS
 
 def render_journal_prompts():
@@ -11,7 +13,7 @@ def render_journal_prompts():
     
     # Initialize Gemini client
     if 'gemini_client' not in st.session_state: # 🌟 CHANGE: Client variable name
-        st.session_state.gemini_client = GeminiClient() # 🌟 CHANGE: Use GeminiClient
+        st.session_state.gemini_client = create_gemini_client()
     
     # Create tabs
     tab1, tab2, tab3 = st.tabs(["✍️ New Entry", "📚 Your Entries", "🤖 AI-Personalized"])
@@ -134,6 +136,7 @@ def render_new_journal_entry():
                     "insights": insights
                 }
                 st.session_state.data_manager.save_journal_entry(entry_data)
+                prefetch_journal_prompts()
                 st.success("Journal entry saved! 📖")
                 mood_change = mood_after - mood_before
                 if mood_change > 1:
@@ -149,58 +152,91 @@ def render_new_journal_entry():
 
 def render_journal_history():
     """Display previous journal entries"""
-    if not st.session_state.get('journal_entries'):
+    entries = st.session_state.data_manager.get_records("journal")
+    if not entries:
         st.info("📝 Your journal entries will appear here once you start writing!")
         return
     
     st.subheader("📚 Your Journal History")
-    sorted_entries = sorted(st.session_state.journal_entries, key=lambda x: x["timestamp"], reverse=True)
+    sorted_entries = sorted(entries, key=lambda x: x["timestamp"], reverse=True)
     
     for entry in sorted_entries:
-        with st.expander(f"📝 {datetime.fromisoformat(entry['timestamp']).strftime('%B %d, %Y')} - {entry.get('focus_area', 'general').replace('_', ' ').title()}"):
-            st.markdown(f"**Prompt:** {entry.get('prompt', 'Free writing')}")
+        record_id = entry.get('id')
+        key = f"{record_id}_{entry['timestamp']}"
+        with st.expander(f"📝 {datetime.fromisoformat(entry['timestamp']).strftime('%B %d, %Y')} - {(entry.get('focus_area') or 'general').replace('_', ' ').title()}"):
+            st.markdown(f"**Prompt:** {entry.get('prompt') or 'Free writing'}")
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Mood Before", entry.get('mood_before', 0))
+                mood_before = entry.get('mood_before') or 0
+                st.metric("Mood Before", mood_before)
             with col2:
-                mood_change = entry.get('mood_after', 0) - entry.get('mood_before', 0)
-                st.metric("Mood After", entry.get('mood_after', 0), f"{mood_change:+d}")
+                mood_after = entry.get('mood_after') or 0
+                st.metric("Mood After", mood_after, f"{mood_after - mood_before:+d}")
             with col3:
-                st.write(f"**Emotion:** {entry.get('emotional_state', 'N/A')}")
+                st.write(f"**Emotion:** {entry.get('emotional_state') or 'N/A'}")
             st.markdown("**Your Writing:**")
-            st.write(entry.get('content', ''))
+            if st.session_state.get('editing_journal_entry') == record_id:
+                content = st.text_area("Edit your writing", value=entry.get('content') or '', key=f"journal_edit_{key}")
+                col_save, col_cancel = st.columns(2)
+                with col_save:
+                    if st.button("💾 Save Changes", key=f"journal_save_{key}"):
+                        st.session_state.data_manager.update("journal", record_id, {"content": content})
+                        st.session_state.editing_journal_entry = None
+                        st.rerun()
+                with col_cancel:
+                    if st.button("Cancel", key=f"journal_cancel_{key}"):
+                        st.session_state.editing_journal_entry = None
+                        st.rerun()
+            else:
+                st.write(entry.get('content') or '')
             if entry.get('insights'):
                 st.markdown("**Your Insights:**")
                 st.write(entry.get('insights'))
+            col_edit, col_delete = st.columns(2)
+            with col_edit:
+                if st.button("✏️ Edit", key=f"journal_edit_button_{key}"):
+                    st.session_state.editing_journal_entry = record_id
+                    st.rerun()
+            with col_delete:
+                if st.button("🗑️ Delete", key=f"journal_delete_{key}"):
+                    st.session_state.data_manager.delete_one("journal", record_id)
+                    st.rerun()
 
 def render_ai_personalized_prompts():
     """Generate AI-personalized journal prompts based on user data"""
     st.subheader("🤖 AI-Personalized Prompts")
     st.markdown("Get journal prompts tailored to your recent mood patterns and entries.")
     
-    if len(st.session_state.get('mood_entries', [])) < 2 and len(st.session_state.get('journal_entries', [])) < 1:
+    data_manager = st.session_state.data_manager
+    if data_manager.count_records("mood") < 2 and data_manager.count_records("journal") < 1:
         st.info("🔄 **Not enough data yet!** To get personalized prompts, log a few moods or write a journal entry.")
         return
     
+    pool = get_prompt_pool()
     if st.button("✨ Generate Personalized Prompt", type="primary"):
-        with st.spinner("Creating your personalized prompt..."):
-            recent_moods = st.session_state.data_manager.get_recent_mood_data(7)
-            recent_themes = st.session_state.data_manager.get_journal_themes()
-            mood_context = {
-                "recent_average": sum(m["overall_mood"] for m in recent_moods) / len(recent_moods) if recent_moods else 5,
-                "common_emotions": [m.get("emotions", []) for m in recent_moods],
-            }
-            try:
-                # 🌟 CHANGE: Use gemini_client and new method
-                personalized_prompt = st.session_state.gemini_client.generate_personalized_journal_prompt(
-                    mood_context, 
-                    recent_themes[:3]
-                )
-                st.success("✨ Your Personalized Prompt")
-                st.info(f"**{personalized_prompt['prompt']}**")
-                if personalized_prompt.get('follow_up_questions'):
-                    st.markdown("**Consider these follow-up questions:**")
-                    for i, question in enumerate(personalized_prompt['follow_up_questions'], 1):
-                        st.write(f"{i}. {question}")
-            except Exception as e:
-                st.error("Unable to generate personalized prompt right now. Try one of the pre-written prompts instead!")
\ No newline at end of file
+        # Served instantly when a background refill has already run
+        personalized_prompt = pool.take()
+        if personalized_prompt is None:
+            with st.spinner("Creating your personalized prompt..."):
+                try:
+                    personalized_prompt = generate_prompt_now(
+                        st.session_state.gemini_client,
+                        st.session_state.data_manager
+                    )
+                except Exception:
+                    personalized_prompt = {"error": "AI call failed"}
+        # Top up the pool so the next click is a hit
+        prefetch_journal_prompts()
+
+        if isinstance(personalized_prompt, GeminiUnavailable):
+            st.warning("AI prompts are temporarily unavailable. Try again in a moment, or pick one of the pre-written prompts!")
+            return
+        if not personalized_prompt.get('prompt'):
+            st.error("Unable to generate personalized prompt right now. Try one of the pre-written prompts instead!")
+            return
+        st.success("✨ Your Personalized Prompt")
+        st.info(f"**{personalized_prompt['prompt']}**")
+        if personalized_prompt.get('follow_up_questions'):
+            st.markdown("**Consider these follow-up questions:**")
+            for i, question in enumerate(personalized_prompt['follow_up_questions'], 1):
+                st.write(f"{i}. {question}")
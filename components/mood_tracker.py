@@ -3,6 +3,9 @@ import plotly.graph_objects as go # type: ignore
 import plotly.express as px # type: ignore
 from datetime import datetime, timedelta
 import pandas as pd # type: ignore
+from utils.prompt_pool import prefetch_journal_prompts
+from utils.data_manager import RECENT_MOOD_WINDOW
+from utils.exporter import write_export
 
 def render_mood_tracker():
     """Render comprehensive mood tracking interface"""
@@ -112,6 +115,8 @@ def render_mood_entry():
             }
             
             st.session_state.data_manager.save_mood_entry(mood_data)
+            
+            prefetch_journal_prompts()
             st.success("Mood entry saved! 📊")
             st.balloons()
     
@@ -132,6 +137,7 @@ def render_mood_entry():
                 "notes": "Quick check-in: Having a tough day"
             }
             st.session_state.data_manager.save_mood_entry(quick_mood)
+            prefetch_journal_prompts()
             st.success("Quick mood logged!")
     
     with col2:
@@ -144,6 +150,7 @@ def render_mood_entry():
                 "notes": "Quick check-in: Feeling okay"
             }
             st.session_state.data_manager.save_mood_entry(quick_mood)
+            prefetch_journal_prompts()
             st.success("Quick mood logged!")
     
     with col3:
@@ -156,19 +163,21 @@ def render_mood_entry():
                 "notes": "Quick check-in: Having a good day"
             }
             st.session_state.data_manager.save_mood_entry(quick_mood)
+            prefetch_journal_prompts()
             st.success("Quick mood logged!")
 
 def render_mood_trends():
     """Render mood trends and visualizations"""
     
-    if not st.session_state.mood_entries:
+    data_manager = st.session_state.data_manager
+    if not len(data_manager.mood_columns):
         st.info("📈 Start logging your moods to see trends and patterns here!")
         return
     
     st.subheader("📈 Your Mood Trends")
     
     # Get mood trends data
-    trends = st.session_state.data_manager.get_mood_trends()
+    trends = data_manager.get_mood_trends()
     
     if not trends["dates"]:
         st.info("No mood data available yet. Start tracking to see your trends!")
@@ -205,13 +214,13 @@ def render_mood_trends():
     st.plotly_chart(fig, use_container_width=True)
     
     # Recent mood summary
-    recent_moods = st.session_state.data_manager.get_recent_mood_data(7)
+    recent_stats = data_manager.get_mood_stats(days=7)
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if recent_moods:
-            recent_avg = sum(entry["overall_mood"] for entry in recent_moods) / len(recent_moods)
+        if recent_stats["count"]:
+            recent_avg = recent_stats["average"]
             st.metric("7-Day Average", f"{recent_avg:.1f}", f"{recent_avg - trends['average']:.1f}")
         else:
             st.metric("7-Day Average", "No data")
@@ -231,13 +240,8 @@ def render_mood_trends():
     # Emotion frequency chart
     st.subheader("🎭 Most Common Emotions")
     
-    emotion_counts = {}
-    for entry in st.session_state.mood_entries:
-        for emotion in entry.get("emotions", []):
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-    
-    if emotion_counts:
-        emotions_data = list(emotion_counts.items())
+    if len(data_manager.emotion_counts):
+        emotions_data = data_manager.emotion_counts.top()
         if emotions_data:
             emotions_df = pd.DataFrame(emotions_data, columns=["Emotion", "Count"]).sort_values("Count", ascending=True)
             
@@ -255,14 +259,9 @@ def render_mood_trends():
     # Trigger analysis
     st.subheader("🔍 Common Triggers")
     
-    trigger_counts = {}
-    for entry in st.session_state.mood_entries:
-        for trigger in entry.get("triggers", []):
-            trigger_counts[trigger] = trigger_counts.get(trigger, 0) + 1
-    
-    if trigger_counts:
+    if len(data_manager.trigger_counts):
         # Show top 5 triggers
-        sorted_triggers = sorted(trigger_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        sorted_triggers = data_manager.trigger_counts.top(5)
         
         for i, (trigger, count) in enumerate(sorted_triggers, 1):
             st.write(f"{i}. **{trigger}**: {count} times")
@@ -270,18 +269,20 @@ def render_mood_trends():
 def render_mood_insights():
     """Render AI-generated insights about mood patterns"""
     
-    if len(st.session_state.mood_entries) < 3:
+    data_manager = st.session_state.data_manager
+    mood_columns = data_manager.mood_columns
+    if len(mood_columns) < 3:
         st.info("🔍 Log at least 3 mood entries to get personalized insights!")
         return
     
     st.subheader("🧠 Your Mood Insights")
     
     # Calculate some basic insights
-    recent_entries = st.session_state.mood_entries[-10:]  # Last 10 entries
+    lo, hi = mood_columns.window(last=RECENT_MOOD_WINDOW)  # Last 10 entries
+    recent_stats = mood_columns.stats(lo, hi)
     
     # Mood stability
-    mood_values = [entry["overall_mood"] for entry in recent_entries]
-    mood_range = max(mood_values) - min(mood_values)
+    mood_range = recent_stats["max"] - recent_stats["min"]
     
     if mood_range <= 2:
         stability = "Very stable"
@@ -296,36 +297,20 @@ def render_mood_insights():
     st.write(f"**Mood Stability:** {stability_color} {stability}")
     
     # Most common emotions
-    all_emotions = []
-    for entry in recent_entries:
-        all_emotions.extend(entry.get("emotions", []))
-    
-    if all_emotions:
-        emotion_counts = {}
-        for emotion in all_emotions:
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-        
-        top_emotion = max(emotion_counts.items(), key=lambda x: x[1])
+    # Counts over the same last-10 window, maintained on save
+    if len(data_manager.recent_emotion_counts):
+        top_emotion = data_manager.recent_emotion_counts.top(1)[0]
         st.write(f"**Most frequent emotion:** {top_emotion[0].title()} ({top_emotion[1]} times)")
     
     # Trigger patterns
-    all_triggers = []
-    for entry in recent_entries:
-        all_triggers.extend(entry.get("triggers", []))
-    
-    if all_triggers:
-        trigger_counts = {}
-        for trigger in all_triggers:
-            trigger_counts[trigger] = trigger_counts.get(trigger, 0) + 1
-        
-        if trigger_counts:
-            top_trigger = max(trigger_counts.items(), key=lambda x: x[1])
-            st.write(f"**Most common trigger:** {top_trigger[0]} ({top_trigger[1]} times)")
+    if len(data_manager.recent_trigger_counts):
+        top_trigger = data_manager.recent_trigger_counts.top(1)[0]
+        st.write(f"**Most common trigger:** {top_trigger[0]} ({top_trigger[1]} times)")
     
     # Personalized recommendations
     st.subheader("💡 Personalized Recommendations")
     
-    avg_mood = sum(mood_values) / len(mood_values)
+    avg_mood = recent_stats["average"]
     
     if avg_mood < 4:
         st.warning("""
@@ -356,12 +341,11 @@ def render_mood_insights():
     # Data export option
     st.markdown("---")
     if st.button("📊 Export Mood Data"):
-        mood_df = pd.DataFrame(st.session_state.mood_entries)
-        csv = mood_df.to_csv(index=False)
+        mood_csv, _, _ = write_export(data_manager, "csv", kinds=("mood",))
         
         st.download_button(
             label="Download Mood Data CSV",
-            data=csv,
+            data=mood_csv,
             file_name=f"mood_data_{datetime.now().strftime('%Y%m%d')}.csv",
             mime="text/csv"
         )
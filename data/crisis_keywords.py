@@ -156,3 +156,23 @@ SAFETY_PLANNING_ELEMENTS = {
     "environment_safety": "Making your environment safer by removing or restricting access to lethal means",
     "reasons_for_living": "Things that are important to you and worth living for"
 }
+
+# Terms that should never appear in an AI reply, used by the output safety scan
+HARMFUL_OUTPUT_TERMS = {
+    # Only phrases that give or ask for harm instructions: single words like
+    # "method" or "wrists" also turn up in ordinary coping advice
+    "means_methods": [
+        "lethal dose", "fatal dose", "how many pills", "overdose on", "hang yourself",
+        "hanging yourself", "tie a noose", "slit your wrists", "cut your wrists", "drink bleach",
+        "painless way to die", "painless way to kill", "ways to die", "ways to kill yourself",
+        "how to kill yourself", "best way to kill yourself", "jump off a bridge", "jump off a building"
+    ],
+
+    "unsafe_guidance": [
+        "don't call the hotline", "do not call the hotline", "don't call for help", "do not call for help",
+        "don't tell anyone", "do not tell anyone", "keep it a secret", "keep this a secret",
+        "you don't need help", "you do not need help", "you don't need therapy",
+        "you should give up", "you'd be better off dead", "you would be better off dead",
+        "you should end it"
+    ]
+}
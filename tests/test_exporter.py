@@ -0,0 +1,95 @@
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+st = pytest.importorskip("streamlit")
+
+from utils import data_manager  # noqa: E402
+from utils.data_manager import DataManager  # noqa: E402
+from utils.exporter import EXPORT_KINDS, available_formats, write_export  # noqa: E402
+from utils.records import as_dict  # noqa: E402
+from utils.storage import SQLiteBackend  # noqa: E402
+
+SEED = [
+    {"kind": "mood", "timestamp": "2024-01-01T08:00:00", "overall_mood": 4,
+     "emotions": ["anxious", "tired"], "intensity": 7, "triggers": ["work"], "notes": "rough, \"long\" day"},
+    {"kind": "mood", "timestamp": "2024-01-02T08:00:00", "overall_mood": 8, "emotions": ["calm"]},
+    {"kind": "journal", "timestamp": "2024-01-01T21:00:00", "prompt": "What went well?",
+     "content": "Walked home.\nSlept early. 🌙", "focus_area": "gratitude", "mood_before": 4,
+     "mood_after": 6, "insights": {"themes": ["rest"]}},
+    {"kind": "cbt", "timestamp": "2024-01-03T10:00:00", "situation": "Missed a deadline",
+     "thoughts": "I always fail", "emotions": ["shame"], "intensity_before": 8,
+     "balanced_thought": "One miss is not always", "intensity_after": 5},
+    {"kind": "breathing", "timestamp": "2024-01-03T10:30:00", "technique": "box",
+     "duration": "4 min", "cycles_completed": 6, "relaxation_after": 7},
+    {"kind": "chat", "timestamp": "2024-01-04T19:00:00", "role": "user", "content": "hi, can we talk?"},
+    {"kind": "chat", "timestamp": "2024-01-04T19:00:05", "role": "assistant",
+     "content": "Of course.", "persona": "supportive", "risk_level": "low"},
+]
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "wellness.db"))
+    monkeypatch.setattr(data_manager, "get_storage", lambda: backend)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def source(storage, monkeypatch):
+    # The export header summarizes the session
+    monkeypatch.setitem(st.session_state, "session_start", datetime.now())
+    dm = DataManager("export-source-user")
+    upload = "\n".join(json.dumps(record, ensure_ascii=False) for record in [{"kind": "export"}, *SEED])
+    report = dm.import_user_data(io.BytesIO(upload.encode()))
+    assert report.total == len(SEED) and not report.error_count
+    return dm
+
+
+def contents(dm):
+    """Every exported kind's records, minus ids and empty fields"""
+    return {
+        kind: [
+            {key: value for key, value in as_dict(record).items()
+             if key != "id" and value not in (None, "", [], ())}
+            for record in dm.get_records(kind)
+        ]
+        for kind in EXPORT_KINDS
+    }
+
+
+@pytest.mark.parametrize("compress", [False, True], ids=["plain", "gzip"])
+@pytest.mark.parametrize("fmt", ["json", "ndjson", "csv"])
+def test_export_reads_back_through_the_importer(source, fmt, compress):
+    out, file_name, mime = write_export(source, fmt, compress=compress)
+    payload = out.read()
+    out.close()
+    assert file_name.endswith(f".{fmt}.gz" if compress else f".{fmt}")
+    assert (payload[:2] == b"\x1f\x8b") == compress
+    assert (mime == "application/gzip") == compress
+
+    restored = DataManager(f"export-restored-{fmt}-{compress}")
+    report = restored.import_user_data(io.BytesIO(payload))
+
+    assert not report.error_count, report.errors
+    assert report.total == len(SEED)
+    assert contents(restored) == contents(source)
+
+
+def test_json_export_is_one_document(source):
+    out, _, _ = write_export(source, "json", compress=True)
+    with gzip.GzipFile(fileobj=out) as stream:
+        document = json.load(stream)
+    out.close()
+    assert len(document["mood_entries"]) == 2
+    assert document["data_notice"]
+
+
+def test_unknown_format_is_rejected(source):
+    assert {"json", "ndjson", "csv"} <= set(available_formats())
+    with pytest.raises(ValueError):
+        write_export(source, "xml")
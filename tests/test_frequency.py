@@ -0,0 +1,17 @@
+from utils.frequency import FrequencyTable, SlidingWindowCounter
+
+
+def test_window_counts_only_the_newest_groups():
+    window = SlidingWindowCounter(2, [["calm"], ["sad", "calm"], ["sad"]])
+
+    assert window.as_dict() == {"calm": 1, "sad": 2}
+    assert window.top(1) == [("sad", 2)]
+    assert len(window) == 2
+
+
+def test_rebuild_matches_a_fresh_count():
+    window = SlidingWindowCounter(3, [["calm"]] * 5)
+    groups = [["sad"], ["calm", "sad"], ["angry"]]
+    window.rebuild(groups)
+
+    assert window.top() == FrequencyTable(groups).top()
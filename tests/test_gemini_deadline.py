@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("google.generativeai")
+
+from google.genai.errors import ServerError  # noqa: E402
+
+from utils import gemini_client  # noqa: E402
+from utils.gemini_client import (  # noqa: E402
+    FALLBACK_MODEL,
+    MODEL,
+    CircuitBreaker,
+    Deadline,
+    GeminiClient,
+    GeminiTimeout,
+)
+
+
+class Overloaded(ServerError):
+    def __init__(self):
+        Exception.__init__(self)
+
+    def __str__(self):
+        return "503 UNAVAILABLE. The model is overloaded."
+
+
+class OverloadedModel:
+    """Takes a while to fail, like a real overloaded endpoint"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.timeouts = []
+
+    def generate_content(self, prompt, generation_config=None, request_options=None):
+        self.timeouts.append(request_options["timeout"])
+        time.sleep(self.latency)
+        raise Overloaded()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_client, "RETRY_BACKOFF", 0.05)
+    return GeminiClient(breaker=CircuitBreaker())
+
+
+def test_deadline_runs_out_across_retries(client):
+    primary = OverloadedModel(latency=0.1)
+    fallback = OverloadedModel(latency=0.1)
+    client._models = {MODEL: primary, FALLBACK_MODEL: fallback}
+
+    started = time.monotonic()
+    result = client._generate("hello", max_retries=10, deadline=Deadline(0.35), feature="chat")
+    elapsed = time.monotonic() - started
+
+    assert isinstance(result, GeminiTimeout)
+    # Retries stop when the shared budget is spent, not after max_retries
+    assert 2 <= result.attempts < 10
+    assert elapsed < 0.8
+    assert not fallback.timeouts
+    # Each attempt is only offered what is left of the budget
+    assert primary.timeouts == sorted(primary.timeouts, reverse=True)
+    assert primary.timeouts[-1] < 0.35
+
+
+def test_expired_deadline_never_calls_the_model(client):
+    primary = OverloadedModel(latency=0)
+    client._models = {MODEL: primary}
+    deadline = Deadline(0)
+
+    result = client._generate("hello", deadline=deadline, feature="crisis")
+
+    assert isinstance(result, GeminiTimeout)
+    assert result.attempts == 0
+    assert not primary.timeouts
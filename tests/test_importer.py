@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from utils import data_manager  # noqa: E402
+from utils.data_manager import DataManager  # noqa: E402
+from utils.storage import SQLiteBackend  # noqa: E402
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    backend = SQLiteBackend(str(tmp_path / "wellness.db"))
+    monkeypatch.setattr(data_manager, "get_storage", lambda: backend)
+    yield backend
+    backend.close()
+
+
+def upload(*lines):
+    return io.BytesIO("\n".join(['{"kind": "export"}', *lines]).encode())
+
+
+def test_out_of_range_ratings_are_rejected_and_user_reopens(storage):
+    dm = DataManager("import-bounds-user")
+    report = dm.import_user_data(upload(
+        '{"kind": "mood", "timestamp": "2024-01-01T00:00:00", "overall_mood": 300}',
+        '{"kind": "mood", "timestamp": "2024-01-02T00:00:00", "overall_mood": -1}',
+        '{"kind": "mood", "timestamp": "2024-01-03T00:00:00", "overall_mood": "Infinity"}',
+        '{"kind": "mood", "timestamp": "2024-01-04T00:00:00", "overall_mood": 5, "intensity": 1e400}',
+        '{"kind": "journal", "timestamp": "2024-01-05T00:00:00", "content": "x", "mood_after": 11}',
+        '{"kind": "mood", "timestamp": "2024-01-06T00:00:00", "overall_mood": 7, "intensity": 10}',
+    ))
+
+    assert report.error_count == 5
+    assert report.imported["mood"] == 1
+    assert report.imported["journal"] == 0
+
+    reopened = DataManager("import-bounds-user")
+    assert reopened.get_mood_stats()["count"] == 1
+    assert reopened.get_mood_stats()["max"] == 7
+
+
+def test_csv_cells_are_unflattened(storage):
+    dm = DataManager("import-csv-user")
+    report = dm.import_user_data(io.BytesIO("\n".join([
+        "kind,id,timestamp,overall_mood,emotions,content,insights",
+        'mood,3,2024-01-01T09:00:00,6,"anxious; hopeful",,',
+        'journal,4,2024-01-02T09:00:00,,,"line one\nline two","{""themes"": [""work""]}"',
+        "mood,5,2024-01-03T09:00:00,6",
+        "sleep,6,2024-01-04T09:00:00,,,,",
+    ]).encode()))
+
+    assert report.imported == {"mood": 1, "journal": 1, "cbt": 0, "breathing": 0, "chat": 0}
+    assert report.error_count == 2
+    mood = dm.get_records("mood")[0]
+    assert mood["overall_mood"] == 6
+    assert list(mood["emotions"]) == ["anxious", "hopeful"]
+    journal = dm.get_records("journal")[0]
+    assert journal["content"] == "line one\nline two"
+    assert journal["insights"] == {"themes": ["work"]}
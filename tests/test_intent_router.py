@@ -0,0 +1,42 @@
+import pytest
+
+from utils.intent_router import INTENT_PAGES, MAX_INTENT_LENGTH, classify_intent, route_intent
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("can we do a breathing exercise?", "breathing"),
+    ("Let's try box breathing", "breathing"),
+    ("I want to write in my journal", "journal"),
+    ("open journal prompts please", "journal"),
+    ("help me challenge this negative thought", "cbt"),
+    ("ok, thought record", "cbt"),
+])
+def test_navigation_requests_route_to_their_page(text, intent):
+    route = route_intent(text, "low")
+    assert route["intent"] == intent
+    assert route["page"] == INTENT_PAGES[intent]
+    assert route["reply"]
+
+
+@pytest.mark.parametrize("risk_level", ["moderate", "high", "critical"])
+def test_only_fires_at_low_risk(risk_level):
+    assert classify_intent("can we do a breathing exercise?") == "breathing"
+    assert route_intent("can we do a breathing exercise?", risk_level) is None
+
+
+def test_messages_over_the_length_limit_go_to_the_model():
+    request = "can we do a breathing exercise"
+    padded = request + " " * (MAX_INTENT_LENGTH - len(request) - 1) + "?"
+    assert len(padded) == MAX_INTENT_LENGTH
+    assert route_intent(padded, "low")["intent"] == "breathing"
+    assert route_intent(padded + "?", "low") is None
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "my therapist said breathing exercises are dumb but I'm so anxious",
+    "I tried journaling yesterday and it made me cry",
+    "breathing is hard right now",
+])
+def test_passing_mentions_are_not_intents(text):
+    assert route_intent(text, "low") is None
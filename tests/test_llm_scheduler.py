@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("google.generativeai")
+
+from utils.llm_scheduler import (  # noqa: E402
+    BACKGROUND,
+    CRITICAL,
+    INTERACTIVE,
+    LLMScheduler,
+    SchedulerOverloaded,
+)
+
+
+@pytest.fixture
+def gate():
+    gate = threading.Event()
+    yield gate
+    gate.set()
+
+
+def blocked(gate):
+    def fn(deadline=None):
+        gate.wait(10)
+        return "background"
+    return fn
+
+
+def recorder(ran, name):
+    def fn(deadline=None):
+        ran.append(name)
+        return name
+    return fn
+
+
+def shed(future):
+    return future.done() and isinstance(future.exception(), SchedulerOverloaded)
+
+
+def busy_scheduler(gate, **kwargs):
+    """A one-worker scheduler whose worker is held, so every new job queues"""
+    scheduler = LLMScheduler(workers=1, **kwargs)
+    scheduler.submit(CRITICAL, blocked(gate))
+    while scheduler.depth():
+        time.sleep(0.01)
+    return scheduler
+
+
+def test_critical_job_finishes_while_background_jobs_block(gate):
+    scheduler = LLMScheduler(workers=4)
+    background = [scheduler.submit(BACKGROUND, blocked(gate)) for _ in range(6)]
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    result = scheduler.run(lambda deadline=None: "crisis checked", feature="crisis", deadline=4)
+    assert result == "crisis checked"
+    assert time.monotonic() - started < 1
+
+    # Interactive work still has a worker of its own too
+    assert scheduler.run(lambda deadline=None: "reply", feature="chat", deadline=4) == "reply"
+
+    gate.set()
+    assert [future.result(5) for future in background] == ["background"] * 6
+
+
+def test_background_is_rejected_past_its_share_of_the_queue(gate):
+    scheduler = busy_scheduler(gate, max_queue=8, max_background=2)
+    ran = []
+
+    queued = [scheduler.submit(BACKGROUND, recorder(ran, f"bg{i}")) for i in range(3)]
+    assert [shed(future) for future in queued] == [False, False, True]
+    # The rest of the queue stays open to higher classes
+    chat = scheduler.submit(INTERACTIVE, recorder(ran, "chat"))
+    assert scheduler.depth(BACKGROUND) == 2
+    assert scheduler.depth() == 3
+
+    gate.set()
+    assert chat.result(5) == "chat"
+    assert [future.result(5) for future in queued[:2]] == ["bg0", "bg1"]
+    assert ran == ["chat", "bg0", "bg1"]
+
+
+def test_full_queue_evicts_newest_job_of_the_lowest_class(gate):
+    scheduler = busy_scheduler(gate, max_queue=3, max_background=3)
+    ran = []
+    bg1 = scheduler.submit(BACKGROUND, recorder(ran, "bg1"))
+    bg2 = scheduler.submit(BACKGROUND, recorder(ran, "bg2"))
+    chat1 = scheduler.submit(INTERACTIVE, recorder(ran, "chat1"))
+
+    # Background goes first, newest first
+    chat2 = scheduler.submit(INTERACTIVE, recorder(ran, "chat2"))
+    assert shed(bg2) and not bg1.done()
+    crisis1 = scheduler.submit(CRITICAL, recorder(ran, "crisis1"))
+    assert shed(bg1)
+    # Then interactive, again newest first
+    crisis2 = scheduler.submit(CRITICAL, recorder(ran, "crisis2"))
+    assert shed(chat2) and not chat1.done()
+
+    # Nothing ranks below these, so a full queue rejects them outright
+    assert shed(scheduler.submit(BACKGROUND, recorder(ran, "bg3")))
+    assert shed(scheduler.submit(INTERACTIVE, recorder(ran, "chat3")))
+    assert scheduler.depth() == 3
+
+    gate.set()
+    assert [f.result(5) for f in (crisis1, crisis2, chat1)] == ["crisis1", "crisis2", "chat1"]
+    assert ran == ["crisis1", "crisis2", "chat1"]
@@ -0,0 +1,14 @@
+from utils.mood_store import MoodColumns
+
+
+def test_out_of_range_entries_are_left_out():
+    columns = MoodColumns.from_entries([
+        {"id": 0, "timestamp": "2024-01-01T00:00:00", "overall_mood": 4, "intensity": 3},
+        {"id": 1, "timestamp": "2024-01-02T00:00:00", "overall_mood": 300},
+        {"id": 2, "timestamp": "2024-01-03T00:00:00", "overall_mood": 5, "intensity": -1},
+        {"id": 3, "timestamp": "2024-01-04T00:00:00", "overall_mood": float("inf")},
+        {"id": 4, "timestamp": "2024-01-05T00:00:00", "overall_mood": 6},
+    ])
+
+    assert len(columns) == 2
+    assert columns.stats() == {"count": 2, "average": 5.0, "min": 4, "max": 6}
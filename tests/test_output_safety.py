@@ -0,0 +1,30 @@
+import pytest
+
+from utils.output_safety import enforce_reply_safety
+
+BENIGN_REPLIES = [
+    "Try the 5-4-3-2-1 grounding method: name five things you can see.",
+    "As you breathe out, let your shoulders and wrists relax.",
+    "It might feel like it's hopeless right now, but feelings like this do pass.",
+    "There are a few coping methods we could try together, like box breathing.",
+    "Suicide prevention lines are there for you, please do call if things get worse.",
+]
+
+HARMFUL_REPLIES = [
+    "A lethal dose would be around that many.",
+    "Here is how many pills it would take.",
+    "Honestly, you don't need help for this.",
+    "Keep it a secret from your family.",
+]
+
+
+@pytest.mark.parametrize("reply", BENIGN_REPLIES)
+def test_benign_coping_replies_pass_unchanged(reply):
+    assert enforce_reply_safety(reply) == (reply, False)
+
+
+@pytest.mark.parametrize("reply", HARMFUL_REPLIES)
+def test_harm_instructions_are_replaced(reply):
+    safe_reply, flagged = enforce_reply_safety(reply)
+    assert flagged
+    assert safe_reply != reply
@@ -0,0 +1,28 @@
+import pytest
+
+from utils.pii_scrubber import SCRUBBER
+
+
+@pytest.mark.parametrize("text", [
+    "2026-10-19 14",
+    "My appointment is on 2026-10-19 14:30, wish me luck",
+    "Exam on 19/10/2026 1430",
+    "Slept from 19-10-2026 23:15",
+    "my id is 1700000000",
+    "call 2026 10 19 1430",
+    "score: 1 2 3 4 5 6 7 8 9 10",
+    "ISBN 978-3-16-148410-0",
+    "EAN 9780306406157",
+])
+def test_numbers_that_are_not_phone_numbers_are_kept(text):
+    assert SCRUBBER.scrub(text) == (text, {})
+
+
+@pytest.mark.parametrize("phone", [
+    "+91 98765 43210", "+919876543210", "98765-43210", "9876543210", "+1 (415) 555-2671", "+44 20 7946 0958",
+])
+def test_phone_numbers_are_scrubbed_and_restored(phone):
+    scrubbed, mapping = SCRUBBER.scrub(f"Call me on {phone} tonight")
+
+    assert scrubbed == "Call me on [PHONE_1] tonight"
+    assert SCRUBBER.restore(scrubbed, mapping) == f"Call me on {phone} tonight"
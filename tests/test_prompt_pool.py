@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("google.generativeai")
+
+from utils.prompt_pool import JournalPromptPool  # noqa: E402
+
+
+class FakeDataManager:
+    def __init__(self, mood):
+        self.mood = mood
+
+    def get_recent_mood_data(self, days):
+        return [{"overall_mood": self.mood, "emotions": ["tired"]}]
+
+    def get_journal_themes(self):
+        return []
+
+
+class FailingClient:
+    def __init__(self):
+        self.calls = 0
+        self.done = threading.Event()
+
+    def generate_personalized_journal_prompts(self, mood_context, recent_themes, count=5, deadline=None):
+        self.calls += 1
+        self.done.set()
+        raise RuntimeError("503 model overloaded")
+
+
+def wait_for_refill(pool, client):
+    assert client.done.wait(2)
+    client.done.clear()
+    for _ in range(200):
+        with pool._lock:
+            if not pool._inflight:
+                return
+        threading.Event().wait(0.01)
+    raise AssertionError("refill never finished")
+
+
+def test_failed_refill_backs_off_instead_of_requeueing():
+    pool = JournalPromptPool(backoff=60)
+    client = FailingClient()
+    # A mood no other test fills the shared bucket cache for
+    data_manager = FakeDataManager(mood=1)
+
+    pool.refresh(client, data_manager)
+    wait_for_refill(pool, client)
+    assert pool.last_failed_at is not None
+
+    # Reruns while the model is down don't queue more batch jobs
+    for _ in range(5):
+        pool.refresh(client, data_manager)
+    assert client.calls == 1
+
+    # Once the backoff has passed the pool tries again
+    pool.last_failed_at -= 61
+    pool.refresh(client, data_manager)
+    wait_for_refill(pool, client)
+    assert client.calls == 2
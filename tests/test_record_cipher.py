@@ -0,0 +1,62 @@
+import base64
+
+import pytest
+
+pytest.importorskip("cryptography")
+
+from utils.record_cipher import (  # noqa: E402
+    NONCE_SIZE,
+    RecordCipher,
+    RecordDecryptError,
+    generate_master_key,
+)
+
+USER = "cipher-user"
+RECORD = {"timestamp": "2024-01-01T09:00:00", "overall_mood": 6, "notes": "slept badly 😴"}
+
+
+@pytest.fixture
+def cipher():
+    return RecordCipher(base64.urlsafe_b64decode(generate_master_key()))
+
+
+def test_round_trip(cipher):
+    envelope = cipher.encrypt(USER, "mood", RECORD)
+    assert b"slept" not in envelope
+    assert cipher.decrypt(USER, "mood", envelope) == RECORD
+
+    records = [dict(RECORD, overall_mood=rating) for rating in range(1, 6)]
+    envelopes = cipher.encrypt_many(USER, "mood", records)
+    assert len({envelope[1:1 + NONCE_SIZE] for envelope in envelopes}) == len(records)
+    assert cipher.decrypt_many(USER, "mood", envelopes) == records
+
+
+def test_round_trip_survives_a_fresh_key_schedule(cipher):
+    envelope = cipher.encrypt(USER, "mood", RECORD)
+    cipher.forget(USER)
+    assert cipher.decrypt(USER, "mood", envelope) == RECORD
+
+
+@pytest.mark.parametrize("index", [0, 1, NONCE_SIZE + 1, -1])
+def test_tampered_envelope_is_rejected(cipher, index):
+    envelope = bytearray(cipher.encrypt(USER, "mood", RECORD))
+    envelope[index] ^= 0x01
+    with pytest.raises(RecordDecryptError):
+        cipher.decrypt(USER, "mood", envelope)
+
+
+def test_truncated_envelope_is_rejected(cipher):
+    envelope = cipher.encrypt(USER, "mood", RECORD)
+    with pytest.raises(RecordDecryptError):
+        cipher.decrypt(USER, "mood", envelope[:NONCE_SIZE + 16])
+
+
+def test_envelope_is_bound_to_its_user_and_kind(cipher):
+    envelope = cipher.encrypt(USER, "mood", RECORD)
+    with pytest.raises(RecordDecryptError):
+        cipher.decrypt("someone-else", "mood", envelope)
+    with pytest.raises(RecordDecryptError):
+        cipher.decrypt(USER, "journal", envelope)
+    other_key = RecordCipher(base64.urlsafe_b64decode(generate_master_key()))
+    with pytest.raises(RecordDecryptError):
+        other_key.decrypt(USER, "mood", envelope)
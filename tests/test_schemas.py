@@ -0,0 +1,69 @@
+import pytest
+
+from utils.schemas import RECORD_VALIDATORS, VALIDATORS, SchemaError, extract_json
+
+
+@pytest.mark.parametrize("raw", [
+    '{"risk_level": "LOW"}',
+    '```json\n{"risk_level": "LOW"}\n```',
+    'Here is the analysis: {"risk_level": "LOW"} Hope that helps {"not": "this"}',
+    'Sure {not json} {"risk_level": "LOW"}',
+])
+def test_extract_json_finds_the_first_object(raw):
+    assert extract_json(raw) == {"risk_level": "LOW"}
+
+
+@pytest.mark.parametrize("raw", ["", "no json here", '{"unterminated": ', None])
+def test_extract_json_rejects_responses_without_an_object(raw):
+    with pytest.raises(ValueError):
+        extract_json(raw)
+
+
+def test_validator_coerces_and_drops_unknown_keys():
+    result = VALIDATORS["crisis_analysis"]({
+        "risk_level": " moderate ",
+        "keywords_detected": "alone",
+        "analysis": "Some distress",
+        "confidence": 0.9,
+    })
+    assert result == {
+        "risk_level": "MODERATE",
+        "keywords_detected": ["alone"],
+        "analysis": "Some distress",
+    }
+
+
+@pytest.mark.parametrize("value, path", [
+    ({"keywords_detected": [], "analysis": "x"}, ".risk_level"),
+    ({"risk_level": "PANIC", "keywords_detected": [], "analysis": "x"}, ".risk_level"),
+    ({"risk_level": "LOW", "keywords_detected": [["nested"]], "analysis": "x"}, ".keywords_detected[0]"),
+    ({"risk_level": "LOW", "keywords_detected": [], "analysis": {"text": "x"}}, ".analysis"),
+    (["not", "an", "object"], "$"),
+])
+def test_validator_rejects_bad_types(value, path):
+    with pytest.raises(SchemaError) as excinfo:
+        VALIDATORS["crisis_analysis"](value)
+    assert excinfo.value.path == path
+
+
+def test_nested_batch_reports_the_offending_item():
+    with pytest.raises(SchemaError) as excinfo:
+        VALIDATORS["journal_prompt_batch"]({"prompts": [{"prompt": "ok"}, {"follow_up_questions": []}]})
+    assert excinfo.value.path == ".prompts[1].prompt"
+
+
+@pytest.mark.parametrize("rating", [0, 11, -3, "eleven", True, float("nan"), float("inf")])
+def test_record_validator_rejects_out_of_bounds_ratings(rating):
+    with pytest.raises(SchemaError) as excinfo:
+        RECORD_VALIDATORS["mood"]({"timestamp": "2024-01-01T00:00:00", "overall_mood": rating})
+    assert excinfo.value.path == ".overall_mood"
+
+
+def test_record_validator_accepts_ratings_within_bounds():
+    record = RECORD_VALIDATORS["mood"]({"timestamp": "2024-01-01T00:00:00", "overall_mood": "7"})
+    assert record["overall_mood"] == 7
+    assert RECORD_VALIDATORS["breathing"](
+        {"timestamp": "t", "technique": "box", "cycles_completed": 0}
+    )["cycles_completed"] == 0
+    with pytest.raises(SchemaError):
+        RECORD_VALIDATORS["breathing"]({"timestamp": "t", "technique": "box", "cycles_completed": -1})
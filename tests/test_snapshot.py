@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from utils.snapshot import SessionSnapshot, collect_garbage, new_token  # noqa: E402
+
+TTL = 3600
+
+
+def expire(*paths):
+    old = os.path.getmtime(paths[0]) - 2 * TTL
+    for path in paths:
+        os.utime(path, (old, old))
+
+
+def test_expired_snapshot_deletes_the_users_records(tmp_path):
+    snapshot = SessionSnapshot(new_token(), directory=str(tmp_path))
+    snapshot.write_base({"user_id": "expired-user"}, {})
+    fresh = SessionSnapshot(new_token(), directory=str(tmp_path))
+    fresh.write_base({"user_id": "active-user"}, {})
+    expire(snapshot.path, snapshot.user_path)
+
+    deleted = []
+    assert collect_garbage(str(tmp_path), ttl=TTL, delete_user=deleted.append) == 1
+
+    assert deleted == ["expired-user"]
+    assert not os.path.exists(snapshot.path) and not os.path.exists(snapshot.user_path)
+    assert os.path.exists(fresh.path) and os.path.exists(fresh.user_path)
+
+
+def test_failed_delete_is_retried_by_the_next_collection(tmp_path):
+    snapshot = SessionSnapshot(new_token(), directory=str(tmp_path))
+    snapshot.write_base({"user_id": "expired-user"}, {})
+    expire(snapshot.path, snapshot.user_path)
+
+    def storage_down(user_id):
+        raise OSError("database is locked")
+
+    collect_garbage(str(tmp_path), ttl=TTL, delete_user=storage_down)
+    assert os.path.exists(snapshot.user_path)
+
+    deleted = []
+    collect_garbage(str(tmp_path), ttl=TTL, delete_user=deleted.append)
+    assert deleted == ["expired-user"]
+    assert not os.path.exists(snapshot.user_path)
+
+
+def test_reopened_snapshot_survives_collection(tmp_path):
+    token = new_token()
+    snapshot = SessionSnapshot(token, directory=str(tmp_path))
+    snapshot.write_base({"user_id": "reading-user"}, {})
+    expire(snapshot.path, snapshot.user_path)
+    written_at = os.path.getmtime(snapshot.path)
+
+    # The user comes back to read their history and saves nothing
+    SessionSnapshot(token, directory=str(tmp_path)).load()
+
+    deleted = []
+    assert collect_garbage(str(tmp_path), ttl=TTL, now=written_at + TTL + 1, delete_user=deleted.append) == 0
+    assert deleted == []
+    assert os.path.exists(snapshot.path) and os.path.exists(snapshot.user_path)
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("streamlit")
+
+from utils.storage import SQLiteBackend  # noqa: E402
+
+USER = "storage-user"
+
+
+def test_ids_do_not_restart_after_deleting_a_users_data(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "wellness.db"))
+    first = backend.allocate_ids(USER, "mood", 3)
+    for record_id in range(first, first + 3):
+        backend.append(USER, "mood", {"id": record_id, "timestamp": f"2024-01-0{record_id + 1}T00:00:00",
+                                      "overall_mood": 5})
+
+    backend.delete_user(USER)
+
+    assert backend.count(USER, "mood") == 0
+    assert backend.allocate_ids(USER, "mood") == first + 3
+    backend.close()
@@ -0,0 +1,81 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.time_index import TimeIndex
+
+BASE = datetime(2024, 3, 1, 8, 0, 0)
+
+
+def make_records(count, seed):
+    """Records with clustered, sometimes duplicate timestamps, in random order"""
+    rng = random.Random(seed)
+    records = [
+        {
+            "id": record_id,
+            "timestamp": (BASE + timedelta(minutes=rng.randrange(0, 60 * 24 * 30, 7))).isoformat(),
+        }
+        for record_id in range(count)
+    ]
+    rng.shuffle(records)
+    return records
+
+
+def scan(records):
+    """Reference order: by time, ties in insertion order"""
+    return sorted(records, key=lambda record: datetime.fromisoformat(record["timestamp"]))
+
+
+def scan_range(records, start, end):
+    return [
+        record for record in scan(records)
+        if (start is None or datetime.fromisoformat(record["timestamp"]) >= start)
+        and (end is None or datetime.fromisoformat(record["timestamp"]) < end)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_range_matches_a_linear_scan(seed):
+    records = make_records(300, seed)
+    index = TimeIndex(records)
+    rng = random.Random(seed)
+
+    bounds = [None, BASE - timedelta(days=1), BASE + timedelta(days=40)]
+    # Bounds that land exactly on stored timestamps, to check the edges
+    bounds += [datetime.fromisoformat(record["timestamp"]) for record in rng.sample(records, 10)]
+    bounds += [BASE + timedelta(minutes=rng.randrange(0, 60 * 24 * 30)) for _ in range(10)]
+    for start in bounds:
+        for end in bounds:
+            assert list(index.range(start, end)) == scan_range(records, start, end)
+    # String bounds are accepted too
+    start, end = BASE + timedelta(days=3), BASE + timedelta(days=9)
+    assert list(index.range(start.isoformat(), end.isoformat())) == scan_range(records, start, end)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_last_n_matches_a_linear_scan(seed):
+    records = make_records(200, seed)
+    index = TimeIndex(records)
+    ordered = scan(records)
+
+    for n in (-1, 0, 1, 7, 199, 200, 500):
+        expected = ordered[len(ordered) - max(0, min(n, len(ordered))):]
+        assert list(index.last_n(n)) == expected
+    assert list(index.all()) == ordered
+
+
+def test_working_set_matches_the_newest_records_of_a_scan():
+    records = make_records(200, seed=42)
+    # Insert in time order, as records arrive in the app
+    ordered = scan(records)
+    index = TimeIndex(ordered, capacity=50)
+    held = ordered[-50:]
+
+    assert list(index.all()) == held
+    assert index.total == 200 and not index.complete
+    assert list(index.last_n(20)) == held[-20:]
+    start = datetime.fromisoformat(held[10]["timestamp"]) + timedelta(seconds=1)
+    assert index.covers(start)
+    assert list(index.range(start)) == scan_range(held, start, None)
+    assert not index.covers(BASE)
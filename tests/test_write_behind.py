@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from utils.storage import SQLiteBackend  # noqa: E402
+from utils.write_behind import WriteBehindError, WriteBehindStore  # noqa: E402
+
+USER = "write-behind-user"
+
+
+def mood(record_id, rating):
+    return {"id": record_id, "timestamp": f"2024-01-01T00:00:0{record_id}", "overall_mood": rating}
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "wellness.db"))
+    yield backend
+    backend.close()
+
+
+def test_failed_write_stays_queued_and_surfaces_on_read(backend, monkeypatch):
+    store = WriteBehindStore(backend, delay=0.01, retry=0.01)
+    real_append_many = backend.append_many
+    storage_down = [True]
+
+    def flaky_append_many(*args, **kwargs):
+        if storage_down[0]:
+            raise sqlite3.OperationalError("database is locked")
+        return real_append_many(*args, **kwargs)
+
+    monkeypatch.setattr(backend, "append_many", flaky_append_many)
+    store.append(USER, "mood", mood(0, 4))
+    store.update(USER, "mood", mood(0, 6))
+
+    with pytest.raises(WriteBehindError):
+        store.version(USER)
+
+    storage_down[0] = False
+    # The retry lands the write, still counting both writes it stands for
+    assert store.version(USER) == 2
+    assert [record["overall_mood"] for record in store.records(USER, "mood")] == [6]
+    store.close()
+
+
+def test_write_to_a_missing_record_is_dropped(backend):
+    store = WriteBehindStore(backend, delay=0.01)
+    store.update(USER, "mood", mood(1, 5))
+    store.append(USER, "mood", mood(2, 7))
+
+    assert [record["id"] for record in store.records(USER, "mood")] == [2]
+    assert store.version(USER) == 1
+    store.close()
@@ -0,0 +1,303 @@
+import atexit
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from utils.gemini_client import (
+    BREAKER, DEFAULT_DEADLINES, SHORT_CIRCUITS, Deadline, GeminiCircuitOpen, GeminiClient, GeminiTimeout,
+)
+from utils.llm_scheduler import FEATURE_PRIORITY, PRIORITY_RANK
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# "inline" keeps GeminiClient in the Streamlit process (development default);
+# "process" moves every call to a pool of AI worker processes.
+AI_WORKER_MODE = os.environ.get("AI_WORKER_MODE", "inline")
+AI_WORKERS = int(os.environ.get("AI_WORKERS", "2"))
+
+# Public GeminiClient methods a worker will run, and the feature each bills to
+REMOTE_METHODS = {
+    "get_empathetic_response": "chat",
+    "generate_cbt_insight": "cbt",
+    "generate_personalized_journal_prompt": "journal",
+    "generate_personalized_journal_prompts": "journal",
+    "analyze_text_for_crisis": "crisis",
+}
+
+JOB_LATENCY = REGISTRY.histogram(
+    "ai_worker_job_seconds",
+    "Round trip of a job through the AI worker pool",
+    ("method",),
+)
+JOBS = REGISTRY.counter("ai_worker_jobs_total", "Jobs sent to AI worker processes", ("method", "outcome"))
+INFLIGHT = REGISTRY.gauge("ai_worker_jobs_inflight", "Jobs submitted but not yet answered")
+RESTARTS = REGISTRY.counter("ai_worker_restarts_total", "AI worker processes restarted after dying")
+
+# Minimum seconds between restarts of the same worker slot, so a worker that
+# crashes on start-up does not spin
+RESTART_BACKOFF = 5.0
+
+
+class _OutcomeRecorder:
+    """Breaker for a worker's GeminiClient: lets every call through (the
+    parent already checked the real BREAKER) and keeps each call's outcome
+    to send back with the job's result"""
+
+    def __init__(self):
+        self.outcomes = []
+
+    def allow(self):
+        return True
+
+    def record_success(self):
+        self.outcomes.append(True)
+
+    def record_failure(self):
+        self.outcomes.append(False)
+
+    def take(self):
+        outcomes, self.outcomes = self.outcomes, []
+        return outcomes
+
+
+def _next_job(jobs):
+    """Oldest job from the most urgent non-empty queue; ``ready`` has
+    promised one is there, but a put can take a moment to arrive"""
+    while True:
+        for job_queue in jobs:
+            try:
+                return job_queue.get_nowait()
+            except queue.Empty:
+                continue
+        time.sleep(0.001)
+
+
+def _worker_main(jobs, ready, results):
+    """Entry point of an AI worker process: owns one GeminiClient"""
+    breaker = _OutcomeRecorder()
+    try:
+        client = GeminiClient(breaker=breaker)
+    except Exception as e:
+        client = None
+        init_error = f"Gemini client init error: {e}"
+
+    while True:
+        ready.acquire()
+        job = _next_job(jobs)
+        if job is None:
+            break
+        job_id, method, args, kwargs = job
+        deadline = kwargs.get("deadline")
+        if deadline is not None and deadline.expired():
+            # The caller has given up; running it would only spend quota
+            outcome = ("expired", None)
+        elif client is None:
+            outcome = ("error", init_error)
+        else:
+            try:
+                outcome = ("ok", getattr(client, method)(*args, **kwargs))
+            except Exception as e:
+                outcome = ("error", f"{type(e).__name__}: {e}")
+        # Metrics and breaker outcomes belong to the parent, which serves
+        # /metrics and decides whether to call Gemini at all
+        results.put((job_id, *outcome, REGISTRY.drain(), breaker.take()))
+
+
+class AIWorkerPool:
+    """Local job queues served by N worker processes.
+
+    Sessions submit (method, args) and get back a job id. There is one
+    queue per scheduler priority, and a free worker always takes the
+    oldest job of the most urgent priority waiting, so a crisis check
+    never sits behind background work. Jobs whose deadline passed while
+    queued are dropped unrun.
+
+    A dispatcher thread matches results coming back from the workers to
+    pending jobs, and folds the workers' metrics and circuit breaker
+    outcomes into this process's REGISTRY and BREAKER. Workers that die
+    are replaced; the jobs they held time out on the caller's deadline.
+    """
+
+    def __init__(self, workers=AI_WORKERS):
+        # spawn: never fork a process that is running Streamlit's threads
+        self._ctx = mp.get_context("spawn")
+        self._jobs = {priority: self._ctx.Queue() for priority in PRIORITY_RANK}
+        # Counts queued jobs (and shutdown sentinels) across every queue
+        self._ready = self._ctx.Semaphore(0)
+        self._results = self._ctx.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._closed = False
+        self._processes = [self._spawn(i) for i in range(workers)]
+        self._restarted_at = [0.0] * workers
+        self._dispatcher = threading.Thread(target=self._dispatch, name="ai-worker-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def _spawn(self, index):
+        jobs = [self._jobs[priority] for priority in sorted(PRIORITY_RANK, key=PRIORITY_RANK.get)]
+        process = self._ctx.Process(
+            target=_worker_main, args=(jobs, self._ready, self._results),
+            name=f"ai-worker-{index}", daemon=True,
+        )
+        process.start()
+        return process
+
+    def submit(self, method, *args, priority=None, **kwargs):
+        """Queue a GeminiClient call and return its job id. ``priority``
+        defaults to the scheduler's priority for the method's feature."""
+        if method not in REMOTE_METHODS:
+            raise ValueError(f"Not a remote GeminiClient method: {method}")
+        priority = priority or FEATURE_PRIORITY[REMOTE_METHODS[method]]
+        if priority not in PRIORITY_RANK:
+            raise ValueError(f"Unknown priority: {priority}")
+        job_id = next(self._ids)
+        future = Future()
+        future.method = method
+        future.deadline = kwargs.get("deadline")
+        future.submitted_at = time.monotonic()
+        with self._lock:
+            self._pending[job_id] = future
+        INFLIGHT.inc()
+        self._jobs[priority].put((job_id, method, args, kwargs))
+        self._ready.release()
+        return job_id
+
+    def result(self, job_id, timeout=None):
+        """Wait for a job's result; raises concurrent.futures.TimeoutError"""
+        with self._lock:
+            future = self._pending.get(job_id)
+        if future is None:
+            raise KeyError(f"Unknown job id: {job_id}")
+        try:
+            return future.result(timeout=timeout)
+        finally:
+            if future.done():
+                with self._lock:
+                    self._pending.pop(job_id, None)
+
+    def discard(self, job_id):
+        """Forget a job the caller stopped waiting for; a late result is dropped"""
+        with self._lock:
+            future = self._pending.pop(job_id, None)
+        if future is not None and not future.done():
+            INFLIGHT.dec()
+            JOBS.inc(method=future.method, outcome="abandoned")
+
+    def _dispatch(self):
+        while not self._closed:
+            try:
+                job_id, status, payload, metrics, outcomes = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._replace_dead_workers()
+                continue
+            # Even for a job the caller abandoned: the call still happened
+            REGISTRY.merge(metrics)
+            for succeeded in outcomes:
+                if succeeded:
+                    BREAKER.record_success()
+                else:
+                    BREAKER.record_failure()
+            with self._lock:
+                future = self._pending.get(job_id)
+            if future is None:
+                continue
+            INFLIGHT.dec()
+            JOB_LATENCY.observe(time.monotonic() - future.submitted_at, method=future.method)
+            JOBS.inc(method=future.method, outcome=status)
+            if status == "ok":
+                future.set_result(payload)
+            elif status == "expired":
+                deadline = future.deadline
+                future.set_result(GeminiTimeout(REMOTE_METHODS[future.method], deadline.budget, deadline.elapsed(), 0))
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _replace_dead_workers(self):
+        now = time.monotonic()
+        for index, process in enumerate(self._processes):
+            if process.is_alive() or self._closed:
+                continue
+            if now - self._restarted_at[index] >= RESTART_BACKOFF:
+                self._restarted_at[index] = now
+                logger.warning("ai worker %s exited with %s, restarting", process.name, process.exitcode)
+                RESTARTS.inc()
+                self._processes[index] = self._spawn(index)
+
+    def shutdown(self, timeout=5.0):
+        self._closed = True
+        # Sentinels go on the most urgent queue so they are not stuck
+        # behind queued work
+        urgent = min(PRIORITY_RANK, key=PRIORITY_RANK.get)
+        for _ in self._processes:
+            self._jobs[urgent].put(None)
+            self._ready.release()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+class RemoteGeminiClient:
+    """Drop-in for GeminiClient whose calls run in the AI worker pool"""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def _call(self, method, *args, deadline=None, **kwargs):
+        feature = REMOTE_METHODS[method]
+        deadline = Deadline.coerce(deadline, DEFAULT_DEADLINES[feature])
+        if not BREAKER.allow():
+            SHORT_CIRCUITS.inc(feature=feature)
+            return GeminiCircuitOpen(feature)
+        # Deadline uses the monotonic clock, which is shared across processes
+        job_id = self._pool.submit(method, *args, deadline=deadline, **kwargs)
+        try:
+            return self._pool.result(job_id, timeout=deadline.remaining())
+        except FutureTimeout:
+            self._pool.discard(job_id)
+            return GeminiTimeout(feature, deadline.budget, deadline.elapsed(), 0)
+
+    def get_empathetic_response(self, *args, **kwargs):
+        return self._call("get_empathetic_response", *args, **kwargs)
+
+    def generate_cbt_insight(self, *args, **kwargs):
+        return self._call("generate_cbt_insight", *args, **kwargs)
+
+    def generate_personalized_journal_prompt(self, *args, **kwargs):
+        return self._call("generate_personalized_journal_prompt", *args, **kwargs)
+
+    def generate_personalized_journal_prompts(self, *args, **kwargs):
+        return self._call("generate_personalized_journal_prompts", *args, **kwargs)
+
+    def analyze_text_for_crisis(self, *args, **kwargs):
+        return self._call("analyze_text_for_crisis", *args, **kwargs)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Process-wide AI worker pool, started on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AIWorkerPool()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def create_gemini_client():
+    """GeminiClient for this session, in-process or backed by the worker pool"""
+    if AI_WORKER_MODE == "process":
+        if not os.environ.get("GEMINI_API_KEY"):
+            raise EnvironmentError("❌ GEMINI_API_KEY not set.")
+        return RemoteGeminiClient(get_worker_pool())
+    return GeminiClient()
@@ -1,6 +1,8 @@
-import re
 import streamlit as st
-from utils.gemini_client import GeminiClient
+from utils.gemini_client import GeminiUnavailable
+from utils.ai_worker import create_gemini_client
+from utils.llm_scheduler import get_scheduler
+from utils.keyword_matcher import SAFETY_MATCHER
 from data.crisis_keywords import CRISIS_KEYWORDS, SEVERITY_WEIGHTS
 
 
@@ -20,7 +22,7 @@ _CANON_LEVELS = {
 class CrisisDetector:
     def __init__(self):
         try:
-            self.gemini_client = st.session_state.get("gemini_client") or GeminiClient()
+            self.gemini_client = st.session_state.get("gemini_client") or create_gemini_client()
         except Exception:
             self.gemini_client = None
 
@@ -38,9 +40,14 @@ class CrisisDetector:
 
         if self.gemini_client:
             try:
-                result = self.gemini_client.analyze_text_for_crisis(text)
+                result = get_scheduler().run(
+                    self.gemini_client.analyze_text_for_crisis, text, feature="crisis"
+                )
                 if isinstance(result, dict):
                     ai_analysis = result
+                elif isinstance(result, GeminiUnavailable):
+                    # Keyword analysis still runs; only the AI opinion is missing
+                    ai_analysis["analysis"] = f"AI unavailable ({result.reason})"
             except Exception:
                 pass
 
@@ -48,15 +55,11 @@ class CrisisDetector:
         return combined
 
     def _keyword_based_detection(self, text):
-        text_lower = text.lower()
-        detected_keywords = []
-        total_score = 0
-
-        for category, keywords in self.crisis_keywords.items():
-            for keyword in keywords:
-                if re.search(r"\b" + re.escape(keyword) + r"\b", text_lower):
-                    detected_keywords.append((keyword, category))
-                    total_score += self.severity_weights.get(category, 1)
+        # One pass of the shared automaton instead of a regex search per keyword
+        detected_keywords = SAFETY_MATCHER.find(text, categories=self.crisis_keywords)
+        total_score = sum(
+            self.severity_weights.get(category, 1) for _, category in detected_keywords
+        )
 
         if total_score >= 10:
             level = "critical"
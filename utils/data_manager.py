@@ -1,27 +1,153 @@
 import json
+import logging
+import weakref
 import streamlit as st # type: ignore
 from datetime import datetime, timedelta
-from cryptography.fernet import Fernet
-import base64
+from cryptography.fernet import Fernet, InvalidToken
 import os
+from utils.exporter import iter_json
+from utils.importer import import_file
+from utils.frequency import FrequencyTable, SlidingWindowCounter
+from utils.mood_store import MoodColumns
+from utils.records import (
+    RECORD_TYPES, BreathingSession, CBTRecord, ChatMessage, CrisisEvent, JournalEntry, MoodEntry, as_dict,
+    as_record, record_size,
+)
+from utils.snapshot import session_values
+from utils.storage import ARCHIVE_AFTER_DAYS, KINDS, get_storage
+from utils.time_index import TimeIndex, to_epoch
+
+logger = logging.getLogger(__name__)
+
+# Records per kind each session keeps in memory (its working set); older
+# ones are read from storage on demand
+WORKING_SET = int(os.environ.get("WELLNESS_WORKING_SET", 500))
+
+# Size of the "recent entries" window the mood insights are based on
+RECENT_MOOD_WINDOW = 10
+
+
+def _sync_on_session_end(storage, user_id):
+    """Make a finished session's writes durable (see DataManager.__init__)"""
+    try:
+        storage.sync(user_id)
+    except Exception:
+        logger.exception("saving a finished session's writes failed")
+
 
 class DataManager:
-    def __init__(self, user_id):
+    def __init__(self, user_id, snapshot=None):
         self.user_id = user_id
         self.encryption_key = self._get_or_create_encryption_key()
         self.fernet = Fernet(self.encryption_key)
-        
-        # Initialize session state data structures
-        if 'chat_history' not in st.session_state:
-            st.session_state.chat_history = []
-        if 'mood_entries' not in st.session_state:
-            st.session_state.mood_entries = []
-        if 'journal_entries' not in st.session_state:
-            st.session_state.journal_entries = []
-        if 'cbt_records' not in st.session_state:
-            st.session_state.cbt_records = []
-        if 'crisis_events' not in st.session_state:
-            st.session_state.crisis_events = []
+        self.storage = get_storage()
+        if self.storage.persistent:
+            # Streamlit drops a session's state, and this manager with it,
+            # when the session ends: flush and sync its queued writes then.
+            # At shutdown, get_storage's own close does that for everyone.
+            weakref.finalize(self, _sync_on_session_end, self.storage, user_id).atexit = False
+        # SessionSnapshot this session's changes are journaled to, if any
+        self.snapshot = snapshot
+        if snapshot is not None:
+            self._restore_snapshot()
+        # Move long-untouched records to compressed archive segments
+        self.storage.archive(self.user_id, (datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat())
+        self._reload()
+
+    def _reload(self):
+        """Drop the working set and rebuild the summaries from storage"""
+        # Read the version first: a write landing mid-rebuild then shows up
+        # as a newer version on the next refresh
+        self._version = self.storage.version(self.user_id)
+        self._indexes = {}
+        self._build_summaries()
+
+    def _track_write(self, version):
+        """Note the version our own write produced; False if another process
+        also wrote for this user, so the caches can no longer be patched"""
+        if version is None:
+            # Queued by a write-behind store: it will count one version
+            if self._version is not None:
+                self._version += 1
+            return True
+        coherent = self._version is not None and version == self._version + 1
+        self._version = version
+        return coherent
+
+    def refresh(self):
+        """Reload if another replica changed this user's data since we last
+        looked (call once per script run); read-your-writes across replicas"""
+        version = self.storage.version(self.user_id)
+        if version != self._version:
+            self._reload()
+
+    def _restore_snapshot(self):
+        """Put records from a snapshot taken before a restart back into storage"""
+        records, self.snapshot.pending_records = self.snapshot.pending_records, None
+        if not records or self.storage.persistent:
+            return
+        for kind, kind_records in records.items():
+            if kind in KINDS and not self.storage.count(self.user_id, kind):
+                self.storage.append_many(self.user_id, kind, kind_records)
+
+    def _journal(self, op, **fields):
+        """Append a change to the session snapshot, compacting it when due"""
+        if self.snapshot is not None and self.snapshot.append({"op": op, **fields}):
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        """Rewrite the session snapshot as one frame holding the full state"""
+        if self.snapshot is None:
+            return
+        records = {} if self.storage.persistent else {
+            kind: [as_dict(record) for record in self.storage.iter_records(self.user_id, kind)]
+            for kind in KINDS
+        }
+        self.snapshot.write_base(session_values(st.session_state), records)
+
+    def sync_snapshot(self):
+        """Journal session values (persona, ...) changed since the last write"""
+        if self.snapshot is None:
+            return
+        values = session_values(st.session_state)
+        changed = {key: value for key, value in values.items() if self.snapshot.values.get(key) != value}
+        if changed:
+            self._journal("values", values=changed)
+
+    def _build_summaries(self):
+        """Aggregates kept up to date on every save, so pages never recount.
+
+        Built in one streaming pass over the full history, which is never
+        held in memory at once.
+        """
+        # Columnar copy of this user's mood entries for trends and aggregates
+        self.mood_columns = MoodColumns()
+        self.emotion_counts = FrequencyTable()
+        self.trigger_counts = FrequencyTable()
+        for entry in self.storage.iter_records(self.user_id, "mood"):
+            self.mood_columns.append(entry)
+            self.emotion_counts.add(entry.get("emotions", []))
+            self.trigger_counts.add(entry.get("triggers", []))
+        recent = self.last_n("mood", RECENT_MOOD_WINDOW)
+        self.recent_emotion_counts = SlidingWindowCounter(
+            RECENT_MOOD_WINDOW, (entry.get("emotions", []) for entry in recent))
+        self.recent_trigger_counts = SlidingWindowCounter(
+            RECENT_MOOD_WINDOW, (entry.get("triggers", []) for entry in recent))
+        self.theme_counts = FrequencyTable(
+            [entry.get("focus_area", "general")]
+            for entry in self.storage.iter_records(self.user_id, "journal"))
+
+    def _tally_mood(self, entry, newest):
+        self.mood_columns.append(entry)
+        self.emotion_counts.add(entry.get("emotions", []))
+        self.trigger_counts.add(entry.get("triggers", []))
+        if newest:
+            self.recent_emotion_counts.add(entry.get("emotions", []))
+            self.recent_trigger_counts.add(entry.get("triggers", []))
+        else:
+            recent = self.last_n("mood", RECENT_MOOD_WINDOW)
+            self.recent_emotion_counts.rebuild(recent_entry.get("emotions", []) for recent_entry in recent)
+            self.recent_trigger_counts.rebuild(recent_entry.get("triggers", []) for recent_entry in recent)
     
     def _get_or_create_encryption_key(self):
         """Generate or retrieve encryption key for this session"""
@@ -30,175 +156,304 @@ class DataManager:
         return st.session_state.encryption_key
     
     def encrypt_data(self, data):
-        """Encrypt sensitive data"""
+        """Encrypt sensitive data (the Fernet token is already urlsafe base64)"""
         json_data = json.dumps(data).encode()
-        encrypted_data = self.fernet.encrypt(json_data)
-        return base64.b64encode(encrypted_data).decode()
+        return self.fernet.encrypt(json_data).decode()
     
     def decrypt_data(self, encrypted_data):
-        """Decrypt sensitive data"""
+        """Decrypt sensitive data; None if the token is invalid or from another key"""
         try:
-            encrypted_bytes = base64.b64decode(encrypted_data.encode())
-            decrypted_data = self.fernet.decrypt(encrypted_bytes)
-            return json.loads(decrypted_data.decode())
-        except:
+            decrypted_data = self.fernet.decrypt(encrypted_data)
+        except InvalidToken:
             return None
+        return json.loads(decrypted_data)
     
+    def _next_id(self, kind):
+        return self.storage.allocate_ids(self.user_id, kind)
+
+    def _index(self, kind):
+        index = self._indexes.get(kind)
+        if index is None:
+            index = self._indexes[kind] = TimeIndex(
+                self.storage.records(self.user_id, kind, limit=WORKING_SET),
+                capacity=WORKING_SET,
+                total=self.storage.count(self.user_id, kind),
+            )
+        return index
+
+    def _store(self, kind, record):
+        # Load the index before the write so it does not pick the record up twice
+        index = self._index(kind)
+        version = self.storage.append(self.user_id, kind, record)
+        if not self.storage.persistent:
+            self._journal("append", kind=kind, records=[as_dict(record)])
+        if not self._track_write(version):
+            self._reload()
+            return
+        newest = index.add(record)
+        if kind == "mood":
+            self._tally_mood(record, newest)
+        elif kind == "journal":
+            self.theme_counts.add([record.get("focus_area", "general")])
+
+    def range(self, kind, start=None, end=None):
+        """Records with start <= timestamp < end, oldest first: a view of the
+        working set, or a list read from storage when the range reaches
+        further back"""
+        index = self._index(kind)
+        if index.covers(start):
+            return index.range(start, end)
+        since = start.isoformat() if isinstance(start, datetime) else start
+        records = self.storage.records(self.user_id, kind, since=since)
+        if end is None:
+            return records
+        end = to_epoch(end)
+        return [record for record in records if to_epoch(record["timestamp"]) < end]
+
+    def last_n(self, kind, n):
+        """The newest n records, oldest first (see range)"""
+        index = self._index(kind)
+        if index.covers_last(n):
+            return index.last_n(n)
+        return self.storage.records(self.user_id, kind, limit=n)
+
+    def get_records(self, kind, since=None, limit=None):
+        """Records of one kind, oldest first (see StorageBackend.records)"""
+        if limit is not None and since is None:
+            return self.last_n(kind, limit)
+        records = self.range(kind, since)
+        return records if limit is None else records[-limit:] if limit > 0 else records[:0]
+
+    def get(self, kind, record_id):
+        """The record with this id, or None"""
+        index = self._index(kind)
+        record = index.get(record_id)
+        if record is None and not index.complete:
+            record = self.storage.get(self.user_id, kind, record_id)
+        return record
+
+    def update(self, kind, record_id, changes):
+        """Edit fields of one record (its id and timestamp stay); returns the
+        updated record, or raises KeyError if there is no such record"""
+        old = self.get(kind, record_id)
+        if old is None:
+            raise KeyError(record_id)
+        record = RECORD_TYPES[kind].from_dict(
+            {**as_dict(old), **changes, "id": record_id, "timestamp": old["timestamp"]})
+        version = self.storage.update(self.user_id, kind, record)
+        if not self.storage.persistent:
+            self._journal("update", kind=kind, record=as_dict(record))
+        if not self._track_write(version):
+            self._reload()
+            return record
+        self._index(kind).replace(record)
+        if kind == "mood":
+            # MoodColumns is append-only; edits are rare enough to recount
+            self._build_summaries()
+        elif kind == "journal":
+            self.theme_counts.remove([old.get("focus_area", "general")])
+            self.theme_counts.add([record.get("focus_area", "general")])
+        return record
+
+    def delete_one(self, kind, record_id):
+        """Delete one record; raises KeyError if there is no such record"""
+        old = self.get(kind, record_id)
+        if old is None:
+            raise KeyError(record_id)
+        version = self.storage.delete(self.user_id, kind, record_id)
+        if not self.storage.persistent:
+            self._journal("delete", kind=kind, id=record_id)
+        if not self._track_write(version):
+            self._reload()
+            return
+        self._index(kind).remove(record_id)
+        if kind == "mood":
+            self._build_summaries()
+        elif kind == "journal":
+            self.theme_counts.remove([old.get("focus_area", "general")])
+
+    def count_records(self, kind):
+        if kind in self._indexes:
+            return self._indexes[kind].total
+        return self.storage.count(self.user_id, kind)
+
+    def memory_usage(self):
+        """Approximate bytes this session holds in memory, by component"""
+        usage = {
+            f"working_set.{kind}": sum(record_size(record) for record in index.all())
+            for kind, index in self._indexes.items()
+        }
+        usage["mood_columns"] = self.mood_columns.nbytes()
+        usage["total"] = sum(usage.values())
+        return usage
+
     def save_chat_message(self, role, content, persona=None, risk_level=None):
         """Save chat message with optional metadata"""
-        message = {
-            "id": len(st.session_state.chat_history),
-            "timestamp": datetime.now().isoformat(),
-            "role": role,
-            "content": content,
-            "persona": persona,
-            "risk_level": risk_level
-        }
-        st.session_state.chat_history.append(message)
+        message = ChatMessage(
+            id=self._next_id("chat"),
+            timestamp=datetime.now().isoformat(),
+            role=role,
+            content=content,
+            persona=persona,
+            risk_level=risk_level
+        )
+        self._store("chat", message)
     
     def save_mood_entry(self, mood_data):
         """Save mood tracking data"""
-        entry = {
-            "id": len(st.session_state.mood_entries),
-            "timestamp": datetime.now().isoformat(),
-            "overall_mood": mood_data.get("overall_mood"),
-            "emotions": mood_data.get("emotions", []),
-            "intensity": mood_data.get("intensity"),
-            "triggers": mood_data.get("triggers", []),
-            "notes": mood_data.get("notes", "")
-        }
-        st.session_state.mood_entries.append(entry)
+        entry = MoodEntry(
+            id=self._next_id("mood"),
+            timestamp=datetime.now().isoformat(),
+            overall_mood=mood_data.get("overall_mood"),
+            emotions=mood_data.get("emotions", []),
+            intensity=mood_data.get("intensity"),
+            triggers=mood_data.get("triggers", []),
+            notes=mood_data.get("notes", "")
+        )
+        self._store("mood", entry)
     
     def save_journal_entry(self, entry_data):
         """Save journal entry"""
-        entry = {
-            "id": len(st.session_state.journal_entries),
-            "timestamp": datetime.now().isoformat(),
-            "prompt": entry_data.get("prompt"),
-            "content": entry_data.get("content"),
-            "focus_area": entry_data.get("focus_area"),
-            "mood_before": entry_data.get("mood_before"),
-            "mood_after": entry_data.get("mood_after"),
-            "insights": entry_data.get("insights", [])
-        }
-        st.session_state.journal_entries.append(entry)
+        entry = JournalEntry(
+            id=self._next_id("journal"),
+            timestamp=datetime.now().isoformat(),
+            prompt=entry_data.get("prompt"),
+            content=entry_data.get("content"),
+            focus_area=entry_data.get("focus_area"),
+            mood_before=entry_data.get("mood_before"),
+            mood_after=entry_data.get("mood_after"),
+            insights=entry_data.get("insights", [])
+        )
+        self._store("journal", entry)
     
     def save_cbt_record(self, cbt_data):
         """Save CBT thought record"""
-        record = {
-            "id": len(st.session_state.cbt_records),
-            "timestamp": datetime.now().isoformat(),
-            "situation": cbt_data.get("situation"),
-            "thoughts": cbt_data.get("thoughts"),
-            "emotions": cbt_data.get("emotions"),
-            "intensity_before": cbt_data.get("intensity_before"),
-            "evidence_for": cbt_data.get("evidence_for"),
-            "evidence_against": cbt_data.get("evidence_against"),
-            "balanced_thought": cbt_data.get("balanced_thought"),
-            "intensity_after": cbt_data.get("intensity_after"),
-            "ai_insights": cbt_data.get("ai_insights")
-        }
-        st.session_state.cbt_records.append(record)
+        record = CBTRecord(
+            id=self._next_id("cbt"),
+            timestamp=datetime.now().isoformat(),
+            situation=cbt_data.get("situation"),
+            thoughts=cbt_data.get("thoughts"),
+            emotions=cbt_data.get("emotions"),
+            intensity_before=cbt_data.get("intensity_before"),
+            evidence_for=cbt_data.get("evidence_for"),
+            evidence_against=cbt_data.get("evidence_against"),
+            balanced_thought=cbt_data.get("balanced_thought"),
+            intensity_after=cbt_data.get("intensity_after"),
+            ai_insights=cbt_data.get("ai_insights")
+        )
+        self._store("cbt", record)
+
     def get_all_cbt_records(self):
         """Retrieve all saved CBT thought records"""
-# Return the stored CBT records or an empty list if none exist
-        return st.session_state.get('cbt_records', [])
+        return self.get_records("cbt")
+
+    def save_breathing_session(self, session_data):
+        """Save a completed breathing/mindfulness session; returns it as a dict
+        for the post-exercise check-in to fill in"""
+        session = BreathingSession.from_dict(session_data)
+        if session.timestamp is None:
+            session.timestamp = datetime.now().isoformat()
+        session.id = self._next_id("breathing")
+        self._store("breathing", session)
+        return session.to_dict()
+
+    def update_last_breathing_session(self, session_data):
+        """Replace the most recent breathing session (post-exercise check-in)"""
+        session_data = BreathingSession.from_dict(session_data)
+        version = self.storage.replace_last(self.user_id, "breathing", session_data)
+        if not self.storage.persistent:
+            self._journal("replace_last", kind="breathing", record=as_dict(session_data))
+        if not self._track_write(version):
+            self._reload()
+        elif "breathing" in self._indexes:
+            self._indexes["breathing"].replace_last(session_data)
     
     def log_crisis_event(self, crisis_type):
         """Log crisis intervention event (anonymized)"""
-        event = {
-            "id": len(st.session_state.crisis_events),
-            "timestamp": datetime.now().isoformat(),
-            "type": crisis_type,  # "immediate", "support", "resolved"
-            "session_id": self.user_id[:8]  # Truncated for privacy
-        }
-        st.session_state.crisis_events.append(event)
+        event = CrisisEvent(
+            id=self._next_id("crisis"),
+            timestamp=datetime.now().isoformat(),
+            type=crisis_type,  # "immediate", "support", "resolved"
+            session_id=self.user_id[:8]  # Truncated for privacy
+        )
+        self._store("crisis", event)
     
     def get_recent_mood_data(self, days=7):
         """Get mood data from recent days"""
         cutoff_date = datetime.now() - timedelta(days=days)
-        recent_entries = []
-        
-        for entry in st.session_state.mood_entries:
-            entry_date = datetime.fromisoformat(entry["timestamp"])
-            if entry_date >= cutoff_date:
-                recent_entries.append(entry)
-        
-        return recent_entries
+        return self.range("mood", cutoff_date)
     
     def get_mood_trends(self):
         """Analyze mood trends for visualization"""
-        if not st.session_state.mood_entries:
+        lo, hi = self.mood_columns.window(last=30)  # Last 30 entries
+        stats = self.mood_columns.stats(lo, hi)
+        if not stats["count"]:
             return {"dates": [], "moods": [], "average": 5}
         
-        dates = []
-        moods = []
-        
-        for entry in st.session_state.mood_entries[-30:]:  # Last 30 entries
-            dates.append(datetime.fromisoformat(entry["timestamp"]).date())
-            moods.append(entry["overall_mood"])
-        
-        average_mood = sum(moods) / len(moods) if moods else 5
-        
         return {
-            "dates": dates,
-            "moods": moods,
-            "average": round(average_mood, 1)
+            "dates": self.mood_columns.dates(lo, hi),
+            "moods": self.mood_columns.moods(lo, hi),
+            "average": round(stats["average"], 1)
         }
+
+    def get_mood_stats(self, days=None, last=None):
+        """Count, average, min and max mood over the last ``days`` and/or ``last`` entries"""
+        since = datetime.now() - timedelta(days=days) if days is not None else None
+        return self.mood_columns.stats(*self.mood_columns.window(since=since, last=last))
     
     def get_journal_themes(self):
         """Extract common themes from journal entries"""
-        if not st.session_state.journal_entries:
-            return []
-        
-        themes = {}
-        for entry in st.session_state.journal_entries:
-            focus_area = entry.get("focus_area", "general")
-            themes[focus_area] = themes.get(focus_area, 0) + 1
-        
-        return sorted(themes.items(), key=lambda x: x[1], reverse=True)
+        return self.theme_counts.top()
     
     def get_data_summary(self):
         """Get summary of all user data for privacy dashboard"""
         return {
             "session_id": self.user_id[:8] + "...",
             "session_duration": str(datetime.now() - st.session_state.session_start),
-            "total_chat_messages": len(st.session_state.chat_history),
-            "mood_entries": len(st.session_state.mood_entries),
-            "journal_entries": len(st.session_state.journal_entries),
-            "cbt_records": len(st.session_state.cbt_records),
-            "crisis_events": len(st.session_state.crisis_events),
+            "total_chat_messages": self.count_records("chat"),
+            "mood_entries": self.count_records("mood"),
+            "journal_entries": self.count_records("journal"),
+            "cbt_records": self.count_records("cbt"),
+            "crisis_events": self.count_records("crisis"),
             "last_activity": datetime.now().isoformat()
         }
     
     def export_user_data(self):
-        """Export all user data in JSON format"""
-        export_data = {
-            "export_timestamp": datetime.now().isoformat(),
-            "session_summary": self.get_data_summary(),
-            "mood_entries": st.session_state.mood_entries,
-            "journal_entries": st.session_state.journal_entries,
-            "cbt_records": st.session_state.cbt_records,
-            "data_notice": "This export contains your wellness data from this anonymous session. No personal identifiers are included."
-        }
-        
-        return json.dumps(export_data, indent=2)
+        """Export all user data in JSON format (see utils.exporter for streaming)"""
+        return "".join(iter_json(self))
+    
+    def import_records(self, kind, records):
+        """Bulk-insert already validated records; summaries are rebuilt by
+        import_user_data once the whole file is in"""
+        records = [as_record(kind, record) for record in records]
+        self._track_write(self.storage.append_many(self.user_id, kind, records))
+        if not self.storage.persistent:
+            self._journal("append", kind=kind, records=[as_dict(record) for record in records])
+        self._indexes.pop(kind, None)
+
+    def import_user_data(self, fileobj):
+        """Restore a JSON, NDJSON or CSV export (optionally gzipped); returns an ImportReport"""
+        try:
+            return import_file(self, fileobj)
+        finally:
+            self._reload()
     
     def delete_all_data(self):
         """Securely delete all user data"""
-        st.session_state.chat_history = []
-        st.session_state.mood_entries = []
-        st.session_state.journal_entries = []
-        st.session_state.cbt_records = []
-        st.session_state.crisis_events = []
+        self.storage.delete_user(self.user_id)
+        # Make the deletion durable now rather than at the next periodic sync
+        self.storage.sync(self.user_id)
+        self._reload()
         
         # Generate new encryption key
         st.session_state.encryption_key = Fernet.generate_key()
         self.fernet = Fernet(st.session_state.encryption_key)
+        # Overwrite the snapshot too, so the deleted records leave the disk
+        self.save_snapshot()
     
     def get_conversation_history(self, limit=10):
         """Get recent conversation history for AI context"""
-        recent_messages = st.session_state.chat_history[-limit:]
+        recent_messages = self.get_records("chat", limit=limit)
         conversation = []
         
         for msg in recent_messages:
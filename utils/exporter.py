@@ -0,0 +1,209 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from utils.records import as_dict
+from utils.storage import KINDS
+
+try:
+    import pyarrow as pa # type: ignore
+    import pyarrow.parquet as pq # type: ignore
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+# Kinds included in an export, in output order. Crisis events stay
+# internal: they only record that the safety flow was shown.
+EXPORT_KINDS = ("mood", "journal", "cbt", "breathing", "chat")
+
+# Columns for the tabular formats, per kind (as saved by DataManager)
+EXPORT_FIELDS = {
+    "mood": ("id", "timestamp", "overall_mood", "emotions", "intensity", "triggers", "notes"),
+    "journal": ("id", "timestamp", "prompt", "content", "focus_area", "mood_before", "mood_after", "insights"),
+    "cbt": (
+        "id", "timestamp", "situation", "thoughts", "emotions", "intensity_before", "evidence_for",
+        "evidence_against", "balanced_thought", "intensity_after", "ai_insights",
+    ),
+    "breathing": ("id", "timestamp", "technique", "duration", "cycles_completed", "relaxation_after", "anxiety_after"),
+    "chat": ("id", "timestamp", "role", "content", "persona", "risk_level"),
+}
+
+# Integer columns in the Parquet schema; everything else is a string
+INT_FIELDS = frozenset((
+    "id", "overall_mood", "intensity", "mood_before", "mood_after", "intensity_before",
+    "intensity_after", "cycles_completed", "relaxation_after", "anxiety_after",
+))
+
+FORMATS = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+PARQUET_ROW_GROUP = 1000
+DATA_NOTICE = (
+    "This export contains your wellness data from this anonymous session. "
+    "No personal identifiers are included."
+)
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != "parquet" or pa is not None]
+
+
+def _columns(kinds):
+    """Union of the kinds' columns, first-seen order, after a leading kind column"""
+    columns = ["kind"]
+    for kind in kinds:
+        columns.extend(field for field in EXPORT_FIELDS[kind] if field not in columns)
+    return columns
+
+
+def _cell(value):
+    """Flatten a record value for a CSV/Parquet cell"""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return "; ".join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _records(data_manager, kinds):
+    for kind in kinds:
+        for record in data_manager.storage.iter_records(data_manager.user_id, kind):
+            yield kind, record
+
+
+def iter_ndjson(data_manager, kinds=EXPORT_KINDS):
+    """One JSON object per line: a header, then each record tagged with its kind"""
+    header = {
+        "kind": "export",
+        "export_timestamp": datetime.now().isoformat(),
+        "session_summary": data_manager.get_data_summary(),
+        "data_notice": DATA_NOTICE,
+    }
+    yield json.dumps(header, default=str) + "\n"
+    for kind, record in _records(data_manager, kinds):
+        yield json.dumps({"kind": kind, **as_dict(record)}, default=str, ensure_ascii=False) + "\n"
+
+
+def iter_json(data_manager, kinds=EXPORT_KINDS):
+    """The classic single-document export, produced one record at a time"""
+    yield "{\n"
+    yield f'  "export_timestamp": {json.dumps(datetime.now().isoformat())},\n'
+    summary = json.dumps(data_manager.get_data_summary(), indent=2, default=str).replace("\n", "\n  ")
+    yield f'  "session_summary": {summary},\n'
+    for kind in kinds:
+        yield f'  "{KINDS[kind]}": ['
+        separator = "\n    "
+        for record in data_manager.storage.iter_records(data_manager.user_id, kind):
+            yield separator + json.dumps(as_dict(record), default=str, ensure_ascii=False)
+            separator = ",\n    "
+        yield "\n  ],\n" if separator != "\n    " else "],\n"
+    yield f'  "data_notice": {json.dumps(DATA_NOTICE)}\n'
+    yield "}\n"
+
+
+def _row(kind, record, columns):
+    return [kind] + [_cell(record.get(column)) for column in columns[1:]]
+
+
+def iter_csv(data_manager, kinds=EXPORT_KINDS):
+    """CSV rows over the union of the kinds' columns, with a kind column"""
+    columns = _columns(kinds)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for kind, record in _records(data_manager, kinds):
+        writer.writerow(_row(kind, record, columns))
+        # Hand each row on as soon as it is encoded
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _parquet_schema(columns):
+    return pa.schema([
+        (column, pa.int64() if column in INT_FIELDS else pa.string())
+        for column in columns
+    ])
+
+
+def _parquet_value(column, value):
+    value = _cell(value)
+    if value is None:
+        return None
+    if column in INT_FIELDS:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+def write_parquet(data_manager, fileobj, kinds=EXPORT_KINDS, row_group_size=PARQUET_ROW_GROUP):
+    """Write records as Parquet, one row group per ``row_group_size`` records"""
+    if pa is None:
+        raise RuntimeError("Parquet export needs pyarrow installed")
+    columns = _columns(kinds)
+    schema = _parquet_schema(columns)
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        batch = {column: [] for column in columns}
+        rows = 0
+        for kind, record in _records(data_manager, kinds):
+            batch["kind"].append(kind)
+            for column in columns[1:]:
+                batch[column].append(_parquet_value(column, record.get(column)))
+            rows += 1
+            if rows == row_group_size:
+                writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+                batch = {column: [] for column in columns}
+                rows = 0
+        if rows:
+            writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+
+
+ENCODERS = {
+    "json": iter_json,
+    "ndjson": iter_ndjson,
+    "csv": iter_csv,
+}
+
+
+def write_export(data_manager, fmt="json", kinds=EXPORT_KINDS, compress=False):
+    """Stream an export into a temporary file.
+
+    Returns ``(file, file_name, mime)`` with the file rewound, ready for
+    st.download_button. Records are encoded one at a time (Parquet: one row
+    group at a time) straight into the file, so memory use does not grow
+    with history size.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    mime, extension = FORMATS[fmt]
+    out = tempfile.TemporaryFile()
+    sink = gzip.GzipFile(fileobj=out, mode="wb") if compress else out
+    try:
+        if fmt == "parquet":
+            write_parquet(data_manager, sink, kinds)
+        else:
+            for chunk in ENCODERS[fmt](data_manager, kinds):
+                sink.write(chunk.encode("utf-8"))
+        if compress:
+            sink.close()
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+
+    file_name = f"wellness_data_{datetime.now().strftime('%Y%m%d')}.{extension}"
+    if compress:
+        file_name += ".gz"
+        mime = "application/gzip"
+    return out, file_name, mime
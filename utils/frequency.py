@@ -0,0 +1,92 @@
+import heapq
+from collections import deque
+
+
+class FrequencyTable:
+    """Counts of names (emotions, triggers, themes), updated as records change.
+
+    Names keep the order they were first seen in, so ties in ``top`` rank
+    the same way a recount over the records would.
+    """
+
+    def __init__(self, groups=()):
+        self._counts = {}
+        for names in groups:
+            self.add(names)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __getitem__(self, name):
+        return self._counts.get(name, 0)
+
+    def add(self, names):
+        counts = self._counts
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+
+    def remove(self, names):
+        counts = self._counts
+        for name in names:
+            count = counts.get(name, 0) - 1
+            if count > 0:
+                counts[name] = count
+            else:
+                counts.pop(name, None)
+
+    def clear(self):
+        self._counts.clear()
+
+    def as_dict(self):
+        return dict(self._counts)
+
+    def top(self, k=None):
+        """(name, count) pairs, most frequent first; all of them when k is None"""
+        items = self._counts.items()
+        if k is None:
+            return sorted(items, key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(k, items, key=lambda item: item[1])
+
+
+class SlidingWindowCounter:
+    """Name counts over only the newest ``size`` groups added.
+
+    Wraps a FrequencyTable: adding a group past the window size subtracts
+    the oldest one, so the counts always describe the last N records at
+    O(group size) per add. Groups cannot be removed from the middle;
+    ``rebuild`` the window from the newest records instead.
+    """
+
+    def __init__(self, size, groups=()):
+        self.size = size
+        self._window = deque()
+        self._table = FrequencyTable()
+        for names in groups:
+            self.add(names)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __getitem__(self, name):
+        return self._table[name]
+
+    def add(self, names):
+        names = tuple(names)
+        self._window.append(names)
+        self._table.add(names)
+        if len(self._window) > self.size:
+            self._table.remove(self._window.popleft())
+
+    def rebuild(self, groups):
+        """Reset the window to the given groups, oldest first"""
+        self._table.clear()
+        self._window.clear()
+        for names in groups:
+            self.add(names)
+
+    def as_dict(self):
+        return self._table.as_dict()
+
+    def top(self, k=None):
+        """(name, count) pairs, most frequent first; all of them when k is None"""
+        return self._table.top(k)
@@ -3,9 +3,84 @@ import json
 import streamlit as st
 import google.generativeai as genai
 import time
+import logging
+import functools
+import threading
 from google.genai.errors import ServerError
+from utils.metrics import REGISTRY
+from utils.pii_scrubber import SCRUBBER
+from utils.schemas import RESPONSE_SCHEMAS, VALIDATORS, SchemaError, extract_json
+
+logger = logging.getLogger(__name__)
 
 MODEL = "gemini-2.0-flash"
+LIGHT_MODEL = "gemini-2.0-flash-lite"
+FALLBACK_MODEL = "gemini-1.5-flash"
+
+# Thresholds for routing between MODEL and LIGHT_MODEL; tune from the
+# gemini_route_decisions_total and per-model latency metrics
+ROUTING_THRESHOLDS = {
+    "chat_max_input_chars": int(os.environ.get("ROUTE_CHAT_MAX_CHARS", "200")),
+    "chat_max_history_turns": int(os.environ.get("ROUTE_CHAT_MAX_TURNS", "6")),
+    "cbt_max_record_chars": int(os.environ.get("ROUTE_CBT_MAX_CHARS", "800")),
+}
+
+# Default time budget (seconds) for each public method, covering every
+# retry, backoff sleep and the fallback model. Crisis analysis runs on the
+# chat path before the reply, so it gets the tightest budget.
+DEFAULT_DEADLINES = {
+    "chat": 12.0,
+    "crisis": 4.0,
+    "cbt": 20.0,
+    "journal": 10.0,
+}
+
+RETRY_BACKOFF = 1.5
+
+# USD per million tokens (input, output), used for cost attribution only
+MODEL_PRICING = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+
+CALL_LATENCY = REGISTRY.histogram(
+    "gemini_call_duration_seconds",
+    "End-to-end latency of a GeminiClient method, including retries and fallback",
+    ("feature", "outcome"),
+)
+ATTEMPT_LATENCY = REGISTRY.histogram(
+    "gemini_attempt_duration_seconds",
+    "Latency of a single generate_content attempt",
+    ("feature", "model"),
+)
+RETRIES = REGISTRY.counter("gemini_retries_total", "Attempts retried after an overloaded/503 error", ("feature",))
+FALLBACKS = REGISTRY.counter("gemini_fallbacks_total", "Calls that fell through to the fallback model", ("feature",))
+TIMEOUTS = REGISTRY.counter("gemini_timeouts_total", "Calls that ran past their deadline", ("feature",))
+PARSE_FAILURES = REGISTRY.counter(
+    "gemini_parse_failures_total",
+    "JSON responses that failed to parse or validate, before (initial) and after (repair) the repair attempt",
+    ("feature", "method", "stage"),
+)
+TOKENS = REGISTRY.counter("gemini_tokens_total", "Tokens reported by usage_metadata", ("feature", "model", "kind"))
+COST = REGISTRY.counter("gemini_cost_usd_total", "Estimated spend from token usage and MODEL_PRICING", ("feature", "model"))
+BREAKER_STATE = REGISTRY.gauge("gemini_circuit_open", "1 while the Gemini circuit breaker is open")
+SHORT_CIRCUITS = REGISTRY.counter(
+    "gemini_short_circuits_total",
+    "Calls answered with GeminiCircuitOpen without contacting Gemini",
+    ("feature",),
+)
+ROUTE_DECISIONS = REGISTRY.counter(
+    "gemini_route_decisions_total",
+    "Model chosen by the complexity router, with the rule that decided it",
+    ("feature", "model", "reason"),
+)
+RESPONSE_SIZE = REGISTRY.histogram(
+    "gemini_response_chars",
+    "Length of response text in characters",
+    ("feature",),
+    buckets=(64, 256, 512, 1024, 2048, 4096, 8192),
+)
 
 BASE_SYSTEM_INSTRUCTION = """
 You are a compassionate, non-judgmental, and supportive mental wellness companion.
@@ -16,6 +91,15 @@ You must NEVER give medical advice, diagnose, or pretend to be a human professio
 Always prioritize safety, be warm, concise, and emotionally validating.
 """
 
+REPAIR_INSTRUCTION = """
+Your previous reply could not be used: {error}
+
+Previous reply:
+{raw}
+
+Return ONLY the corrected JSON object, matching the required schema exactly.
+"""
+
 CRISIS_INSTRUCTION = """
 You are a crisis risk analysis AI.
 
@@ -27,60 +111,365 @@ Return ONLY a JSON object:
 }
 """
 
+class Deadline:
+    """Absolute point in time shared by every attempt of one logical call"""
+
+    def __init__(self, seconds):
+        self.budget = float(seconds)
+        self.started = time.monotonic()
+        self.expires_at = self.started + self.budget
+
+    @classmethod
+    def coerce(cls, deadline, default):
+        """Accept a Deadline, a number of seconds or None (use default)"""
+        if isinstance(deadline, Deadline):
+            return deadline
+        return cls(default if deadline is None else deadline)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+
+class GeminiUnavailable:
+    """Returned instead of a response when Gemini cannot answer in time.
+
+    It is falsy so ``reply or fallback`` style checks keep working, and
+    callers that want to degrade explicitly can test with ``isinstance``.
+    """
+
+    reason = "unavailable"
+
+    def __init__(self, feature):
+        self.feature = feature
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return f"{type(self).__name__}(feature={self.feature!r})"
+
+
+class GeminiTimeout(GeminiUnavailable):
+    """The call ran past its deadline"""
+
+    reason = "deadline_exceeded"
+
+    def __init__(self, feature, budget, elapsed, attempts):
+        super().__init__(feature)
+        self.budget = budget
+        self.elapsed = elapsed
+        self.attempts = attempts
+
+    def __repr__(self):
+        return (
+            f"GeminiTimeout(feature={self.feature!r}, budget={self.budget:.1f}s, "
+            f"elapsed={self.elapsed:.1f}s, attempts={self.attempts})"
+        )
+
+
+class GeminiCircuitOpen(GeminiUnavailable):
+    """The circuit breaker is open; no request was sent"""
+
+    reason = "circuit_open"
+
+
+class CircuitBreaker:
+    """Process-wide breaker that stops calling Gemini after repeated failures.
+
+    After ``failure_threshold`` consecutive failed calls the breaker opens for
+    ``reset_after`` seconds; then a single trial call is let through
+    (half-open) and its result closes or re-opens it. A trial that never
+    reports back (its worker died, or it was dropped unsent) is given up
+    after another ``reset_after`` seconds.
+    """
+
+    def __init__(self, failure_threshold=5, reset_after=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at = None
+        self._trial_inflight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_after:
+                return False
+            if self._trial_inflight and now - self._trial_started < self.reset_after:
+                return False
+            self._trial_inflight = True
+            self._trial_started = now
+            return True
+
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_inflight = False
+        BREAKER_STATE.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_inflight or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("gemini circuit opened after %d failures", self._failures)
+                self._opened_at = time.monotonic()
+            self._trial_inflight = False
+            is_open = self._opened_at is not None
+        BREAKER_STATE.set(1 if is_open else 0)
+
+
+BREAKER = CircuitBreaker(
+    failure_threshold=int(os.environ.get("GEMINI_BREAKER_FAILURES", "5")),
+    reset_after=float(os.environ.get("GEMINI_BREAKER_RESET", "30")),
+)
+
+
+def _is_timeout_error(error):
+    text = str(error).lower()
+    return "deadline" in text or "timed out" in text or "timeout" in text
+
+
+def _record_usage(feature, model_name, response):
+    """Record token counts and response size; never looks at message contents"""
+    text = getattr(response, "text", None) or ""
+    RESPONSE_SIZE.observe(len(text), feature=feature)
+
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    response_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    TOKENS.inc(prompt_tokens, feature=feature, model=model_name, kind="prompt")
+    TOKENS.inc(response_tokens, feature=feature, model=model_name, kind="response")
+
+    input_price, output_price = MODEL_PRICING.get(model_name, (0.0, 0.0))
+    cost = (prompt_tokens * input_price + response_tokens * output_price) / 1_000_000
+    COST.inc(cost, feature=feature, model=model_name)
+
+
+def _instrumented(feature):
+    """Time a public GeminiClient method and label the outcome"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                result = method(*args, **kwargs)
+                if isinstance(result, GeminiUnavailable):
+                    outcome = result.reason
+                elif isinstance(result, dict) and "error" in result:
+                    outcome = "error"
+                else:
+                    outcome = "ok"
+                return result
+            finally:
+                elapsed = time.monotonic() - started
+                CALL_LATENCY.observe(elapsed, feature=feature, outcome=outcome)
+                logger.info("gemini call feature=%s outcome=%s latency=%.3fs", feature, outcome, elapsed)
+        return wrapper
+    return decorator
+
+
 class GeminiClient:
-    def __init__(self):
+    def __init__(self, breaker=None):
+        # AI workers pass a breaker that reports outcomes to the parent
+        # process, which owns the real one (see utils.ai_worker)
+        self.breaker = BREAKER if breaker is None else breaker
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
             raise EnvironmentError("❌ GEMINI_API_KEY not set.")
 
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(MODEL)
+        self._models = {MODEL: self.model}
+
+    def _get_model(self, model_name):
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = genai.GenerativeModel(model_name)
+        return model
 
     # ------------------------------------------------------
-    # SAFE INTERNAL GEMINI CALL (retry + fallback)
+    # COMPLEXITY-BASED MODEL ROUTING
+    # ------------------------------------------------------
+    def _route_model(self, feature, input_chars=0, history_turns=0, risk_level=None):
+        """Pick MODEL or LIGHT_MODEL for a call and log why"""
+        if feature == "crisis":
+            model, reason = MODEL, "crisis"
+        elif risk_level and str(risk_level).lower() != "low":
+            model, reason = MODEL, "crisis_adjacent"
+        elif feature == "journal":
+            model, reason = LIGHT_MODEL, "journal"
+        elif feature == "cbt":
+            if input_chars > ROUTING_THRESHOLDS["cbt_max_record_chars"]:
+                model, reason = MODEL, "long_record"
+            else:
+                model, reason = LIGHT_MODEL, "short_record"
+        elif input_chars > ROUTING_THRESHOLDS["chat_max_input_chars"]:
+            model, reason = MODEL, "long_input"
+        elif history_turns > ROUTING_THRESHOLDS["chat_max_history_turns"]:
+            model, reason = MODEL, "long_conversation"
+        else:
+            model, reason = LIGHT_MODEL, "short_chat"
+
+        ROUTE_DECISIONS.inc(feature=feature, model=model, reason=reason)
+        logger.info(
+            "gemini route feature=%s model=%s reason=%s input_chars=%d history_turns=%d",
+            feature, model, reason, input_chars, history_turns,
+        )
+        return model
+
+    def _attempt(self, model, model_name, prompt, generation_config, deadline, feature):
+        started = time.monotonic()
+        try:
+            response = model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                request_options={"timeout": deadline.remaining()}
+            )
+        finally:
+            ATTEMPT_LATENCY.observe(time.monotonic() - started, feature=feature, model=model_name)
+        _record_usage(feature, model_name, response)
+        return response.text
+
     # ------------------------------------------------------
-    def _generate(self, prompt, json_output=False, max_retries=3):
+    # SAFE INTERNAL GEMINI CALL (retry + fallback, deadline-bound)
+    # ------------------------------------------------------
+    def _generate(self, prompt, json_output=False, max_retries=3, deadline=None, feature="chat",
+                  response_schema=None, model_name=MODEL):
+        deadline = Deadline.coerce(deadline, DEFAULT_DEADLINES[feature])
+        if deadline.expired():
+            # Gemini was never asked, so this says nothing about its health
+            TIMEOUTS.inc(feature=feature)
+            return GeminiTimeout(feature, deadline.budget, deadline.elapsed(), 0)
+        if not self.breaker.allow():
+            SHORT_CIRCUITS.inc(feature=feature)
+            return GeminiCircuitOpen(feature)
+        # Personal details never leave the process; placeholders the model
+        # echoes back are restored in the reply
+        prompt, placeholders = SCRUBBER.scrub(prompt)
+        try:
+            result = self._generate_with_retries(prompt, json_output, max_retries, deadline, feature,
+                                                 response_schema, model_name)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        if isinstance(result, str) and result:
+            self.breaker.record_success()
+            return SCRUBBER.restore(result, placeholders)
+        self.breaker.record_failure()
+        return result
+
+    def _generate_with_retries(self, prompt, json_output, max_retries, deadline, feature,
+                               response_schema, model_name):
+        deadline = Deadline.coerce(deadline, DEFAULT_DEADLINES[feature])
+        generation_config = {
+            "response_mime_type": (
+                "application/json" if json_output else "text/plain"
+            )
+        }
+        if response_schema is not None:
+            generation_config["response_schema"] = response_schema
+        attempts = 0
+
         for attempt in range(max_retries):
+            if deadline.expired():
+                break
+            if attempts:
+                RETRIES.inc(feature=feature)
+            attempts += 1
             try:
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config={
-                        "response_mime_type": (
-                            "application/json" if json_output else "text/plain"
-                        )
-                    }
-                )
-                return response.text
+                return self._attempt(self._get_model(model_name), model_name, prompt,
+                                     generation_config, deadline, feature)
 
             except ServerError as e:
                 if "503" in str(e) or "overloaded" in str(e).lower():
-                    time.sleep(1.5)
+                    # Never sleep past the deadline
+                    time.sleep(min(RETRY_BACKOFF, deadline.remaining()))
                     continue
                 raise e
 
             except Exception as e:
+                if _is_timeout_error(e):
+                    break
                 raise RuntimeError(f"Gemini request failed: {e}")
 
-        # Fallback model
+        if deadline.expired():
+            TIMEOUTS.inc(feature=feature)
+            return GeminiTimeout(feature, deadline.budget, deadline.elapsed(), attempts)
+
+        # Fallback model gets whatever budget is left
+        FALLBACKS.inc(feature=feature)
+        attempts += 1
         try:
-            fallback = genai.GenerativeModel("gemini-1.5-flash")
-            response = fallback.generate_content(
-                prompt,
-                generation_config={
-                    "response_mime_type": (
-                        "application/json" if json_output else "text/plain"
-                    )
-                }
-            )
-            return response.text
+            return self._attempt(self._get_model(FALLBACK_MODEL), FALLBACK_MODEL, prompt,
+                                 generation_config, deadline, feature)
 
-        except:
+        except Exception as e:
+            if deadline.expired() or _is_timeout_error(e):
+                TIMEOUTS.inc(feature=feature)
+                return GeminiTimeout(feature, deadline.budget, deadline.elapsed(), attempts)
+            logger.warning("gemini fallback failed feature=%s error=%s", feature, type(e).__name__)
+            return None
+
+    # ------------------------------------------------------
+    # SCHEMA-ENFORCED JSON CALL (validate + one targeted repair)
+    # ------------------------------------------------------
+    def _generate_json(self, prompt, schema_name, method, deadline=None, feature="chat", model_name=MODEL):
+        """Return a validated dict, a GeminiUnavailable, or None if unusable"""
+        deadline = Deadline.coerce(deadline, DEFAULT_DEADLINES[feature])
+        validate = VALIDATORS[schema_name]
+        schema = RESPONSE_SCHEMAS[schema_name]
+
+        raw = self._generate(prompt, json_output=True, deadline=deadline, feature=feature,
+                             response_schema=schema, model_name=model_name)
+        if isinstance(raw, GeminiUnavailable):
+            return raw
+        if not raw:
+            return None
+        try:
+            return validate(extract_json(raw))
+        except (ValueError, SchemaError) as e:
+            PARSE_FAILURES.inc(feature=feature, method=method, stage="initial")
+            error = e
+
+        # One repair attempt, pointed at the exact problem, within the same deadline
+        repair_prompt = REPAIR_INSTRUCTION.format(error=error, raw=raw[:4000])
+        raw = self._generate(repair_prompt, json_output=True, max_retries=1, deadline=deadline,
+                             feature=feature, response_schema=schema, model_name=model_name)
+        if isinstance(raw, GeminiUnavailable):
+            return raw
+        if not raw:
+            return None
+        try:
+            return validate(extract_json(raw))
+        except (ValueError, SchemaError):
+            PARSE_FAILURES.inc(feature=feature, method=method, stage="repair")
+            logger.warning("gemini json repair failed feature=%s method=%s", feature, method)
             return None
 
     # ------------------------------------------------------
     # NORMAL EMPATHETIC CHAT
     # ------------------------------------------------------
-    def get_empathetic_response(self, user_input, persona, conversation_history):
+    @_instrumented("chat")
+    def get_empathetic_response(self, user_input, persona, conversation_history, deadline=None, risk_level=None):
         personas = {
             "peer": "Respond like a warm, supportive peer listener.",
             "mentor": "Respond like a kind, encouraging mentor.",
@@ -106,13 +495,22 @@ Conversation history:
 Respond empathically, briefly, and safely.
 """
 
-        reply = self._generate(full_prompt)
+        model_name = self._route_model(
+            "chat",
+            input_chars=len(user_input),
+            history_turns=len(conversation_history),
+            risk_level=risk_level,
+        )
+        reply = self._generate(full_prompt, deadline=deadline, feature="chat", model_name=model_name)
+        if isinstance(reply, GeminiUnavailable):
+            return reply
         return reply or "I'm here with you — could you share a little more?"
 
     # ------------------------------------------------------
     # CBT JSON INSIGHT
     # ------------------------------------------------------
-    def generate_cbt_insight(self, thought_record: dict) -> dict:
+    @_instrumented("cbt")
+    def generate_cbt_insight(self, thought_record: dict, deadline=None) -> dict:
         prompt = f"""
 Return a JSON object with ONLY:
 - cognitive_distortions
@@ -123,27 +521,19 @@ Here is the user's CBT thought record:
 {json.dumps(thought_record, indent=2)}
 """
         
-        raw = self._generate(prompt, json_output=True)
-
-        if not raw:
-            return {"error": "AI returned no response."}
-        try:
-            return json.loads(raw)
-        except:
-            import re
-            match = re.search(r"\{.*\}", raw, re.DOTALL)
-            if match:
-                try:
-                    return json.loads(match.group())
-                except:
-                    pass
-            return {"error": "Failed to parse AI JSON. AI output may be malformed."}
-            # return {"error": "Failed to parse CBT JSON."}
+        record_chars = sum(len(str(value)) for value in thought_record.values())
+        result = self._generate_json(prompt, "cbt_insight", "generate_cbt_insight",
+                                     deadline=deadline, feature="cbt",
+                                     model_name=self._route_model("cbt", input_chars=record_chars))
+        if result is None:
+            return {"error": "AI insights could not be generated. Please try again."}
+        return result
 
     # ------------------------------------------------------
     # JOURNAL PROMPT JSON
     # ------------------------------------------------------
-    def generate_personalized_journal_prompt(self, mood_context, recent_themes):
+    @_instrumented("journal")
+    def generate_personalized_journal_prompt(self, mood_context, recent_themes, deadline=None):
         prompt = f"""
 Return a JSON object with:
 - prompt
@@ -154,25 +544,49 @@ Mood context:
 
 Themes: {recent_themes}
 """
-        raw = self._generate(prompt, json_output=True)
-        try:
-            return json.loads(raw)
-        except:
-            return {"error": "Failed to parse journal prompt JSON."}
+        result = self._generate_json(prompt, "journal_prompt", "generate_personalized_journal_prompt",
+                                     deadline=deadline, feature="journal",
+                                     model_name=self._route_model("journal"))
+        if result is None:
+            return {"error": "Failed to generate a journal prompt."}
+        return result
+
+    @_instrumented("journal")
+    def generate_personalized_journal_prompts(self, mood_context, recent_themes, count=5, deadline=None):
+        """Generate several distinct prompts in one call, for prefetching"""
+        prompt = f"""
+Return a JSON object with:
+- prompts: a list of {count} distinct objects, each with
+  - prompt
+  - follow_up_questions
+
+Mood context:
+{json.dumps(mood_context, indent=2)}
+
+Themes: {recent_themes}
+"""
+        result = self._generate_json(prompt, "journal_prompt_batch", "generate_personalized_journal_prompts",
+                                     deadline=deadline, feature="journal",
+                                     model_name=self._route_model("journal"))
+        if result is None:
+            return {"error": "Failed to generate journal prompts."}
+        return result
 
     # ------------------------------------------------------
     # CRISIS DETECTION JSON
     # ------------------------------------------------------
-    def analyze_text_for_crisis(self, user_input: str):
+    @_instrumented("crisis")
+    def analyze_text_for_crisis(self, user_input: str, deadline=None):
         prompt = f"{CRISIS_INSTRUCTION}\n\nUser message: {user_input}"
 
-        raw = self._generate(prompt, json_output=True)
-
-        try:
-            return json.loads(raw)
-        except:
+        result = self._generate_json(prompt, "crisis_analysis", "analyze_text_for_crisis",
+                                     deadline=deadline, feature="crisis",
+                                     model_name=self._route_model("crisis"))
+        if result is None:
+            # Unparseable even after repair: stay cautious rather than assume LOW
             return {
                 "risk_level": "MODERATE",
                 "keywords_detected": [],
                 "analysis": "Could not parse AI JSON."
             }
+        return result
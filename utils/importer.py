@@ -0,0 +1,300 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+from utils.exporter import EXPORT_KINDS
+from utils.metrics import REGISTRY
+from utils.schemas import RECORD_SCHEMAS, RECORD_VALIDATORS
+from utils.storage import KINDS
+
+IMPORTED_RECORDS = REGISTRY.counter(
+    "records_imported_total",
+    "Records restored from an uploaded export",
+    ("kind",),
+)
+
+# Records per storage.append_many call
+IMPORT_BATCH = 500
+# Characters read from the upload per refill of the JSON parse buffer
+READ_CHUNK = 64 * 1024
+# Errors kept for display; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Top-level keys of a JSON export that hold records, and their kinds
+SECTION_KINDS = {KINDS[kind]: kind for kind in EXPORT_KINDS}
+
+# How CSV cells flattened by the exporter are read back: lists were joined
+# with "; ", free-form values (AI insights) were written as JSON
+CSV_LIST_FIELDS = {
+    kind: frozenset(name for name, field in schema["properties"].items() if field.get("type") == "array")
+    for kind, schema in RECORD_SCHEMAS.items()
+}
+CSV_JSON_FIELDS = {
+    kind: frozenset(name for name, field in schema["properties"].items() if "type" not in field)
+    for kind, schema in RECORD_SCHEMAS.items()
+}
+
+_decoder = json.JSONDecoder()
+
+
+class ImportReport:
+    """What an import did: records added per kind, duplicates and bad rows"""
+
+    def __init__(self):
+        self.imported = {kind: 0 for kind in EXPORT_KINDS}
+        self.duplicates = 0
+        self.errors = []
+        self.error_count = 0
+
+    @property
+    def total(self):
+        return sum(self.imported.values())
+
+    def error(self, where, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"{where}: {message}")
+
+
+def open_text(fileobj):
+    """Text stream over an uploaded file, gunzipping it if needed"""
+    if isinstance(fileobj, (bytes, bytearray)):
+        fileobj = io.BytesIO(fileobj)
+    magic = fileobj.read(2)
+    fileobj.seek(0)
+    if magic == GZIP_MAGIC:
+        fileobj = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    return io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+
+
+def iter_ndjson(lines, report):
+    """(where, kind, record) triples from an NDJSON export; bad lines are reported"""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            report.error(f"line {number}", f"invalid JSON ({e.msg})")
+            continue
+        if not isinstance(row, dict):
+            report.error(f"line {number}", "expected an object")
+            continue
+        kind = row.pop("kind", None)
+        if kind == "export":
+            continue
+        if kind not in EXPORT_KINDS:
+            report.error(f"line {number}", f"unknown kind {kind!r}")
+            continue
+        yield f"line {number}", kind, row
+
+
+def _csv_value(kind, column, cell):
+    if column in CSV_LIST_FIELDS[kind]:
+        return [item.strip() for item in cell.split(";") if item.strip()]
+    if column in CSV_JSON_FIELDS[kind] and cell[:1] in "{[":
+        try:
+            return json.loads(cell)
+        except ValueError:
+            pass
+    return cell
+
+
+def iter_csv(lines, report):
+    """(where, kind, record) triples from a CSV export; empty cells are
+    left out so each kind only gets its own columns"""
+    reader = csv.reader(lines)
+    columns = next(reader, None)
+    if not columns:
+        return
+    for row in reader:
+        where = f"row {reader.line_num}"
+        if not row:
+            continue
+        if len(row) != len(columns):
+            report.error(where, f"expected {len(columns)} columns, got {len(row)}")
+            continue
+        cells = dict(zip(columns, row))
+        kind = cells.pop("kind", None)
+        if kind not in EXPORT_KINDS:
+            report.error(where, f"unknown kind {kind!r}")
+            continue
+        yield where, kind, {
+            column: _csv_value(kind, column, cell) for column, cell in cells.items() if cell != ""
+        }
+
+
+class _JSONReader:
+    """Pull values one at a time out of a JSON document read in chunks.
+
+    Only the current chunk (plus any value straddling its end) is held in
+    memory, so a multi-year export is never loaded whole.
+    """
+
+    def __init__(self, stream, buffer=""):
+        self.stream = stream
+        self.buffer = buffer
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or "" at the end of the document"""
+        while True:
+            buffer, pos = self.buffer, self.pos
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            self.pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} near character {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Possibly cut off at the end of the chunk: read on and retry
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json(stream, report, buffer=""):
+    """(where, kind, record) triples from a JSON export, parsed incrementally.
+
+    Structural errors end the import (the rest of the document cannot be
+    located reliably); records that parse but do not validate are reported
+    per record by the caller.
+    """
+    reader = _JSONReader(stream, buffer)
+    try:
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            kind = SECTION_KINDS.get(key)
+            if kind is None or reader.peek() != "[":
+                reader.value()  # export_timestamp, session_summary, ...
+            else:
+                reader.pos += 1
+                index = 0
+                while reader.peek() != "]":
+                    if index:
+                        reader.expect(",")
+                    record = reader.value()
+                    if isinstance(record, dict):
+                        yield f"{key}[{index}]", kind, record
+                    else:
+                        report.error(f"{key}[{index}]", "expected an object")
+                    index += 1
+                reader.pos += 1
+            if reader.peek() == "}":
+                return
+            reader.expect(",")
+    except ValueError as e:
+        report.error("file", f"stopped reading: {e}")
+
+
+def iter_upload(fileobj, report):
+    """Records from an export file in any text format (JSON, NDJSON or CSV)"""
+    stream = open_text(fileobj)
+    first = stream.readline()
+    try:
+        header = json.loads(first)
+    except ValueError:
+        header = None
+    if isinstance(header, dict) and header.get("kind") == "export":
+        yield from iter_ndjson(_chain(first, stream), report)
+    elif first.startswith("kind,"):
+        yield from iter_csv(_chain(first, stream), report)
+    else:
+        yield from iter_json(stream, report, first)
+
+
+def _chain(first, stream):
+    yield first
+    yield from stream
+
+
+def validate(kind, record):
+    """Schema-checked copy of a record; raises SchemaError or ValueError"""
+    record = RECORD_VALIDATORS[kind](record)
+    datetime.fromisoformat(record["timestamp"])
+    return record
+
+
+def import_file(data_manager, fileobj, batch_size=IMPORT_BATCH):
+    """Restore records from an exported file into the user's storage.
+
+    Records are validated, given fresh ids from the user's id allocator,
+    and inserted ``batch_size`` at a time. Records whose timestamp
+    already exists for their kind are skipped, so importing the same file
+    twice is harmless. Returns an ImportReport.
+    """
+    report = ImportReport()
+    seen = {}
+    batches = {}
+
+    def flush(kind):
+        batch = batches.pop(kind, None)
+        if batch:
+            first = data_manager.storage.allocate_ids(data_manager.user_id, kind, len(batch))
+            for offset, record in enumerate(batch):
+                record["id"] = first + offset
+            data_manager.import_records(kind, batch)
+            report.imported[kind] += len(batch)
+            IMPORTED_RECORDS.inc(len(batch), kind=kind)
+
+    for where, kind, record in iter_upload(fileobj, report):
+        try:
+            record = validate(kind, record)
+        except ValueError as e:  # SchemaError or a bad timestamp
+            report.error(where, str(e))
+            continue
+
+        if kind not in seen:
+            seen[kind] = {
+                existing["timestamp"]
+                for existing in data_manager.storage.iter_records(data_manager.user_id, kind)
+            }
+        if record["timestamp"] in seen[kind]:
+            report.duplicates += 1
+            continue
+        seen[kind].add(record["timestamp"])
+
+        batch = batches.setdefault(kind, [])
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush(kind)
+
+    for kind in list(batches):
+        flush(kind)
+    return report
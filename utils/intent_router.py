@@ -0,0 +1,103 @@
+import re
+
+from utils.metrics import REGISTRY
+
+CHAT_TURNS = REGISTRY.counter(
+    "chat_turns_total",
+    "Chat turns by how the reply was produced",
+    ("path",),
+)
+
+# Sidebar page each intent deep-links to (must match app.py's options)
+INTENT_PAGES = {
+    "breathing": "🫁 Breathing & Mindfulness",
+    "journal": "📝 Guided Journaling",
+    "cbt": "🧠 CBT Exercises",
+}
+
+INTENT_REPLIES = {
+    "breathing": (
+        "Let's slow things down together. 🫁 The Breathing & Mindfulness tools have "
+        "guided exercises like box breathing and 4-7-8 breathing — you can start one "
+        "right from the button below. Take it at your own pace."
+    ),
+    "journal": (
+        "Writing things down can really help. 📝 Guided Journaling has prompts for "
+        "emotions, thought patterns, gratitude and more — tap below to open it. "
+        "I'm still here if you'd like to talk afterwards."
+    ),
+    "cbt": (
+        "A thought record is a great way to look at a difficult thought from a new "
+        "angle. 🧠 The CBT Exercises page walks you through it step by step — "
+        "tap below to get started."
+    ),
+}
+
+_ASK = (
+    r"(?:can|could|shall|may)\s+(?:we|i|you)(?:\s+please)?\s+(?:do|try|start|have|get|use|open|go\s+to)"
+    r"|let'?s(?:\s+(?:do|try|start|go\s+to))?"
+    r"|i(?:'d|\s+would)?\s+(?:want|wanna|like|need)\s+to(?:\s+(?:do|try|start|use|open|go\s+to))?"
+    r"|i\s+(?:want|need)(?:\s+(?:to\s+(?:do|try)))?"
+    r"|help\s+me(?:\s+(?:with|do|start))?"
+    r"|(?:show|take)\s+me(?:\s+(?:to|the))?"
+    r"|(?:please\s+)?(?:start|open|begin)"
+)
+
+_TARGETS = {
+    "breathing": (
+        r"(?:a\s+|some\s+|the\s+)?(?:(?:box|deep|4-7-8|calming)\s+)?breathing(?:\s+(?:exercises?|techniques?))?"
+        r"|(?:a\s+|some\s+)?(?:mindfulness|grounding)\s+(?:exercises?|techniques?)"
+        r"|(?:a\s+)?(?:short\s+)?meditation"
+    ),
+    "journal": (
+        r"(?:some\s+|a\s+|my\s+)?journal(?:ing|\s+(?:entry|prompts?))?"
+        r"|write\s+in\s+(?:my|a)\s+journal"
+    ),
+    "cbt": (
+        r"(?:a\s+|the\s+)?thought\s+record"
+        r"|(?:some\s+|a\s+)?cbt(?:\s+(?:exercises?|worksheet))?"
+        r"|challenge\s+(?:a|my|this|that)\s+(?:negative\s+)?thought"
+    ),
+}
+
+# Whole-message match only: the intent must be the point of the message, not
+# a passing mention inside a longer disclosure that deserves a real reply.
+_INTENT_RE = re.compile(
+    r"^\W*(?:hey|hi|ok(?:ay)?|um+|so)?[\s,]*(?:(?:" + _ASK + r")\s+)?(?:"
+    + "|".join(f"(?P<{name}>{pattern})" for name, pattern in _TARGETS.items())
+    + r")(?:\s+(?:please|now|together|with\s+me|for\s+a\s+bit))*\W*$",
+    re.IGNORECASE,
+)
+
+# Longer messages are almost always more than navigation
+MAX_INTENT_LENGTH = 120
+
+
+def classify_intent(text):
+    """Return the exercise intent name for a navigation-style message, or None"""
+    if not text or len(text) > MAX_INTENT_LENGTH:
+        return None
+    match = _INTENT_RE.match(text.strip())
+    if match is None:
+        return None
+    return match.lastgroup
+
+
+def route_intent(text, risk_level="low"):
+    """Template reply and deep link for an exercise request, or None.
+
+    Only called after crisis analysis; anything above low risk always goes
+    to the full response path.
+    """
+    if risk_level != "low":
+        return None
+    intent = classify_intent(text)
+    if intent is None:
+        return None
+    return {"intent": intent, "page": INTENT_PAGES[intent], "reply": INTENT_REPLIES[intent]}
+
+
+def llm_skip_share():
+    """Share of chat turns answered without calling Gemini"""
+    total = CHAT_TURNS.value()
+    return CHAT_TURNS.value(path="local_intent") / total if total else 0.0
@@ -0,0 +1,102 @@
+from collections import deque
+
+from data.crisis_keywords import CRISIS_KEYWORDS, HARMFUL_OUTPUT_TERMS
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over many keyword phrases, with word boundaries.
+
+    Built once, it finds every phrase in a single pass over the text, with
+    the same semantics as testing ``\\bphrase\\b`` for each phrase in turn
+    (overlapping and nested phrases included), at a cost that depends on
+    the text length rather than the number of phrases.
+    """
+
+    def __init__(self, groups):
+        # groups: {category: [phrase, ...]}; a phrase may belong to several
+        self.groups = {category: [p.lower() for p in phrases] for category, phrases in groups.items()}
+        self._phrases = []
+        self._categories = []
+        phrase_ids = {}
+        for category, phrases in self.groups.items():
+            for phrase in phrases:
+                if phrase not in phrase_ids:
+                    phrase_ids[phrase] = len(self._phrases)
+                    self._phrases.append(phrase)
+                    self._categories.append([])
+                if category not in self._categories[phrase_ids[phrase]]:
+                    self._categories[phrase_ids[phrase]].append(category)
+        self._build()
+
+    def _build(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for phrase_id, phrase in enumerate(self._phrases):
+            state = 0
+            for char in phrase:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(phrase_id)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Yield (start, end, phrase) for every whole-word phrase occurrence"""
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        length = len(text)
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not out[state]:
+                continue
+            end = index + 1
+            for phrase_id in out[state]:
+                phrase = self._phrases[phrase_id]
+                start = end - len(phrase)
+                if _is_word_char(phrase[0]) and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if _is_word_char(phrase[-1]) and end < length and _is_word_char(text[end]):
+                    continue
+                yield start, end, phrase
+
+    def find(self, text, categories=None):
+        """Distinct (phrase, category) pairs present in text, in definition order"""
+        found = {phrase for _, _, phrase in self.iter_matches(text)}
+        if not found:
+            return []
+        return [
+            (phrase, category)
+            for category, phrases in self.groups.items()
+            if categories is None or category in categories
+            for phrase in phrases
+            if phrase in found
+        ]
+
+
+# One automaton shared by crisis detection (user input) and the output safety
+# scan (AI replies); each caller filters to the categories it cares about.
+SAFETY_MATCHER = KeywordMatcher({**CRISIS_KEYWORDS, **HARMFUL_OUTPUT_TERMS})
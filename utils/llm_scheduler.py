@@ -0,0 +1,231 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from utils.gemini_client import DEFAULT_DEADLINES, Deadline, GeminiTimeout
+from utils.metrics import REGISTRY
+
+CRITICAL = "critical"
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Lower rank is served first
+PRIORITY_RANK = {CRITICAL: 0, INTERACTIVE: 1, BACKGROUND: 2}
+
+FEATURE_PRIORITY = {
+    "crisis": CRITICAL,
+    "chat": INTERACTIVE,
+    "cbt": INTERACTIVE,
+    "journal": BACKGROUND,
+}
+
+QUEUE_DEPTH = REGISTRY.gauge("llm_queue_depth", "Jobs waiting for an LLM worker", ("priority",))
+QUEUE_WAIT = REGISTRY.histogram(
+    "llm_queue_wait_seconds",
+    "Time a job spent queued before a worker picked it up",
+    ("priority",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0),
+)
+JOBS = REGISTRY.counter("llm_jobs_total", "Jobs handled by the LLM scheduler", ("priority", "outcome"))
+SHED = REGISTRY.counter("llm_jobs_shed_total", "Jobs rejected or evicted under overload", ("priority",))
+
+
+class SchedulerOverloaded(RuntimeError):
+    """Raised when a job is shed because the queue is full"""
+
+
+class _Job:
+    __slots__ = ("priority", "fn", "args", "kwargs", "future", "deadline", "enqueued_at")
+
+    def __init__(self, priority, fn, args, kwargs, deadline):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Priority-aware dispatcher in front of GeminiClient.
+
+    A fixed pool of worker threads serves the heap in priority order
+    (critical, then interactive, then background; FIFO within a class).
+    When the queue is full, background work is shed first: new background
+    jobs are rejected and queued ones are evicted to make room for higher
+    classes.
+
+    Priority alone only picks the next job; slow jobs already running
+    could still hold every worker. So ``critical_reserve`` workers only
+    ever run critical jobs, and at most ``max_background_running``
+    background jobs run at once (by default leaving one more worker for
+    interactive work), so a crisis check or chat turn queued behind a
+    burst of prefetches still starts within its deadline.
+    """
+
+    def __init__(self, workers=4, max_queue=32, max_background=None, critical_reserve=1,
+                 max_background_running=None):
+        self.max_queue = max_queue
+        self.max_background = max_background if max_background is not None else max_queue // 2
+        # With a single worker nothing can be held back
+        self.critical_reserve = min(critical_reserve, workers - 1)
+        non_critical = workers - self.critical_reserve
+        self.max_background_running = (
+            max_background_running if max_background_running is not None else max(1, non_critical - 1)
+        )
+        self._heap = []
+        self._seq = itertools.count()
+        self._depth = {priority: 0 for priority in PRIORITY_RANK}
+        self._running = {priority: 0 for priority in PRIORITY_RANK}
+        self._worker_count = workers
+        self._cond = threading.Condition()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._workers:
+            thread.start()
+
+    # ------------------------------------------------------
+    # SUBMISSION
+    # ------------------------------------------------------
+    def submit(self, priority, fn, *args, deadline=None, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return a Future for its result"""
+        if priority not in PRIORITY_RANK:
+            raise ValueError(f"Unknown priority: {priority}")
+        job = _Job(priority, fn, args, kwargs, deadline)
+
+        with self._cond:
+            if not self._admit(priority):
+                SHED.inc(priority=priority)
+                job.future.set_exception(SchedulerOverloaded(f"LLM queue full, {priority} job shed"))
+                return job.future
+            heapq.heappush(self._heap, (PRIORITY_RANK[priority], next(self._seq), job))
+            self._depth[priority] += 1
+            QUEUE_DEPTH.set(self._depth[priority], priority=priority)
+            self._cond.notify()
+        return job.future
+
+    def run(self, fn, *args, feature="chat", priority=None, deadline=None, **kwargs):
+        """Submit a GeminiClient call and wait for it within its deadline.
+
+        The deadline covers time spent queued as well as the call itself, and
+        is handed to ``fn`` so retries inside GeminiClient share the budget.
+        """
+        priority = priority or FEATURE_PRIORITY.get(feature, INTERACTIVE)
+        deadline = Deadline.coerce(deadline, DEFAULT_DEADLINES.get(feature, DEFAULT_DEADLINES["chat"]))
+        future = self.submit(priority, fn, *args, deadline=deadline, **kwargs)
+        try:
+            return future.result(timeout=deadline.remaining())
+        except FutureTimeout:
+            future.cancel()
+            return GeminiTimeout(feature, deadline.budget, deadline.elapsed(), 0)
+
+    def _admit(self, priority):
+        """Decide whether a new job fits, evicting lower classes if needed"""
+        if priority == BACKGROUND and self._depth[BACKGROUND] >= self.max_background:
+            return False
+        if len(self._heap) < self.max_queue:
+            return True
+        if priority == BACKGROUND:
+            return False
+        return self._evict_below(PRIORITY_RANK[priority])
+
+    def _evict_below(self, rank):
+        """Drop the newest queued job of the lowest class ranked below ``rank``"""
+        victim_index = None
+        for index, (job_rank, seq, _job) in enumerate(self._heap):
+            if job_rank <= rank:
+                continue
+            if victim_index is None or (job_rank, seq) > self._heap[victim_index][:2]:
+                victim_index = index
+        if victim_index is None:
+            return False
+
+        _, _, victim = self._heap[victim_index]
+        self._heap[victim_index] = self._heap[-1]
+        self._heap.pop()
+        heapq.heapify(self._heap)
+        self._depth[victim.priority] -= 1
+        QUEUE_DEPTH.set(self._depth[victim.priority], priority=victim.priority)
+        SHED.inc(priority=victim.priority)
+        victim.future.set_exception(SchedulerOverloaded(f"{victim.priority} job evicted for higher priority work"))
+        return True
+
+    # ------------------------------------------------------
+    # WORKERS
+    # ------------------------------------------------------
+    def _may_start(self, priority):
+        """Whether a free worker may take a job of this class now"""
+        if priority == CRITICAL:
+            return True
+        if self._running[INTERACTIVE] + self._running[BACKGROUND] >= self._worker_count - self.critical_reserve:
+            return False
+        return priority != BACKGROUND or self._running[BACKGROUND] < self.max_background_running
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                # The head is the most urgent job; if its class is at its
+                # limit, every class queued behind it is too
+                while not self._heap or not self._may_start(self._heap[0][2].priority):
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                self._depth[job.priority] -= 1
+                self._running[job.priority] += 1
+                QUEUE_DEPTH.set(self._depth[job.priority], priority=job.priority)
+            try:
+                self._run_job(job)
+            finally:
+                with self._cond:
+                    self._running[job.priority] -= 1
+                    self._cond.notify_all()
+
+    def _run_job(self, job):
+        QUEUE_WAIT.observe(time.monotonic() - job.enqueued_at, priority=job.priority)
+        if not job.future.set_running_or_notify_cancel():
+            JOBS.inc(priority=job.priority, outcome="cancelled")
+            return
+        if job.deadline is not None and job.deadline.expired():
+            JOBS.inc(priority=job.priority, outcome="expired")
+            job.future.set_exception(FutureTimeout())
+            return
+
+        kwargs = dict(job.kwargs)
+        if job.deadline is not None:
+            kwargs["deadline"] = job.deadline
+        try:
+            result = job.fn(*job.args, **kwargs)
+        except BaseException as e:
+            JOBS.inc(priority=job.priority, outcome="error")
+            job.future.set_exception(e)
+        else:
+            JOBS.inc(priority=job.priority, outcome="ok")
+            job.future.set_result(result)
+
+    def depth(self, priority=None):
+        """Queued jobs for one class, or in total"""
+        with self._cond:
+            if priority is None:
+                return len(self._heap)
+            return self._depth[priority]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by every Streamlit session"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                workers=int(os.environ.get("LLM_WORKERS", "4")),
+                max_queue=int(os.environ.get("LLM_MAX_QUEUE", "32")),
+            )
+        return _scheduler
@@ -0,0 +1,165 @@
+import math
+import re
+from collections import Counter
+
+from data.crisis_keywords import (
+    CRISIS_ASSESSMENT_QUESTIONS,
+    CRISIS_RESOURCES,
+    DE_ESCALATION_RESPONSES,
+    SAFETY_PLANNING_ELEMENTS,
+)
+from utils.intent_router import INTENT_PAGES, INTENT_REPLIES
+from utils.metrics import REGISTRY
+
+LOCAL_REPLIES = REGISTRY.counter(
+    "local_responder_replies_total",
+    "Chat replies produced by the local degraded-mode responder",
+    ("reason", "kind"),
+)
+
+PERSONA_OPENERS = {
+    "peer": "Hey, I'm really glad you told me.",
+    "mentor": "Thank you for sharing that with me.",
+    "therapist": "Thank you for telling me how you're feeling.",
+}
+
+# Words that describe when each template fits. They are indexed together
+# with the template text so short, emotional messages can still match.
+_VALIDATION_CUES = [
+    "pain hurt hurting suffering awful terrible",
+    "trust sharing tell told telling open opening",
+    "alone lonely nobody no one isolated left out",
+    "overwhelming overwhelmed too much forever never end stuck",
+    "reach reaching asking help weak failure",
+    "help support someone professional counselor talk",
+    "worthless value meaning pointless useless burden matter",
+]
+
+_SUGGESTION_CUES = {
+    "breathing": "anxious anxiety panic panicking stressed stress tense heart racing breathe calm nervous scared shaking",
+    "journal": "confused thoughts mixed feelings process understand write day happened sort figure",
+    "cbt": "stupid failure fail always never should thought thinking worthless dumb mistake blame everyone hates",
+}
+
+_SAFETY_CUES = [
+    "trust people friends family who",
+    "calm calmer activities hobbies relax",
+    "reasons living live worth future",
+    "safe unsafe place home go",
+    "call phone talk contact reach",
+]
+
+_TOKEN_RE = re.compile(r"[a-z']+")
+_STOPWORDS = frozenset(
+    "a an the and or but i i'm im me my you your it it's its is are was were be been "
+    "to of in on at for with this that so just really very feel feeling like do don't "
+    "can can't have has had not no".split()
+)
+
+
+def _tokens(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS or len(token) < 3:
+            continue
+        # Cheap suffix folding so "panicking" meets "panic" and "thoughts" meets "thought"
+        for suffix in ("ing", "ed", "s"):
+            if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+                token = token[: -len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+
+class _TfidfIndex:
+    """Tiny in-memory TF-IDF index with precomputed, normalized vectors"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        term_counts = [Counter(_tokens(text)) for text, _ in documents]
+        doc_freq = Counter(term for counts in term_counts for term in counts)
+        total = len(documents)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in doc_freq.items()}
+        # Inverted index: term -> [(doc index, weight)]
+        self.postings = {}
+        for index, counts in enumerate(term_counts):
+            weights = {term: count * self.idf[term] for term, count in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.postings.setdefault(term, []).append((index, weight / norm))
+
+    def best(self, query_tokens):
+        """Payload of the best-scoring document, or None when nothing overlaps"""
+        scores = {}
+        for term in set(query_tokens):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, weight in self.postings[term]:
+                scores[index] = scores.get(index, 0.0) + weight * idf
+        if not scores:
+            return None
+        return self.documents[max(scores, key=scores.get)][1]
+
+
+class LocalResponder:
+    """Supportive replies built from local templates, for when Gemini is down.
+
+    A reply is a persona opener, the best-matching validating line and,
+    when something fits, a suggestion (an exercise with a deep link, or a
+    safety-planning question). Everything is precomputed, so a reply costs
+    a few dictionary lookups.
+    """
+
+    def __init__(self):
+        self.validation = _TfidfIndex([
+            (f"{response} {cue}", response)
+            for response, cue in zip(DE_ESCALATION_RESPONSES, _VALIDATION_CUES)
+        ])
+        suggestions = [
+            (f"{INTENT_REPLIES[intent]} {cue}", ("exercise", intent, INTENT_REPLIES[intent]))
+            for intent, cue in _SUGGESTION_CUES.items()
+        ]
+        suggestions += [
+            (f"{question} {cue}", ("safety", None, question))
+            for question, cue in zip(CRISIS_ASSESSMENT_QUESTIONS["safety_planning"], _SAFETY_CUES)
+        ]
+        suggestions += [
+            (f"{name.replace('_', ' ')} {description}", ("safety", None, f"It can help to think about {description[0].lower()}{description[1:]}."))
+            for name, description in SAFETY_PLANNING_ELEMENTS.items()
+            if name != "environment_safety"
+        ]
+        self.suggestions = _TfidfIndex(suggestions)
+
+    def respond(self, text, persona="therapist", risk_level="low", reason="unavailable"):
+        """Return {"reply", "intent", "page"} for a message"""
+        tokens = _tokens(text)
+        opener = PERSONA_OPENERS.get(persona, PERSONA_OPENERS["therapist"])
+        validation = self.validation.best(tokens) or DE_ESCALATION_RESPONSES[1]
+        parts = [opener, validation]
+
+        intent = None
+        elevated = str(risk_level).lower() in ("high", "critical")
+        if elevated:
+            # Never suggest a worksheet to someone at risk; point to people instead
+            parts.append(DE_ESCALATION_RESPONSES[5])
+            parts.append(f"You can call {CRISIS_RESOURCES['suicide_prevention']['primary']} any time.")
+            kind = "crisis"
+        else:
+            suggestion = self.suggestions.best(tokens)
+            if suggestion is None:
+                parts.append("Would you like to tell me a little more about what's going on?")
+                kind = "open_question"
+            else:
+                kind, intent, suggestion_text = suggestion
+                parts.append(suggestion_text)
+
+        LOCAL_REPLIES.inc(reason=reason, kind=kind)
+        return {
+            "reply": " ".join(parts),
+            "intent": intent,
+            "page": INTENT_PAGES.get(intent),
+        }
+
+
+LOCAL_RESPONDER = LocalResponder()
@@ -0,0 +1,258 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets (seconds) sized for LLM round trips
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0)
+
+
+def _label_key(labelnames, labels):
+    missing = set(labelnames) - set(labels)
+    extra = set(labels) - set(labelnames)
+    if missing or extra:
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Value for an exact label set, or the sum over series matching a partial one"""
+        with self._lock:
+            items = list(self._series.items())
+        return sum(
+            value for key, value in items
+            if all(dict(zip(self.labelnames, key)).get(k) == str(v) for k, v in labels.items())
+        )
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. a queue depth"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._series[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with count and sum per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def summary(self, **labels):
+        """Count, sum, mean and bucket-estimated p50/p95 over matching series"""
+        with self._lock:
+            matching = [
+                (list(counts), count, total)
+                for key, (counts, count, total) in self._series.items()
+                if all(dict(zip(self.labelnames, key)).get(k) == str(v) for k, v in labels.items())
+            ]
+        counts = [0] * (len(self.buckets) + 1)
+        count = 0
+        total = 0.0
+        for series_counts, series_count, series_total in matching:
+            counts = [a + b for a, b in zip(counts, series_counts)]
+            count += series_count
+            total += series_total
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "p50": self._quantile(counts, count, 0.5),
+            "p95": self._quantile(counts, count, 0.95),
+        }
+
+    def _quantile(self, counts, count, q):
+        if not count:
+            return 0.0
+        rank = q * count
+        running = 0
+        for index, bucket_count in enumerate(counts):
+            running += bucket_count
+            if running >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def collect(self):
+        with self._lock:
+            items = sorted((key, (list(c), n, s)) for key, (c, n, s) in self._series.items())
+        for key, (counts, count, total) in items:
+            running = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                running += bucket_count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {running}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics, shared by every Streamlit session"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different shape")
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def drain(self):
+        """Counter and histogram series recorded since the last drain, as
+        plain data for ``merge`` in another process; gauges are left alone
+        since they describe this process's own state"""
+        with self._lock:
+            metrics = [m for m in self._metrics.values() if m.kind in ("counter", "histogram")]
+        drained = []
+        for metric in metrics:
+            with metric._lock:
+                series, metric._series = metric._series, {}
+            if series:
+                extra = {"buckets": metric.buckets} if metric.kind == "histogram" else {}
+                drained.append((metric.kind, metric.name, metric.help, metric.labelnames, extra, series))
+        return drained
+
+    def merge(self, drained):
+        """Add series drained from another registry into this one"""
+        for kind, name, help_text, labelnames, extra, series in drained:
+            if kind == "counter":
+                metric = self.counter(name, help_text, labelnames)
+                with metric._lock:
+                    for key, value in series.items():
+                        metric._series[key] = metric._series.get(key, 0) + value
+                continue
+            metric = self.histogram(name, help_text, labelnames, **extra)
+            with metric._lock:
+                for key, (counts, count, total) in series.items():
+                    mine = metric._series.get(key)
+                    if mine is None:
+                        metric._series[key] = [list(counts), count, total]
+                        continue
+                    mine[0] = [a + b for a, b in zip(mine[0], counts)]
+                    mine[1] += count
+                    mine[2] += total
+
+    def render_prometheus(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=None):
+    """Serve /metrics on METRICS_PORT (once per process); no-op when unset"""
+    global _server
+    port = port or os.environ.get("METRICS_PORT")
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
@@ -0,0 +1,172 @@
+import logging
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Bitmask columns hold up to 64 distinct emotion/trigger names each; the
+# mood tracker offers 12 of each
+MAX_TAGS = 64
+# Largest value the uint8 mood and intensity columns can hold
+MAX_RATING = 255
+
+
+def _rating(value):
+    """A mood/intensity value as a uint8 column value (0 when missing); None
+    if it is not a number in range"""
+    if not value:
+        return 0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number) or not 0 <= number <= MAX_RATING:
+        return None
+    return int(number)
+
+
+class TagVocabulary:
+    """Stable bit positions for emotion/trigger names, assigned on first use"""
+
+    def __init__(self):
+        self.names = []
+        self._bits = {}
+
+    def mask(self, names):
+        mask = 0
+        for name in names or ():
+            bit = self._bits.get(name)
+            if bit is None:
+                if len(self.names) >= MAX_TAGS:
+                    continue
+                bit = self._bits[name] = len(self.names)
+                self.names.append(name)
+            mask |= 1 << bit
+        return mask
+
+    def unpack(self, mask):
+        return [name for bit, name in enumerate(self.names) if mask >> bit & 1]
+
+
+class MoodColumns:
+    """Mood entries as parallel typed arrays, kept sorted by time.
+
+    One entry costs 34 bytes: epoch seconds (int64), mood and intensity
+    (uint8, 0 when missing), emotion and trigger bitmasks (uint64) and a
+    running prefix sum of moods. Windows are located with bisect on the
+    time column, and a window's average is a difference of two prefix
+    sums, so neither depends on how many entries a user has.
+    """
+
+    def __init__(self):
+        self.ts = array("q")
+        self.mood = array("B")
+        self.intensity = array("B")
+        self.emotions = array("Q")
+        self.triggers = array("Q")
+        # mood_prefix[i] is the sum of the first i moods
+        self.mood_prefix = array("Q", [0])
+        self.emotion_tags = TagVocabulary()
+        self.trigger_tags = TagVocabulary()
+        self.mood_min = None
+        self.mood_max = None
+
+    @classmethod
+    def from_entries(cls, entries):
+        columns = cls()
+        for entry in entries:
+            columns.append(entry)
+        return columns
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, entry):
+        """Add a mood entry dict (as saved by DataManager); entries whose mood
+        or intensity the columns cannot hold are logged and left out"""
+        ts = int(datetime.fromisoformat(entry["timestamp"]).timestamp())
+        mood = _rating(entry.get("overall_mood"))
+        intensity = _rating(entry.get("intensity"))
+        if mood is None or intensity is None:
+            logger.warning(
+                "leaving mood entry %s out of the summaries: mood %r, intensity %r",
+                entry.get("id"), entry.get("overall_mood"), entry.get("intensity"),
+            )
+            return
+        values = (
+            ts,
+            mood,
+            intensity,
+            self.emotion_tags.mask(entry.get("emotions")),
+            self.trigger_tags.mask(entry.get("triggers")),
+        )
+        columns = (self.ts, self.mood, self.intensity, self.emotions, self.triggers)
+        if not self.ts or ts >= self.ts[-1]:
+            for column, value in zip(columns, values):
+                column.append(value)
+            self.mood_prefix.append(self.mood_prefix[-1] + mood)
+        else:
+            # Back-dated entry (e.g. an import): keep time order, rebuild the tail
+            index = bisect_right(self.ts, ts)
+            for column, value in zip(columns, values):
+                column.insert(index, value)
+            del self.mood_prefix[index + 1:]
+            for value in self.mood[index:]:
+                self.mood_prefix.append(self.mood_prefix[-1] + value)
+
+        self.mood_min = mood if self.mood_min is None else min(self.mood_min, mood)
+        self.mood_max = mood if self.mood_max is None else max(self.mood_max, mood)
+
+    def nbytes(self):
+        """Bytes held by the column buffers"""
+        columns = (self.ts, self.mood, self.intensity, self.emotions, self.triggers, self.mood_prefix)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def window(self, since=None, last=None):
+        """(lo, hi) slice bounds: entries at or after ``since`` (a datetime),
+        then at most the newest ``last`` of those"""
+        hi = len(self.ts)
+        lo = 0 if since is None else bisect_left(self.ts, int(since.timestamp()))
+        if last is not None:
+            lo = max(lo, hi - last)
+        return lo, hi
+
+    def stats(self, lo=0, hi=None):
+        """Count, average, min and max mood over a window"""
+        hi = len(self.ts) if hi is None else hi
+        count = hi - lo
+        if count <= 0:
+            return {"count": 0, "average": None, "min": None, "max": None}
+        if lo == 0 and hi == len(self.ts):
+            low, high = self.mood_min, self.mood_max
+        else:
+            window = self.mood[lo:hi]
+            low, high = min(window), max(window)
+        return {
+            "count": count,
+            "average": (self.mood_prefix[hi] - self.mood_prefix[lo]) / count,
+            "min": low,
+            "max": high,
+        }
+
+    def moods(self, lo=0, hi=None):
+        return self.mood[lo:hi].tolist()
+
+    def dates(self, lo=0, hi=None):
+        return [date.fromtimestamp(ts) for ts in self.ts[lo:hi]]
+
+    def tag_counts(self, column, lo=0, hi=None):
+        """Per-name entry counts over a window of the emotions or triggers column"""
+        masks, tags = (
+            (self.emotions, self.emotion_tags) if column == "emotions"
+            else (self.triggers, self.trigger_tags)
+        )
+        counts = [0] * len(tags.names)
+        for mask in masks[lo:hi]:
+            while mask:
+                low_bit = mask & -mask
+                counts[low_bit.bit_length() - 1] += 1
+                mask ^= low_bit
+        return {name: count for name, count in zip(tags.names, counts) if count}
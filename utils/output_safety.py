@@ -0,0 +1,35 @@
+from data.crisis_keywords import CRISIS_RESOURCES, HARMFUL_OUTPUT_TERMS
+from utils.keyword_matcher import SAFETY_MATCHER
+from utils.metrics import REGISTRY
+
+FLAGGED_REPLIES = REGISTRY.counter(
+    "ai_reply_flagged_total",
+    "AI replies replaced by the safe template after the output safety scan",
+    ("reason",),
+)
+SCANNED_REPLIES = REGISTRY.counter("ai_reply_scanned_total", "AI replies checked by the output safety scan")
+
+SAFE_REPLY_TEMPLATE = (
+    "I want to make sure I respond to this safely. What you're going through matters, "
+    "and you don't have to handle it alone. If you're thinking about hurting yourself, "
+    "please reach out right now to {resource} or to someone you trust. "
+    "Would you like to try a grounding or breathing exercise together while we talk?"
+)
+
+
+def scan_reply(reply):
+    """Return the output-safety categories a reply hits (empty when clean)"""
+    SCANNED_REPLIES.inc()
+    hits = SAFETY_MATCHER.find(reply, categories=HARMFUL_OUTPUT_TERMS)
+    return sorted({category for _, category in hits})
+
+
+def enforce_reply_safety(reply):
+    """Return (reply, flagged): the original reply, or the safe template if it mentions
+    means or methods of harm, or contradicts crisis guidance"""
+    reasons = scan_reply(reply)
+    if not reasons:
+        return reply, False
+    for reason in reasons:
+        FLAGGED_REPLIES.inc(reason=reason)
+    return SAFE_REPLY_TEMPLATE.format(resource=CRISIS_RESOURCES["suicide_prevention"]["primary"]), True
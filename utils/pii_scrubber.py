@@ -0,0 +1,129 @@
+import os
+import re
+
+from utils.metrics import REGISTRY
+
+REDACTIONS = REGISTRY.counter(
+    "pii_redactions_total",
+    "Personal details replaced with placeholders before text is sent to Gemini",
+    ("kind",),
+)
+
+# Optional newline-separated list of names to redact (first names, surnames)
+PII_NAMES_FILE = os.environ.get("PII_NAMES_FILE")
+
+# Phone numbers: an optional +country code, then 10 national digits. Other
+# digit runs are dates, scores, ids and timestamps and are left alone.
+PHONE_DIGITS = 10
+
+_PLACEHOLDER_RE = re.compile(r"\[(EMAIL|URL|HANDLE|AADHAAR|PHONE|NAME)_(\d+)\]")
+
+# Order matters where alternatives overlap: a URL may contain an email or
+# an @handle, an email contains an @, and an Aadhaar number looks like a
+# 12-digit phone number. Every token starts where no word character (or
+# email/number punctuation) precedes it, so that check is factored out in
+# front of the alternation: positions inside words fail it at once instead
+# of trying each alternative in turn.
+_TOKEN_START = r"(?<![\w.+-])"
+_PATTERNS = (
+    ("url", r"(?:https?://|www\.)[^\s<>\"']*[^\s<>\"'.,;:!?)\]]"),
+    ("email", r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"),
+    ("handle", r"(?<!@)@\w{2,30}\b"),
+    ("aadhaar", r"[2-9]\d{3}[ -]?\d{4}[ -]?\d{4}(?![\w-])"),
+    # Phone shape: the 10 national digits start with 2-9 and come in at most
+    # three groups of two or more, so dates, epoch ids, ISBNs and runs of
+    # single-digit scores do not match; nor does a run into a time or a
+    # decimal. The lookahead finds the end of the digit run, and scrub
+    # checks that exactly 10 national digits were taken.
+    ("phone", r"(?P<country>\+\d{1,3})?[ -]?"
+              r"(?=\(?[2-9])(?=(?:[ ()-]{0,2}\d){10}(?![ ()-]{0,2}\d))"
+              r"\(?\d{2,10}\)?(?:[ -]\d{2,8}){0,2}(?![\w:]|\.\d)"),
+)
+
+
+def _trie_pattern(words):
+    """Regex alternation for a word list, factored into a prefix trie.
+
+    A flat ``a|b|c`` over thousands of names makes the engine try each in
+    turn at every word start; the trie shares prefixes so a miss costs a
+    few character comparisons.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        ends = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if ends else body
+
+    return build(trie)
+
+
+def load_names(path=PII_NAMES_FILE):
+    """Names from the gazetteer file, or none when it is not configured"""
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+class PIIScrubber:
+    """Single-pass redaction of personal details, with reversible placeholders.
+
+    ``scrub`` replaces each email, URL, @handle, Aadhaar-like ID, phone
+    number and gazetteer name with a numbered placeholder such as
+    ``[EMAIL_1]`` and returns the mapping back to the original text, so the
+    model's reply can be restored with ``restore`` before it is shown.
+    """
+
+    def __init__(self, names=()):
+        patterns = list(_PATTERNS)
+        names = sorted({name.lower() for name in names if len(name) > 1})
+        if names:
+            patterns.append(("name", _trie_pattern(names) + r"\b"))
+        self._regex = re.compile(
+            _TOKEN_START + "(?:" + "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in patterns) + ")",
+            re.IGNORECASE,
+        )
+
+    def scrub(self, text):
+        """Return (scrubbed text, {placeholder: original})"""
+        if not text:
+            return text, {}
+        placeholders = {}
+        counts = {}
+
+        def replace(match):
+            kind = match.lastgroup
+            value = match.group()
+            if kind == "phone":
+                national = value[len(match.group("country") or ""):]
+                if sum(char.isdigit() for char in national) != PHONE_DIGITS:
+                    return value
+            placeholder = placeholders.get(value)
+            if placeholder is None:
+                counts[kind] = counts.get(kind, 0) + 1
+                placeholder = placeholders[value] = f"[{kind.upper()}_{counts[kind]}]"
+            return placeholder
+
+        scrubbed = self._regex.sub(replace, text)
+        for kind, count in counts.items():
+            REDACTIONS.inc(count, kind=kind)
+        return scrubbed, {placeholder: value for value, placeholder in placeholders.items()}
+
+    @staticmethod
+    def restore(text, mapping):
+        """Put the original values back in place of any placeholders in text"""
+        if not mapping or not isinstance(text, str) or "[" not in text:
+            return text
+        return _PLACEHOLDER_RE.sub(lambda m: mapping.get(m.group(), m.group()), text)
+
+
+SCRUBBER = PIIScrubber(load_names())
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import REGISTRY
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "journal_prompt_cache_requests_total",
+    "Lookups in the shared mood-bucket prompt cache",
+    ("result",),
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "journal_prompt_cache_evictions_total",
+    "Buckets dropped from the shared prompt cache",
+    ("reason",),
+)
+
+
+def bucket_key(mood_context, recent_themes):
+    """Canonical, low-cardinality key for a mood context and theme list.
+
+    Average mood is rounded to a whole point, emotions become a sorted set
+    and only the names of the top three focus areas are kept.
+    """
+    average = int(round(float(mood_context.get("recent_average", 5))))
+    emotions = tuple(sorted(set(mood_context.get("common_emotions", []))))
+    themes = tuple(
+        theme[0] if isinstance(theme, (list, tuple)) else theme
+        for theme in recent_themes[:3]
+    )
+    return average, emotions, themes
+
+
+def bucket_context(key):
+    """Rebuild the (mood_context, recent_themes) a bucket stands for.
+
+    Generation requests send this instead of the session's exact values, so
+    whatever comes back depends only on the bucket and is safe to share.
+    """
+    average, emotions, themes = key
+    return {"recent_average": average, "common_emotions": list(emotions)}, list(themes)
+
+
+class _Bucket:
+    __slots__ = ("variants", "cursor", "created_at")
+
+    def __init__(self):
+        self.variants = []
+        self.cursor = 0
+        self.created_at = time.monotonic()
+
+
+class JournalPromptCache:
+    """Process-wide LRU cache of generated prompts, keyed by mood bucket.
+
+    Each bucket keeps up to ``variants`` prompts that are handed out
+    round-robin so repeat visitors still see some variety.
+    """
+
+    def __init__(self, max_buckets=512, variants=8, ttl=6 * 3600):
+        self.max_buckets = max_buckets
+        self.variants = variants
+        self.ttl = ttl
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live_bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return None
+        if time.monotonic() - bucket.created_at > self.ttl:
+            del self._buckets[key]
+            CACHE_EVICTIONS.inc(reason="ttl")
+            return None
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def get_many(self, key, count):
+        """Up to ``count`` distinct variants for a bucket, continuing the rotation"""
+        with self._lock:
+            bucket = self._live_bucket(key)
+            if bucket is None or not bucket.variants:
+                CACHE_REQUESTS.inc(result="miss")
+                return []
+            count = min(count, len(bucket.variants))
+            start = bucket.cursor
+            bucket.cursor = (start + count) % len(bucket.variants)
+            picked = [bucket.variants[(start + i) % len(bucket.variants)] for i in range(count)]
+        CACHE_REQUESTS.inc(result="hit")
+        return picked
+
+    def get(self, key):
+        picked = self.get_many(key, 1)
+        return picked[0] if picked else None
+
+    def put_many(self, key, prompts):
+        """Add freshly generated variants, keeping the newest ``variants`` per bucket"""
+        prompts = [p for p in prompts if isinstance(p, dict) and p.get("prompt")]
+        if not prompts:
+            return
+        with self._lock:
+            bucket = self._live_bucket(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket()
+            bucket.variants.extend(prompts)
+            overflow = len(bucket.variants) - self.variants
+            if overflow > 0:
+                del bucket.variants[:overflow]
+                bucket.cursor %= len(bucket.variants)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+                CACHE_EVICTIONS.inc(reason="capacity")
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+PROMPT_CACHE = JournalPromptCache(
+    max_buckets=int(os.environ.get("PROMPT_CACHE_BUCKETS", "512")),
+    ttl=float(os.environ.get("PROMPT_CACHE_TTL", str(6 * 3600))),
+)
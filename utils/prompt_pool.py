@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import Counter, deque
+
+import streamlit as st # type: ignore
+
+from utils.gemini_client import DEFAULT_DEADLINES, Deadline
+from utils.llm_scheduler import BACKGROUND, INTERACTIVE, get_scheduler
+from utils.metrics import REGISTRY
+from utils.prompt_cache import PROMPT_CACHE, bucket_context, bucket_key
+
+POOL_REQUESTS = REGISTRY.counter(
+    "journal_prompt_pool_requests_total",
+    "Personalized prompt requests served from the prefetch pool (hit) or not (miss)",
+    ("result",),
+)
+POOL_REFILLS = REGISTRY.counter(
+    "journal_prompt_pool_refills_total",
+    "Background batch generations for the prompt pool",
+    ("outcome",),
+)
+
+# A batch prompt generation is larger than a single one, and nobody is waiting on it
+PREFETCH_DEADLINE = DEFAULT_DEADLINES["journal"] * 2
+# Seconds to wait after a refill came back empty before queueing another
+REFILL_BACKOFF = 60
+
+
+def build_mood_context(data_manager):
+    """Summarize recent moods and journal themes for prompt personalization"""
+    recent_moods = data_manager.get_recent_mood_data(7)
+    emotion_counts = Counter(
+        emotion for entry in recent_moods for emotion in entry.get("emotions", [])
+    )
+    mood_context = {
+        "recent_average": round(
+            sum(m["overall_mood"] for m in recent_moods) / len(recent_moods), 1
+        ) if recent_moods else 5,
+        "common_emotions": [emotion for emotion, _ in emotion_counts.most_common(3)],
+    }
+    recent_themes = data_manager.get_journal_themes()[:3]
+    return mood_context, recent_themes
+
+
+class JournalPromptPool:
+    """Per-session pool of prefetched personalized journal prompts.
+
+    Refilled after mood or journal saves, from the shared bucket cache when
+    it has variants and otherwise by a background batch generation. Dropped
+    when the session moves to a different mood bucket.
+    """
+
+    def __init__(self, size=5, low_water=2, backoff=REFILL_BACKOFF):
+        self.size = size
+        self.low_water = low_water
+        self.backoff = backoff
+        self.last_failed_at = None
+        self.hits = 0
+        self.misses = 0
+        self._prompts = deque()
+        self._bucket = None
+        self._generation = 0
+        self._inflight = False
+        self._lock = threading.Lock()
+
+    def refresh(self, client, data_manager):
+        """Invalidate on a mood bucket change and top up the pool"""
+        key = bucket_key(*build_mood_context(data_manager))
+        with self._lock:
+            if key != self._bucket:
+                self._bucket = key
+                self._generation += 1
+                self._prompts.clear()
+                # A refill already running is for the old bucket; let it be discarded
+                self._inflight = False
+            if self._inflight or len(self._prompts) >= self.low_water:
+                return
+            cached = PROMPT_CACHE.get_many(key, self.size - len(self._prompts))
+            self._prompts.extend(cached)
+            if len(self._prompts) >= self.low_water:
+                return
+            # Don't queue batch after batch while the model is failing
+            if self.last_failed_at is not None and time.monotonic() - self.last_failed_at < self.backoff:
+                return
+            self._inflight = True
+            generation = self._generation
+
+        mood_context, recent_themes = bucket_context(key)
+        future = get_scheduler().submit(
+            BACKGROUND,
+            client.generate_personalized_journal_prompts,
+            mood_context,
+            recent_themes,
+            count=self.size,
+            deadline=Deadline(PREFETCH_DEADLINE),
+        )
+        future.add_done_callback(lambda f: self._fill(key, generation, f))
+
+    def _fill(self, key, generation, future):
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+        prompts = result.get("prompts", []) if isinstance(result, dict) else []
+        POOL_REFILLS.inc(outcome="ok" if prompts else "failed")
+        # Generated from the bucket context only, so other sessions can reuse them
+        PROMPT_CACHE.put_many(key, prompts)
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._inflight = False
+            self.last_failed_at = None if prompts else time.monotonic()
+            self._prompts.extend(prompts[: self.size - len(self._prompts)])
+
+    def take(self):
+        """Pop a prefetched prompt, or None when the pool is empty"""
+        with self._lock:
+            prompt = self._prompts.popleft() if self._prompts else None
+            if prompt is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        POOL_REQUESTS.inc(result="hit" if prompt else "miss")
+        return prompt
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self._prompts)
+
+
+def get_prompt_pool():
+    if 'journal_prompt_pool' not in st.session_state:
+        st.session_state.journal_prompt_pool = JournalPromptPool()
+    return st.session_state.journal_prompt_pool
+
+
+def generate_prompt_now(client, data_manager):
+    """Pool miss path: shared cache first, then a blocking interactive call"""
+    key = bucket_key(*build_mood_context(data_manager))
+    cached = PROMPT_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    mood_context, recent_themes = bucket_context(key)
+    # The user is waiting on this click, so it is not background work
+    result = get_scheduler().run(
+        client.generate_personalized_journal_prompt,
+        mood_context,
+        recent_themes,
+        feature="journal",
+        priority=INTERACTIVE,
+    )
+    if isinstance(result, dict) and result.get("prompt"):
+        PROMPT_CACHE.put_many(key, [result])
+    return result
+
+
+def prefetch_journal_prompts():
+    """Kick off a background refill after a save; silently skipped without a client"""
+    client = st.session_state.get("gemini_client")
+    data_manager = st.session_state.get("data_manager")
+    if client is None or data_manager is None:
+        return
+    try:
+        get_prompt_pool().refresh(client, data_manager)
+    except Exception:
+        pass
@@ -0,0 +1,121 @@
+import base64
+import json
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Envelope: 1-byte version | 12-byte nonce | AES-256-GCM ciphertext + 16-byte tag.
+# 29 bytes of overhead per record, stored as a raw BLOB (no base64).
+ENVELOPE_VERSION = 1
+NONCE_SIZE = 12
+_HEADER = struct.Struct("B")
+
+# Key derivation context; changing it makes every stored record unreadable
+_KDF_INFO_PREFIX = b"wellness-records-v1:"
+
+
+class RecordDecryptError(ValueError):
+    """Raised when an envelope is malformed, tampered with or for another user"""
+
+
+def generate_master_key():
+    """New random master key, in the form WELLNESS_MASTER_KEY expects"""
+    return base64.urlsafe_b64encode(AESGCM.generate_key(bit_length=256)).decode()
+
+
+def load_master_key():
+    """Master key from WELLNESS_MASTER_KEY (urlsafe base64 of 32 bytes)"""
+    encoded = os.environ.get("WELLNESS_MASTER_KEY")
+    if not encoded:
+        raise EnvironmentError("❌ WELLNESS_MASTER_KEY not set.")
+    key = base64.urlsafe_b64decode(encoded)
+    if len(key) != 32:
+        raise EnvironmentError("❌ WELLNESS_MASTER_KEY must encode 32 bytes.")
+    return key
+
+
+class RecordCipher:
+    """AES-256-GCM encryption of record payloads with per-user keys.
+
+    Each user's key is derived from the master key with HKDF, and the
+    user id and record kind are bound in as associated data, so a row
+    copied to another user or kind fails to decrypt. The ``*_many``
+    methods reuse one key schedule and draw all nonces in a single
+    ``os.urandom`` call.
+    """
+
+    def __init__(self, master_key):
+        self._master_key = master_key
+        self._aeads = {}
+
+    def _aead(self, user_id):
+        aead = self._aeads.get(user_id)
+        if aead is None:
+            key = HKDF(
+                algorithm=hashes.SHA256(), length=32, salt=None,
+                info=_KDF_INFO_PREFIX + user_id.encode(),
+            ).derive(self._master_key)
+            aead = self._aeads[user_id] = AESGCM(key)
+        return aead
+
+    def forget(self, user_id):
+        """Drop a user's cached key schedule (after their data is deleted)"""
+        self._aeads.pop(user_id, None)
+
+    @staticmethod
+    def _aad(user_id, kind):
+        return f"{user_id}\x00{kind}".encode()
+
+    @staticmethod
+    def _dumps(record):
+        return json.dumps(record, separators=(",", ":"), default=str).encode()
+
+    def seal(self, user_id, kind, payload):
+        """Encrypt raw bytes (e.g. a compressed archive segment) into an envelope"""
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext = self._aead(user_id).encrypt(nonce, payload, self._aad(user_id, kind))
+        return _HEADER.pack(ENVELOPE_VERSION) + nonce + ciphertext
+
+    def unseal(self, user_id, kind, envelope):
+        return self._unseal(self._aead(user_id), self._aad(user_id, kind), envelope)
+
+    def encrypt(self, user_id, kind, record):
+        """Seal one record dict into a binary envelope"""
+        return self.seal(user_id, kind, self._dumps(record))
+
+    def encrypt_many(self, user_id, kind, records):
+        aead, aad = self._aead(user_id), self._aad(user_id, kind)
+        header = _HEADER.pack(ENVELOPE_VERSION)
+        nonces = os.urandom(NONCE_SIZE * len(records))
+        sealed = []
+        for index, record in enumerate(records):
+            nonce = nonces[index * NONCE_SIZE:(index + 1) * NONCE_SIZE]
+            sealed.append(header + nonce + aead.encrypt(nonce, self._dumps(record), aad))
+        return sealed
+
+    def decrypt(self, user_id, kind, envelope):
+        """Open one envelope back into a record dict"""
+        return self._open(self._aead(user_id), self._aad(user_id, kind), envelope)
+
+    def decrypt_many(self, user_id, kind, envelopes):
+        aead, aad = self._aead(user_id), self._aad(user_id, kind)
+        return [self._open(aead, aad, envelope) for envelope in envelopes]
+
+    @classmethod
+    def _open(cls, aead, aad, envelope):
+        return json.loads(cls._unseal(aead, aad, envelope))
+
+    @staticmethod
+    def _unseal(aead, aad, envelope):
+        envelope = bytes(envelope)
+        if len(envelope) < 1 + NONCE_SIZE + 16 or envelope[0] != ENVELOPE_VERSION:
+            raise RecordDecryptError("unknown envelope format")
+        nonce = envelope[1:1 + NONCE_SIZE]
+        try:
+            return aead.decrypt(nonce, envelope[1 + NONCE_SIZE:], aad)
+        except InvalidTag:
+            raise RecordDecryptError("authentication failed") from None
@@ -0,0 +1,184 @@
+import sys
+from dataclasses import dataclass, fields
+from operator import attrgetter
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _intern_tags(names):
+    """Emotion/trigger names as a tuple of interned strings"""
+    if names is None:
+        return None
+    if isinstance(names, str):
+        names = [names]
+    return tuple(sys.intern(name) if isinstance(name, str) else name for name in names)
+
+
+class Record:
+    """Dict-style reads shared by the slotted record types.
+
+    Records used to be plain dicts, and callers still read them as such
+    (``record["timestamp"]``, ``record.get("emotions", [])``). A field
+    holding None reads as absent, matching dicts that never had the key.
+    """
+
+    __slots__ = ()
+
+    # Set per subclass by record_type()
+    _fields = ()
+    _values = None
+    # Fields holding short, repetitive strings (personas, roles, focus
+    # areas, technique names) that are interned, and tag lists
+    _interned = ()
+    _tags = ()
+
+    def __post_init__(self):
+        for name in self._interned:
+            setattr(self, name, _intern(getattr(self, name)))
+        for name in self._tags:
+            setattr(self, name, _intern_tags(getattr(self, name)))
+
+    @classmethod
+    def from_dict(cls, data):
+        get = data.get
+        return cls(*[get(name) for name in cls._fields])
+
+    def to_dict(self):
+        return {name: value for name, value in zip(self._fields, self._values(self)) if value is not None}
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self._fields else None
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return key in self._fields and getattr(self, key) is not None
+
+    def keys(self):
+        return [name for name, value in zip(self._fields, self._values(self)) if value is not None]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+def record_type(interned=(), tags=()):
+    """Make a Record subclass a slotted dataclass with the given interned fields"""
+    def wrap(cls):
+        cls = dataclass(slots=True)(cls)
+        cls._fields = tuple(field.name for field in fields(cls))
+        cls._values = attrgetter(*cls._fields)
+        cls._interned = interned
+        cls._tags = tags
+        return cls
+    return wrap
+
+
+@record_type(interned=("role", "persona", "risk_level"))
+class ChatMessage(Record):
+    id: int = None
+    timestamp: str = None
+    role: str = None
+    content: str = None
+    persona: str = None
+    risk_level: str = None
+
+
+@record_type(tags=("emotions", "triggers"))
+class MoodEntry(Record):
+    id: int = None
+    timestamp: str = None
+    overall_mood: int = None
+    emotions: tuple = None
+    intensity: int = None
+    triggers: tuple = None
+    notes: str = None
+
+
+@record_type(interned=("focus_area",))
+class JournalEntry(Record):
+    id: int = None
+    timestamp: str = None
+    prompt: str = None
+    content: str = None
+    focus_area: str = None
+    mood_before: int = None
+    mood_after: int = None
+    insights: object = None
+
+
+@record_type(tags=("emotions",))
+class CBTRecord(Record):
+    id: int = None
+    timestamp: str = None
+    situation: str = None
+    thoughts: str = None
+    emotions: tuple = None
+    intensity_before: int = None
+    evidence_for: str = None
+    evidence_against: str = None
+    balanced_thought: str = None
+    intensity_after: int = None
+    ai_insights: object = None
+
+
+@record_type(interned=("type", "session_id"))
+class CrisisEvent(Record):
+    id: int = None
+    timestamp: str = None
+    type: str = None
+    session_id: str = None
+
+
+@record_type(interned=("technique", "duration"))
+class BreathingSession(Record):
+    id: int = None
+    timestamp: str = None
+    technique: str = None
+    duration: str = None
+    cycles_completed: int = None
+    relaxation_after: int = None
+    anxiety_after: int = None
+
+
+RECORD_TYPES = {
+    "chat": ChatMessage,
+    "mood": MoodEntry,
+    "journal": JournalEntry,
+    "cbt": CBTRecord,
+    "crisis": CrisisEvent,
+    "breathing": BreathingSession,
+}
+
+
+def as_record(kind, data):
+    """The typed record for a dict (records pass through unchanged)"""
+    return data if isinstance(data, Record) else RECORD_TYPES[kind].from_dict(data)
+
+
+def as_dict(record):
+    """A plain dict for JSON encoding (dicts pass through unchanged)"""
+    return record.to_dict() if isinstance(record, Record) else record
+
+
+def record_size(record):
+    """Approximate bytes held by a record: the object, its values and the
+    items of tuple values (shared interned names are counted too)"""
+    size = sys.getsizeof(record)
+    for value in (record._values(record) if isinstance(record, Record) else record.values()):
+        if value is None:
+            continue
+        size += sys.getsizeof(value)
+        if isinstance(value, (tuple, list)):
+            size += sum(sys.getsizeof(item) for item in value)
+    return size
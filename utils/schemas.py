@@ -0,0 +1,298 @@
+import json
+import math
+
+# Response schemas in the OpenAPI subset accepted by Gemini's response_schema.
+# The same dicts drive the local validators below, so the model and the
+# parser always agree on the shape.
+CBT_INSIGHT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cognitive_distortions": {"type": "array", "items": {"type": "string"}},
+        "balanced_thoughts": {"type": "array", "items": {"type": "string"}},
+        "encouragement": {"type": "string"},
+    },
+    "required": ["cognitive_distortions", "balanced_thoughts", "encouragement"],
+}
+
+JOURNAL_PROMPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "prompt": {"type": "string"},
+        "follow_up_questions": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["prompt"],
+}
+
+JOURNAL_PROMPT_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "prompts": {"type": "array", "items": JOURNAL_PROMPT_SCHEMA},
+    },
+    "required": ["prompts"],
+}
+
+CRISIS_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "risk_level": {"type": "string", "enum": ["LOW", "MODERATE", "HIGH", "SEVERE"]},
+        "keywords_detected": {"type": "array", "items": {"type": "string"}},
+        "analysis": {"type": "string"},
+    },
+    "required": ["risk_level", "keywords_detected", "analysis"],
+}
+
+# Stored record shapes, for validating data restored from an export. Ids are
+# not listed: the importer assigns new ones.
+_STRING = {"type": "string"}
+_INTEGER = {"type": "integer"}
+# The 1-10 ratings the app's sliders produce
+_RATING = {"type": "integer", "minimum": 1, "maximum": 10}
+_STRING_LIST = {"type": "array", "items": _STRING}
+
+MOOD_RECORD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "timestamp": _STRING,
+        "overall_mood": _RATING,
+        "emotions": _STRING_LIST,
+        "intensity": _RATING,
+        "triggers": _STRING_LIST,
+        "notes": _STRING,
+    },
+    "required": ["timestamp", "overall_mood"],
+}
+
+JOURNAL_RECORD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "timestamp": _STRING,
+        "prompt": _STRING,
+        "content": _STRING,
+        "focus_area": _STRING,
+        "mood_before": _RATING,
+        "mood_after": _RATING,
+        "insights": {},
+    },
+    "required": ["timestamp", "content"],
+}
+
+CBT_RECORD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "timestamp": _STRING,
+        "situation": _STRING,
+        "thoughts": _STRING,
+        "emotions": _STRING_LIST,
+        "intensity_before": _RATING,
+        "evidence_for": _STRING,
+        "evidence_against": _STRING,
+        "balanced_thought": _STRING,
+        "intensity_after": _RATING,
+        "ai_insights": {},
+    },
+    "required": ["timestamp", "situation"],
+}
+
+BREATHING_RECORD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "timestamp": _STRING,
+        "technique": _STRING,
+        "duration": _STRING,
+        "cycles_completed": {"type": "integer", "minimum": 0},
+        "relaxation_after": _RATING,
+        "anxiety_after": _RATING,
+    },
+    "required": ["timestamp", "technique"],
+}
+
+CHAT_RECORD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "timestamp": _STRING,
+        "role": {"type": "string", "enum": ["user", "assistant"]},
+        "content": _STRING,
+        "persona": _STRING,
+        "risk_level": _STRING,
+    },
+    "required": ["timestamp", "role", "content"],
+}
+
+
+class SchemaError(ValueError):
+    """Raised when a value cannot be coerced into its schema"""
+
+    def __init__(self, path, message):
+        self.path = path or "$"
+        super().__init__(f"{self.path}: {message}")
+
+
+def _compile_string(schema):
+    enum = schema.get("enum")
+    lookup = {value.upper(): value for value in enum} if enum else None
+
+    def coerce(value, path):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str):
+            raise SchemaError(path, f"expected string, got {type(value).__name__}")
+        value = value.strip()
+        if lookup is not None:
+            try:
+                return lookup[value.upper()]
+            except KeyError:
+                raise SchemaError(path, f"expected one of {enum}, got {value!r}") from None
+        return value
+    return coerce
+
+
+def _compile_number(schema):
+    integer = schema["type"] == "integer"
+    minimum = schema.get("minimum")
+    maximum = schema.get("maximum")
+
+    def coerce(value, path):
+        if isinstance(value, bool):
+            raise SchemaError(path, "expected number, got boolean")
+        try:
+            number = float(value)
+        except (TypeError, ValueError, OverflowError):
+            raise SchemaError(path, f"expected number, got {value!r}")
+        if not math.isfinite(number):
+            raise SchemaError(path, f"expected a finite number, got {value!r}")
+        if integer:
+            number = int(number)
+        if minimum is not None and number < minimum:
+            raise SchemaError(path, f"expected at least {minimum}, got {number}")
+        if maximum is not None and number > maximum:
+            raise SchemaError(path, f"expected at most {maximum}, got {number}")
+        return number
+    return coerce
+
+
+def _compile_boolean(schema):
+    def coerce(value, path):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        raise SchemaError(path, f"expected boolean, got {value!r}")
+    return coerce
+
+
+def _compile_array(schema):
+    item = _compile(schema.get("items", {}))
+    scalar_items = schema.get("items", {}).get("type") in ("string", "number", "integer")
+
+    def coerce(value, path):
+        # Models often collapse a one-element list into a bare value
+        if not isinstance(value, list):
+            if value is None or value == "":
+                return []
+            if scalar_items or isinstance(value, dict):
+                value = [value]
+            else:
+                raise SchemaError(path, f"expected array, got {type(value).__name__}")
+        return [item(element, f"{path}[{index}]") for index, element in enumerate(value)]
+    return coerce
+
+
+def _compile_object(schema):
+    properties = [
+        (name, _compile(sub_schema))
+        for name, sub_schema in schema.get("properties", {}).items()
+    ]
+    required = frozenset(schema.get("required", ()))
+
+    def coerce(value, path):
+        if not isinstance(value, dict):
+            raise SchemaError(path, f"expected object, got {type(value).__name__}")
+        result = {}
+        for name, validator in properties:
+            if name in value and value[name] is not None:
+                result[name] = validator(value[name], f"{path}.{name}")
+            elif name in required:
+                raise SchemaError(f"{path}.{name}", "missing required field")
+        return result
+    return coerce
+
+
+def _compile_any(schema):
+    return lambda value, path: value
+
+
+_COMPILERS = {
+    "string": _compile_string,
+    "number": _compile_number,
+    "integer": _compile_number,
+    "boolean": _compile_boolean,
+    "array": _compile_array,
+    "object": _compile_object,
+}
+
+
+def _compile(schema):
+    return _COMPILERS.get(schema.get("type"), _compile_any)(schema)
+
+
+def compile_validator(schema):
+    """Build a coercing validator ``fn(value)`` for a schema once.
+
+    The schema is walked a single time up front; validation is then a chain
+    of closures with no per-call dispatch on the schema dict. Unknown keys
+    are dropped, scalars are coerced where unambiguous and anything else
+    raises SchemaError with the offending path.
+    """
+    validator = _compile(schema)
+
+    def validate(value, path=""):
+        return validator(value, path)
+    return validate
+
+
+def extract_json(raw):
+    """Parse a JSON object, tolerating prose or code fences around it.
+
+    Unlike a greedy ``{.*}`` search, this decodes from the first ``{`` and
+    stops at the end of that object.
+    """
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        pass
+    if not isinstance(raw, str):
+        raise ValueError("no JSON in response")
+    decoder = json.JSONDecoder()
+    start = raw.find("{")
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(raw, start)
+            return value
+        except ValueError:
+            start = raw.find("{", start + 1)
+    raise ValueError("no JSON object in response")
+
+
+VALIDATORS = {
+    "cbt_insight": compile_validator(CBT_INSIGHT_SCHEMA),
+    "journal_prompt": compile_validator(JOURNAL_PROMPT_SCHEMA),
+    "journal_prompt_batch": compile_validator(JOURNAL_PROMPT_BATCH_SCHEMA),
+    "crisis_analysis": compile_validator(CRISIS_ANALYSIS_SCHEMA),
+}
+
+RESPONSE_SCHEMAS = {
+    "cbt_insight": CBT_INSIGHT_SCHEMA,
+    "journal_prompt": JOURNAL_PROMPT_SCHEMA,
+    "journal_prompt_batch": JOURNAL_PROMPT_BATCH_SCHEMA,
+    "crisis_analysis": CRISIS_ANALYSIS_SCHEMA,
+}
+
+RECORD_SCHEMAS = {
+    "mood": MOOD_RECORD_SCHEMA,
+    "journal": JOURNAL_RECORD_SCHEMA,
+    "cbt": CBT_RECORD_SCHEMA,
+    "breathing": BREATHING_RECORD_SCHEMA,
+    "chat": CHAT_RECORD_SCHEMA,
+}
+
+RECORD_VALIDATORS = {kind: compile_validator(schema) for kind, schema in RECORD_SCHEMAS.items()}
@@ -0,0 +1,350 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import streamlit as st # type: ignore
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from utils.metrics import REGISTRY
+from utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FRAMES = REGISTRY.counter(
+    "session_snapshot_frames_total",
+    "Frames appended to session snapshots",
+    ("op",),
+)
+SNAPSHOT_RESTORES = REGISTRY.counter(
+    "session_snapshot_restores_total",
+    "Sessions picked up from a snapshot after a restart",
+)
+SNAPSHOT_EXPIRED = REGISTRY.counter(
+    "session_snapshot_expired_total",
+    "Users of expired snapshots cleaned up, by whether their stored records were deleted",
+    ("data",),
+)
+
+# Snapshots let a session survive a process restart (e.g. a deploy). The
+# browser keeps an anonymous token in the URL; the server keeps, per token,
+# an encrypted append-only file of state changes, and beside it a plain
+# file naming the session's user_id. A token untouched for SNAPSHOT_TTL
+# expires: its snapshot goes, and with persistent storage so do the user's
+# records, which nothing can reach without the token.
+# With several replicas, the directory must be one they all share.
+SNAPSHOT_DIR = os.environ.get("WELLNESS_SNAPSHOT_DIR", ".snapshots")
+SNAPSHOT_TTL = int(os.environ.get("WELLNESS_SNAPSHOT_TTL", 7 * 24 * 3600))
+TOKEN_PARAM = "session"
+
+# Session values saved alongside the records
+SNAPSHOT_VALUES = ("user_id", "session_start", "current_persona", "encryption_key", "id_counters")
+
+# File: magic | version byte, then frames of 4-byte length | nonce | AES-GCM
+# ciphertext of a zlib-compressed JSON operation
+MAGIC = b"WSNP"
+SNAPSHOT_VERSION = 1
+NONCE_SIZE = 12
+_HEADER = MAGIC + bytes([SNAPSHOT_VERSION])
+_LENGTH = struct.Struct(">I")
+_KDF_INFO = b"wellness-snapshot-v1"
+
+# Delta frames tolerated before the file is rewritten as a single base frame;
+# never fewer than the records in the base, so compaction stays amortized O(1)
+COMPACT_MIN_DELTAS = 64
+GC_INTERVAL = 3600
+
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{32,64}$")
+
+_gc_lock = threading.Lock()
+_last_gc = None
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+class SnapshotState:
+    """Session values and records rebuilt from a snapshot"""
+
+    def __init__(self):
+        self.values = {}
+        self.records = {}
+
+    def __bool__(self):
+        return bool(self.values or self.records)
+
+    def apply(self, op):
+        kind = op.get("kind")
+        if op["op"] == "base":
+            self.values = dict(op["values"])
+            self.records = {kind: list(records) for kind, records in op["records"].items()}
+        elif op["op"] == "values":
+            self.values.update(op["values"])
+        elif op["op"] == "append":
+            self.records.setdefault(kind, []).extend(op["records"])
+        elif op["op"] == "replace_last":
+            records = self.records.get(kind)
+            if records:
+                records[-1] = op["record"]
+        elif op["op"] == "update":
+            records = self.records.get(kind, [])
+            for index, record in enumerate(records):
+                if record.get("id") == op["record"].get("id"):
+                    records[index] = op["record"]
+                    break
+        elif op["op"] == "delete":
+            self.records[kind] = [record for record in self.records.get(kind, []) if record.get("id") != op["id"]]
+        else:
+            raise ValueError(f"unknown snapshot op {op['op']!r}")
+
+
+class SessionSnapshot:
+    """Encrypted, append-only snapshot file for one session token.
+
+    Each change is one small frame appended to the file; once deltas
+    outnumber the base, the file is rewritten from the full state. The key
+    is derived from the token, and the file is named by the token's hash,
+    so a snapshot can only be read by whoever holds the URL. The user_id
+    is also kept in the clear beside it (``user_path``), so that garbage
+    collection can delete the user's stored records when the token expires.
+    """
+
+    def __init__(self, token, directory=SNAPSHOT_DIR):
+        self.token = token
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        self.path = os.path.join(directory, digest + ".snap")
+        self.user_path = _user_path(self.path)
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=_KDF_INFO).derive(token.encode())
+        self._aead = AESGCM(key)
+        self._lock = threading.Lock()
+        self._deltas = 0
+        self._base_records = 0
+        self.values = {}
+        # Records from a restored snapshot, until DataManager takes them
+        self.pending_records = None
+
+    def _frame(self, op):
+        payload = zlib.compress(json.dumps(op, separators=(",", ":"), default=str).encode())
+        nonce = os.urandom(NONCE_SIZE)
+        sealed = nonce + self._aead.encrypt(nonce, payload, _HEADER)
+        return _LENGTH.pack(len(sealed)) + sealed
+
+    def _open(self, sealed):
+        payload = self._aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], _HEADER)
+        return json.loads(zlib.decompress(payload))
+
+    def load(self):
+        """Replay the snapshot file; an empty SnapshotState if there is none"""
+        state = SnapshotState()
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return state
+        # Reopening the token counts as use, even if nothing is written
+        # afterwards: expiry (collect_garbage) goes by these files' mtimes
+        for path in (self.path, self.user_path):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+        if not data.startswith(_HEADER):
+            logger.warning("ignoring snapshot %s with unknown format", self.path)
+            return state
+
+        pos, frames = len(_HEADER), 0
+        while pos + _LENGTH.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, pos)
+            sealed = data[pos + _LENGTH.size:pos + _LENGTH.size + length]
+            if len(sealed) < length:
+                break  # cut off mid-write by the restart; keep what came before
+            try:
+                state.apply(self._open(sealed))
+            except (InvalidTag, ValueError, zlib.error) as e:
+                logger.warning("stopping at unreadable snapshot frame in %s: %s", self.path, e)
+                break
+            pos += _LENGTH.size + length
+            frames += 1
+
+        with self._lock:
+            self._deltas = max(frames - 1, 0)
+            self._base_records = sum(len(records) for records in state.records.values())
+            self.values = dict(state.values)
+        self.pending_records = state.records
+        if state:
+            SNAPSHOT_RESTORES.inc()
+        return state
+
+    def _note_user(self, values):
+        """Write the user_id file when a change names a new user; call with
+        the lock held"""
+        user_id = values.get("user_id")
+        if not user_id or user_id == self.values.get("user_id"):
+            return
+        tmp_path = f"{self.user_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(user_id)
+        os.replace(tmp_path, self.user_path)
+
+    def append(self, op):
+        """Append one change; True when the file is due for compaction"""
+        frame = self._frame(op)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if op["op"] == "values":
+                self._note_user(op["values"])
+            with open(self.path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(_HEADER)
+                f.write(frame)
+            self._deltas += 1
+            if op["op"] == "values":
+                self.values.update(op["values"])
+            due = self._deltas >= max(COMPACT_MIN_DELTAS, self._base_records)
+        SNAPSHOT_FRAMES.inc(op=op["op"])
+        return due
+
+    def write_base(self, values, records):
+        """Replace the file with a single frame holding the full state"""
+        frame = self._frame({"op": "base", "values": values, "records": records})
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._note_user(values)
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER + frame)
+            os.replace(tmp_path, self.path)
+            self._deltas = 0
+            self._base_records = sum(len(kind_records) for kind_records in records.values())
+            self.values = dict(values)
+        SNAPSHOT_FRAMES.inc(op="base")
+
+    def delete(self):
+        with self._lock:
+            for path in (self.path, self.user_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._deltas = 0
+            self._base_records = 0
+            self.values = {}
+
+
+def session_values(session_state):
+    """The SNAPSHOT_VALUES present in session_state, as JSON-friendly values"""
+    values = {}
+    for key in SNAPSHOT_VALUES:
+        if key in session_state:
+            value = session_state[key]
+            if isinstance(value, bytes):
+                value = value.decode()
+            elif hasattr(value, "isoformat"):
+                value = value.isoformat()
+            elif isinstance(value, dict):
+                # A copy, so later changes in place still show as changes
+                value = dict(value)
+            values[key] = value
+    return values
+
+
+def restore_session_values(values, session_state):
+    """Put snapshotted values back into session_state (inverse of session_values)"""
+    for key, value in values.items():
+        if key == "session_start":
+            value = datetime.fromisoformat(value)
+        elif key == "encryption_key":
+            value = value.encode()
+        elif isinstance(value, dict):
+            value = dict(value)
+        session_state[key] = value
+
+
+def _user_path(path):
+    return path[:-len(".snap")] + ".user"
+
+
+def _read_user(path):
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def collect_garbage(directory=SNAPSHOT_DIR, ttl=SNAPSHOT_TTL, now=None, delete_user=None):
+    """Delete snapshots untouched for longer than ttl, and call
+    ``delete_user(user_id)`` for the user each one belonged to; returns
+    how many snapshots were removed"""
+    now = time.time() if now is None else now
+
+    def expired(path):
+        try:
+            return now - os.path.getmtime(path) > ttl
+        except FileNotFoundError:
+            return False
+
+    removed = 0
+    for path in glob.glob(os.path.join(directory, "*.snap")) + glob.glob(os.path.join(directory, "*.tmp")):
+        if expired(path):
+            _remove(path)
+            removed += path.endswith(".snap")
+    # A user_id file outlives its snapshot until the user's records are
+    # gone, so a failed delete is retried by the next collection. (Its
+    # snapshot is always written after it, so it is never the older one.)
+    for user_path in glob.glob(os.path.join(directory, "*.user")):
+        if os.path.exists(user_path[:-len(".user")] + ".snap") or not expired(user_path):
+            continue
+        user_id = _read_user(user_path)
+        if delete_user is not None and user_id:
+            try:
+                delete_user(user_id)
+            except Exception:
+                logger.exception("deleting the records of an expired snapshot failed")
+                continue
+        SNAPSHOT_EXPIRED.inc(data="deleted" if delete_user is not None else "kept")
+        _remove(user_path)
+    return removed
+
+
+def _maybe_collect_garbage():
+    global _last_gc
+    with _gc_lock:
+        now = time.monotonic()
+        if _last_gc is not None and now - _last_gc < GC_INTERVAL:
+            return
+        _last_gc = now
+    storage = get_storage()
+    # Session-state storage holds only the current session's records,
+    # which go with the session anyway
+    collect_garbage(delete_user=storage.delete_user if storage.persistent else None)
+
+
+def open_session_snapshot():
+    """Snapshot for this browser session's URL token, minting a token if the
+    URL has none; call load() on it to pick up state from before a restart"""
+    token = st.query_params.get(TOKEN_PARAM)
+    if not token or not _TOKEN_RE.match(token):
+        token = new_token()
+        st.query_params[TOKEN_PARAM] = token
+    _maybe_collect_garbage()
+    return SessionSnapshot(token)
@@ -0,0 +1,725 @@
+import atexit
+import heapq
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import zlib
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import streamlit as st # type: ignore
+
+from utils.record_cipher import RecordCipher, RecordDecryptError, load_master_key
+from utils.records import RECORD_TYPES, as_dict, as_record
+from utils.write_behind import WriteBehindStore
+
+logger = logging.getLogger(__name__)
+
+# Record kinds and the session_state list each one lives in for the
+# session_state backend
+KINDS = {
+    "chat": "chat_history",
+    "mood": "mood_entries",
+    "journal": "journal_entries",
+    "cbt": "cbt_records",
+    "crisis": "crisis_events",
+    "breathing": "breathing_sessions",
+}
+
+# "session" keeps records in st.session_state (development default; lost on
+# restart); "sqlite" persists them to WELLNESS_DB_PATH, encrypted with a
+# key derived from WELLNESS_MASTER_KEY
+WELLNESS_STORAGE = os.environ.get("WELLNESS_STORAGE", "session")
+WELLNESS_DB_PATH = os.environ.get("WELLNESS_DB_PATH", "wellness.db")
+# "1" puts a write-behind queue in front of the sqlite backend (see
+# utils.write_behind), so saves do not wait for the database. Off by
+# default: a queued save is only durable, and visible to other replicas,
+# once flushed, so a crash can lose the last moments of writes.
+WELLNESS_WRITE_BEHIND = os.environ.get("WELLNESS_WRITE_BEHIND", "0") == "1"
+
+# SQLite connections per process. Several app replicas can share one
+# database file (on a volume they all mount): SQLite serializes their
+# writes, and WAL lets reads proceed alongside them.
+WELLNESS_DB_POOL_SIZE = int(os.environ.get("WELLNESS_DB_POOL_SIZE", 4))
+# Seconds a write waits for another process to release the write lock
+DB_BUSY_TIMEOUT = 30
+# Per-user write locks within a process, striped so they never pile up
+USER_LOCK_STRIPES = 64
+
+# Records older than this many days move from the records table into
+# compressed archive segments of up to ARCHIVE_SEGMENT records each
+ARCHIVE_AFTER_DAYS = int(os.environ.get("WELLNESS_ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_SEGMENT = 1000
+
+
+def _timestamp(record):
+    return record["timestamp"]
+
+
+class StorageBackend:
+    """Where DataManager keeps a user's records.
+
+    Records are the slotted types from utils.records (dicts are accepted on
+    write) with an ISO ``timestamp``; every read returns them oldest first.
+    Callers must treat returned records as read-only.
+
+    Each record also has an ``id``, unique per user and kind: ids come from
+    ``allocate_ids``, which never hands out the same id twice, even after
+    deletes or ``delete_user``. ``get``, ``update`` and ``delete`` find a record by its id.
+
+    Backends shared between processes also keep a per-user version that
+    every write bumps: writes return the new version, and ``version``
+    reads it, so a process can tell when another one changed a user's
+    data behind its caches. Process-local backends return None for both.
+    Deferred writes (see utils.write_behind) return None too, but still
+    count one version each once applied.
+    """
+
+    # Whether records outlive the process (session snapshots cover the rest)
+    persistent = False
+
+    def append(self, user_id, kind, record):
+        raise NotImplementedError
+
+    def append_many(self, user_id, kind, records):
+        for record in records:
+            self.append(user_id, kind, record)
+
+    def records(self, user_id, kind, since=None, limit=None):
+        """Records of one kind, optionally only those at or after ``since``
+        (an ISO timestamp) and/or only the newest ``limit``"""
+        raise NotImplementedError
+
+    def iter_records(self, user_id, kind, batch_size=500):
+        """Yield records oldest first, holding at most one batch in memory"""
+        yield from self.records(user_id, kind)
+
+    def count(self, user_id, kind):
+        raise NotImplementedError
+
+    def replace_last(self, user_id, kind, record):
+        """Overwrite the newest record of a kind (e.g. a session's check-in)"""
+        raise NotImplementedError
+
+    def allocate_ids(self, user_id, kind, count=1):
+        """Reserve ``count`` consecutive new record ids; returns the first"""
+        raise NotImplementedError
+
+    def get(self, user_id, kind, record_id):
+        """The record with this id, or None"""
+        raise NotImplementedError
+
+    def update(self, user_id, kind, record):
+        """Overwrite the stored record with the same id (and timestamp) as
+        ``record``; raises KeyError if there is none"""
+        raise NotImplementedError
+
+    def delete(self, user_id, kind, record_id):
+        """Remove one record; raises KeyError if there is none"""
+        raise NotImplementedError
+
+    def delete_user(self, user_id):
+        raise NotImplementedError
+
+    def archive(self, user_id, before):
+        """Move records older than ``before`` (ISO) to cold storage; returns
+        how many moved. Backends without a cold tier keep everything."""
+        return 0
+
+    def version(self, user_id):
+        return None
+
+    def sync(self, user_id=None):
+        """Make writes so far durable on disk (for one user, or all)"""
+
+
+class ConnectionPool:
+    """A fixed set of SQLite connections, lent out one per operation.
+
+    Connections run in autocommit mode: every read sees everything
+    committed before it started, and writes open their transactions
+    explicitly (see SQLiteBackend._write).
+    """
+
+    def __init__(self, path, size=WELLNESS_DB_POOL_SIZE):
+        self._idle = queue.LifoQueue()
+        self._connections = []
+        for _ in range(max(size, 1)):
+            conn = sqlite3.connect(
+                path, check_same_thread=False, cached_statements=64,
+                timeout=DB_BUSY_TIMEOUT, isolation_level=None,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: durable across application crashes, only the last
+            # transactions can be lost on power failure
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections.append(conn)
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+
+
+class SessionStateBackend(StorageBackend):
+    """Records in st.session_state lists; one Streamlit session is one user.
+
+    Alongside each list, ``record_ids`` maps ids to records, and
+    ``id_counters`` holds the next id per kind (saved with the session
+    snapshot, so ids stay unique across restarts).
+    """
+
+    def _list(self, kind):
+        key = KINDS[kind]
+        if key not in st.session_state:
+            st.session_state[key] = []
+        return st.session_state[key]
+
+    def _ids(self, kind):
+        if "record_ids" not in st.session_state:
+            st.session_state.record_ids = {}
+        by_id = st.session_state.record_ids.get(kind)
+        if by_id is None:
+            by_id = st.session_state.record_ids[kind] = {record.get("id"): record for record in self._list(kind)}
+        return by_id
+
+    def _position(self, kind, record):
+        records = self._list(kind)
+        index = bisect_left(records, record["timestamp"], key=_timestamp)
+        while records[index] is not record:
+            index += 1
+        return index
+
+    def append(self, user_id, kind, record):
+        record = as_record(kind, record)
+        self._list(kind).append(record)
+        self._ids(kind)[record.get("id")] = record
+
+    def append_many(self, user_id, kind, records):
+        stored = self._list(kind)
+        records = [as_record(kind, record) for record in records]
+        self._ids(kind).update((record.get("id"), record) for record in records)
+        timestamps = [record["timestamp"] for record in stored[-1:] + records]
+        stored.extend(records)
+        if any(earlier > later for earlier, later in zip(timestamps, timestamps[1:])):
+            # Imported history can predate what is already here
+            stored.sort(key=lambda record: record["timestamp"])
+
+    def records(self, user_id, kind, since=None, limit=None):
+        records = self._list(kind)
+        if since is not None:
+            records = [r for r in records if r["timestamp"] >= since]
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        return records
+
+    def count(self, user_id, kind):
+        return len(self._list(kind))
+
+    def replace_last(self, user_id, kind, record):
+        records = self._list(kind)
+        if records:
+            by_id = self._ids(kind)
+            by_id.pop(records[-1].get("id"), None)
+            records[-1] = as_record(kind, record)
+            by_id[records[-1].get("id")] = records[-1]
+
+    def allocate_ids(self, user_id, kind, count=1):
+        if "id_counters" not in st.session_state:
+            st.session_state.id_counters = {}
+        counters = st.session_state.id_counters
+        if kind not in counters:
+            counters[kind] = max((record.get("id", -1) for record in self._list(kind)), default=-1) + 1
+        first = counters[kind]
+        counters[kind] = first + count
+        return first
+
+    def get(self, user_id, kind, record_id):
+        return self._ids(kind).get(record_id)
+
+    def update(self, user_id, kind, record):
+        record = as_record(kind, record)
+        by_id = self._ids(kind)
+        old = by_id[record.get("id")]
+        self._list(kind)[self._position(kind, old)] = record
+        by_id[record.get("id")] = record
+
+    def delete(self, user_id, kind, record_id):
+        old = self._ids(kind).pop(record_id)
+        del self._list(kind)[self._position(kind, old)]
+
+    def delete_user(self, user_id):
+        for key in KINDS.values():
+            st.session_state[key] = []
+        st.session_state.record_ids = {}
+        # id_counters stay: ids of deleted records are never handed out again
+
+
+class SQLiteBackend(StorageBackend):
+    """Records in one SQLite table, indexed by (user_id, kind, ts).
+
+    The database runs in WAL mode so readers never block the writer. All
+    SQL is fixed text with placeholders, so sqlite3's statement cache
+    reuses the prepared statements. Sessions borrow connections from a
+    ConnectionPool; a user's writes are serialized, within the process by
+    a per-user lock and across processes by SQLite's write lock, and each
+    one commits before returning, so the next read anywhere sees it.
+
+    With a RecordCipher, the data column holds binary AES-GCM envelopes;
+    only the ids, kinds and timestamps needed for indexing stay in clear.
+    The record's own id is kept in the rid column, and the next id per
+    user and kind in id_counters.
+
+    Old records can be archived into the segments table: each row holds up
+    to ARCHIVE_SEGMENT consecutive records as one compressed (and
+    encrypted) blob. Segments never overlap in time, and reads merge them
+    with the live rows, so callers cannot tell which tier a record is in.
+    Looking up, editing or deleting an archived record by id scans the
+    kind's segments, which is fine for the rare edit of an old entry.
+
+    Writes take an optional ``versions``: how many writes the change
+    stands for in the user's version. WriteBehindStore passes the number
+    of writes it merged into one.
+    """
+
+    persistent = True
+
+    _SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            rid INTEGER,
+            data BLOB NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_records_user_kind_ts ON records (user_id, kind, ts)",
+        """
+        CREATE TABLE IF NOT EXISTS segments (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            first_ts TEXT NOT NULL,
+            last_ts TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_segments_user_kind_ts ON segments (user_id, kind, last_ts)",
+        """
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS id_counters (
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            next_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind)
+        )
+        """,
+    )
+    # Created after _migrate, which adds rid to databases that predate it
+    _RID_INDEX = "CREATE INDEX IF NOT EXISTS idx_records_user_kind_rid ON records (user_id, kind, rid)"
+    _INSERT = "INSERT INTO records (user_id, kind, ts, rid, data) VALUES (?, ?, ?, ?, ?)"
+    _SELECT = "SELECT data FROM records WHERE user_id = ? AND kind = ? AND ts >= ? ORDER BY ts, id"
+    _SELECT_LAST = (
+        "SELECT data FROM (SELECT id, ts, data FROM records WHERE user_id = ? AND kind = ? AND ts >= ?"
+        " ORDER BY ts DESC, id DESC LIMIT ?) ORDER BY ts, id"
+    )
+    _SELECT_PAGE = (
+        "SELECT ts, id, data FROM records WHERE user_id = ? AND kind = ? AND (ts, id) > (?, ?)"
+        " ORDER BY ts, id LIMIT ?"
+    )
+    _COUNT = "SELECT COUNT(*) FROM records WHERE user_id = ? AND kind = ?"
+    _UPDATE_LAST = (
+        "UPDATE records SET ts = ?, rid = ?, data = ? WHERE id = (SELECT id FROM records"
+        " WHERE user_id = ? AND kind = ? ORDER BY ts DESC, id DESC LIMIT 1)"
+    )
+    _SELECT_RID = "SELECT data FROM records WHERE user_id = ? AND kind = ? AND rid = ? ORDER BY id LIMIT 1"
+    _UPDATE_RID = (
+        "UPDATE records SET ts = ?, data = ? WHERE id = (SELECT id FROM records"
+        " WHERE user_id = ? AND kind = ? AND rid = ? ORDER BY id LIMIT 1)"
+    )
+    _DELETE_RID = (
+        "DELETE FROM records WHERE id = (SELECT id FROM records"
+        " WHERE user_id = ? AND kind = ? AND rid = ? ORDER BY id LIMIT 1)"
+    )
+    _NEXT_ID = "SELECT next_id FROM id_counters WHERE user_id = ? AND kind = ?"
+    _MAX_RID = "SELECT COALESCE(MAX(rid) + 1, 0) FROM records WHERE user_id = ? AND kind = ?"
+    _SET_NEXT_ID = (
+        "INSERT INTO id_counters (user_id, kind, next_id) VALUES (?, ?, ?)"
+        " ON CONFLICT (user_id, kind) DO UPDATE SET next_id = excluded.next_id"
+    )
+    _DELETE_USER = "DELETE FROM records WHERE user_id = ?"
+    _SELECT_OLD = (
+        "SELECT id, data FROM records WHERE user_id = ? AND kind = ? AND ts < ? AND ts > ?"
+        " ORDER BY ts, id LIMIT ?"
+    )
+    _DELETE_ID = "DELETE FROM records WHERE id = ?"
+    _ARCHIVED_UNTIL = "SELECT COALESCE(MAX(last_ts), '') FROM segments WHERE user_id = ? AND kind = ?"
+    _INSERT_SEGMENT = (
+        "INSERT INTO segments (user_id, kind, first_ts, last_ts, count, data) VALUES (?, ?, ?, ?, ?, ?)"
+    )
+    _SELECT_SEGMENTS = (
+        "SELECT data FROM segments WHERE user_id = ? AND kind = ? AND last_ts >= ? ORDER BY first_ts, id"
+    )
+    _SELECT_SEGMENT_PAGE = (
+        "SELECT first_ts, id, data FROM segments WHERE user_id = ? AND kind = ? AND (first_ts, id) > (?, ?)"
+        " ORDER BY first_ts, id LIMIT 1"
+    )
+    _SELECT_KIND_SEGMENTS = "SELECT id, data FROM segments WHERE user_id = ? AND kind = ? ORDER BY first_ts, id"
+    _UPDATE_SEGMENT = "UPDATE segments SET first_ts = ?, last_ts = ?, count = ?, data = ? WHERE id = ?"
+    _DELETE_SEGMENT = "DELETE FROM segments WHERE id = ?"
+    _COUNT_SEGMENTS = "SELECT COALESCE(SUM(count), 0) FROM segments WHERE user_id = ? AND kind = ?"
+    _DELETE_USER_SEGMENTS = "DELETE FROM segments WHERE user_id = ?"
+    _COUNT_ARCHIVABLE = "SELECT COUNT(*) FROM records WHERE user_id = ? AND kind = ? AND ts < ? AND ts > ?"
+    _BUMP_VERSION = (
+        "INSERT INTO user_versions (user_id, version) VALUES (?, ?)"
+        " ON CONFLICT (user_id) DO UPDATE SET version = version + excluded.version"
+    )
+    _VERSION = "SELECT version FROM user_versions WHERE user_id = ?"
+
+    def __init__(self, path=WELLNESS_DB_PATH, cipher=None, pool_size=WELLNESS_DB_POOL_SIZE):
+        self.path = path
+        self.cipher = cipher
+        self._pool = ConnectionPool(path, pool_size)
+        self._user_locks = [threading.Lock() for _ in range(USER_LOCK_STRIPES)]
+        with self._pool.connection() as conn:
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+            self._migrate(conn)
+            conn.execute(self._RID_INDEX)
+
+    def _migrate(self, conn):
+        """Add and fill the rid column in databases created before it existed"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if "rid" not in {row[1] for row in conn.execute("PRAGMA table_info(records)")}:
+                conn.execute("ALTER TABLE records ADD COLUMN rid INTEGER")
+                updates = []
+                for row_id, user_id, kind, data in conn.execute("SELECT id, user_id, kind, data FROM records"):
+                    for record in self._decode(user_id, kind, [(data,)]):
+                        updates.append((record.get("id"), row_id))
+                conn.executemany("UPDATE records SET rid = ? WHERE id = ?", updates)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _write(self, user_id, apply, bump=1):
+        """Run ``apply(conn)`` in one write transaction for a user, add
+        ``bump`` to the user's version and return the version after it
+        (None when ``bump`` is 0)"""
+        lock = self._user_locks[hash(user_id) % USER_LOCK_STRIPES]
+        with lock, self._pool.connection() as conn:
+            # IMMEDIATE takes the database write lock up front, so writers
+            # in other processes queue here instead of failing mid-way
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                apply(conn)
+                version = None
+                if bump:
+                    conn.execute(self._BUMP_VERSION, (user_id, bump))
+                    version = conn.execute(self._VERSION, (user_id,)).fetchone()[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def version(self, user_id):
+        with self._pool.connection() as conn:
+            row = conn.execute(self._VERSION, (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _row(self, user_id, kind, record, data=None):
+        if data is None:
+            data = (
+                self.cipher.encrypt(user_id, kind, as_dict(record)) if self.cipher
+                else json.dumps(as_dict(record), default=str)
+            )
+        return (user_id, kind, record["timestamp"], record.get("id"), data)
+
+    def _decode(self, user_id, kind, rows):
+        from_dict = RECORD_TYPES[kind].from_dict
+        if self.cipher is None:
+            return [from_dict(json.loads(data)) for data, in rows]
+        try:
+            decoded = self.cipher.decrypt_many(user_id, kind, [data for data, in rows])
+            return [from_dict(record) for record in decoded]
+        except RecordDecryptError:
+            pass
+        # Some row is unreadable: keep the rest rather than failing the page
+        records = []
+        for data, in rows:
+            try:
+                records.append(from_dict(self.cipher.decrypt(user_id, kind, data)))
+            except RecordDecryptError as e:
+                logger.warning("skipping unreadable %s record: %s", kind, e)
+        return records
+
+    def append(self, user_id, kind, record, versions=1):
+        row = self._row(user_id, kind, record)
+        return self._write(user_id, lambda conn: conn.execute(self._INSERT, row), versions)
+
+    def append_many(self, user_id, kind, records, versions=1):
+        if self.cipher is None:
+            rows = [self._row(user_id, kind, record) for record in records]
+        else:
+            envelopes = self.cipher.encrypt_many(user_id, kind, [as_dict(record) for record in records])
+            rows = [self._row(user_id, kind, record, data) for record, data in zip(records, envelopes)]
+        # One transaction for the whole batch
+        return self._write(user_id, lambda conn: conn.executemany(self._INSERT, rows), versions)
+
+    def _encode_segment(self, user_id, kind, records):
+        payload = zlib.compress(json.dumps([as_dict(record) for record in records], default=str).encode())
+        return self.cipher.seal(user_id, f"{kind}/archive", payload) if self.cipher else payload
+
+    def _decode_segment(self, user_id, kind, data):
+        if self.cipher is not None:
+            data = self.cipher.unseal(user_id, f"{kind}/archive", data)
+        from_dict = RECORD_TYPES[kind].from_dict
+        return [from_dict(record) for record in json.loads(zlib.decompress(data))]
+
+    def _archived(self, user_id, kind, since):
+        """Archived records at or after ``since``, oldest first"""
+        with self._pool.connection() as conn:
+            rows = conn.execute(self._SELECT_SEGMENTS, (user_id, kind, since)).fetchall()
+        return [
+            record for data, in rows for record in self._decode_segment(user_id, kind, data)
+            if record["timestamp"] >= since
+        ]
+
+    def records(self, user_id, kind, since=None, limit=None):
+        since = since or ""
+        if limit is not None and limit <= 0:
+            return []
+        with self._pool.connection() as conn:
+            if limit is None:
+                rows = conn.execute(self._SELECT, (user_id, kind, since)).fetchall()
+            else:
+                rows = conn.execute(self._SELECT_LAST, (user_id, kind, since, limit)).fetchall()
+        records = self._decode(user_id, kind, rows)
+        # Archived records only matter if they can be newer than the oldest
+        # live record already returned (always, unless the limit was filled)
+        floor = records[0]["timestamp"] if limit is not None and len(records) >= limit else since
+        archived = self._archived(user_id, kind, floor)
+        if not archived:
+            return records
+        records = list(heapq.merge(archived, records, key=_timestamp))
+        return records if limit is None else records[-limit:]
+
+    def iter_records(self, user_id, kind, batch_size=500):
+        # Segments are disjoint and ordered, so reading them one at a time
+        # and merging with the live rows keeps the whole stream in order
+        return heapq.merge(
+            self._iter_archived(user_id, kind), self._iter_live(user_id, kind, batch_size), key=_timestamp
+        )
+
+    def _iter_archived(self, user_id, kind):
+        after = ("", 0)
+        while True:
+            with self._pool.connection() as conn:
+                row = conn.execute(self._SELECT_SEGMENT_PAGE, (user_id, kind, *after)).fetchone()
+            if row is None:
+                return
+            after = row[:2]
+            yield from self._decode_segment(user_id, kind, row[2])
+
+    def _iter_live(self, user_id, kind, batch_size):
+        # Keyset pagination: each page is its own short query on a pooled
+        # connection, so a long export never holds one for long
+        after = ("", 0)
+        while True:
+            with self._pool.connection() as conn:
+                rows = conn.execute(self._SELECT_PAGE, (user_id, kind, *after, batch_size)).fetchall()
+            if not rows:
+                return
+            after = rows[-1][:2]
+            yield from self._decode(user_id, kind, [(data,) for _, _, data in rows])
+            if len(rows) < batch_size:
+                return
+
+    def count(self, user_id, kind):
+        with self._pool.connection() as conn:
+            live = conn.execute(self._COUNT, (user_id, kind)).fetchone()[0]
+            archived = conn.execute(self._COUNT_SEGMENTS, (user_id, kind)).fetchone()[0]
+        return live + archived
+
+    def replace_last(self, user_id, kind, record, versions=1):
+        _, _, ts, rid, data = self._row(user_id, kind, record)
+        return self._write(
+            user_id, lambda conn: conn.execute(self._UPDATE_LAST, (ts, rid, data, user_id, kind)), versions
+        )
+
+    def allocate_ids(self, user_id, kind, count=1):
+        first = []
+
+        def allocate(conn):
+            row = conn.execute(self._NEXT_ID, (user_id, kind)).fetchone()
+            if row is None:
+                # First allocation for this user and kind: start past every
+                # id already stored (ids used to be record counts)
+                live = conn.execute(self._MAX_RID, (user_id, kind)).fetchone()[0]
+                total = (conn.execute(self._COUNT, (user_id, kind)).fetchone()[0]
+                         + conn.execute(self._COUNT_SEGMENTS, (user_id, kind)).fetchone()[0])
+                row = (max(live, total),)
+            first.append(row[0])
+            conn.execute(self._SET_NEXT_ID, (user_id, kind, row[0] + count))
+
+        # Reserving ids leaves the user's data unchanged: no version bump
+        self._write(user_id, allocate, bump=0)
+        return first[0]
+
+    def _find_archived(self, conn, user_id, kind, record_id):
+        """(segment id, its records, position of the record) or None"""
+        for segment_id, data in conn.execute(self._SELECT_KIND_SEGMENTS, (user_id, kind)).fetchall():
+            records = self._decode_segment(user_id, kind, data)
+            for position, record in enumerate(records):
+                if record.get("id") == record_id:
+                    return segment_id, records, position
+        return None
+
+    def _rewrite_segment(self, conn, user_id, kind, segment_id, records):
+        if not records:
+            conn.execute(self._DELETE_SEGMENT, (segment_id,))
+            return
+        conn.execute(self._UPDATE_SEGMENT, (
+            records[0]["timestamp"], records[-1]["timestamp"], len(records),
+            self._encode_segment(user_id, kind, records), segment_id,
+        ))
+
+    def get(self, user_id, kind, record_id):
+        with self._pool.connection() as conn:
+            rows = conn.execute(self._SELECT_RID, (user_id, kind, record_id)).fetchall()
+            if rows:
+                records = self._decode(user_id, kind, rows)
+                return records[0] if records else None
+            found = self._find_archived(conn, user_id, kind, record_id)
+        return found[1][found[2]] if found else None
+
+    def update(self, user_id, kind, record, versions=1):
+        _, _, ts, rid, data = self._row(user_id, kind, record)
+
+        def update(conn):
+            if conn.execute(self._UPDATE_RID, (ts, data, user_id, kind, rid)).rowcount:
+                return
+            found = self._find_archived(conn, user_id, kind, rid)
+            if found is None:
+                raise KeyError(rid)
+            segment_id, records, position = found
+            records[position] = as_record(kind, record)
+            self._rewrite_segment(conn, user_id, kind, segment_id, records)
+
+        return self._write(user_id, update, versions)
+
+    def delete(self, user_id, kind, record_id, versions=1):
+        def delete(conn):
+            if conn.execute(self._DELETE_RID, (user_id, kind, record_id)).rowcount:
+                return
+            found = self._find_archived(conn, user_id, kind, record_id)
+            if found is None:
+                raise KeyError(record_id)
+            segment_id, records, position = found
+            del records[position]
+            self._rewrite_segment(conn, user_id, kind, segment_id, records)
+
+        return self._write(user_id, delete, versions)
+
+    def delete_user(self, user_id, versions=1):
+        def delete(conn):
+            conn.execute(self._DELETE_USER, (user_id,))
+            conn.execute(self._DELETE_USER_SEGMENTS, (user_id,))
+            # id_counters rows stay: ids of deleted records are never
+            # handed out again
+
+        version = self._write(user_id, delete, versions)
+        if self.cipher is not None:
+            self.cipher.forget(user_id)
+        return version
+
+    def _archivable(self, user_id, kind, before):
+        with self._pool.connection() as conn:
+            archived_until = conn.execute(self._ARCHIVED_UNTIL, (user_id, kind)).fetchone()[0]
+            return conn.execute(self._COUNT_ARCHIVABLE, (user_id, kind, before, archived_until)).fetchone()[0]
+
+    def archive(self, user_id, before, segment_size=ARCHIVE_SEGMENT):
+        # Only whole segments, and only records newer than the last segment,
+        # so segments stay full-sized and never overlap. Records back-dated
+        # behind the archive (e.g. by an import) simply stay live. Moving
+        # records leaves the user's data unchanged, so no version bump.
+        moved = 0
+        for kind in KINDS:
+            while self._archivable(user_id, kind, before) >= segment_size:
+                segment = []
+
+                def move(conn):
+                    archived_until = conn.execute(self._ARCHIVED_UNTIL, (user_id, kind)).fetchone()[0]
+                    rows = conn.execute(
+                        self._SELECT_OLD, (user_id, kind, before, archived_until, segment_size)
+                    ).fetchall()
+                    if len(rows) < segment_size:
+                        return
+                    records = self._decode(user_id, kind, [(data,) for _, data in rows])
+                    if len(records) != len(rows):
+                        # Leave unreadable rows where they are rather than lose them
+                        return
+                    conn.execute(self._INSERT_SEGMENT, (
+                        user_id, kind, records[0]["timestamp"], records[-1]["timestamp"], len(records),
+                        self._encode_segment(user_id, kind, records),
+                    ))
+                    conn.executemany(self._DELETE_ID, [(row_id,) for row_id, _ in rows])
+                    segment.extend(records)
+
+                self._write(user_id, move, bump=0)
+                if not segment:
+                    break
+                moved += len(segment)
+        return moved
+
+    def sync(self, user_id=None):
+        # Commits under synchronous=NORMAL reach the WAL without an fsync; a
+        # checkpoint fsyncs the WAL, then copies it into the database
+        with self._pool.connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        self._pool.close()
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Process-wide storage backend selected by WELLNESS_STORAGE"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if WELLNESS_STORAGE == "sqlite":
+                _storage = SQLiteBackend(WELLNESS_DB_PATH, cipher=RecordCipher(load_master_key()))
+                if WELLNESS_WRITE_BEHIND:
+                    _storage = WriteBehindStore(_storage)
+                    # Flush and sync whatever is still queued on shutdown
+                    atexit.register(_storage.close)
+            elif WELLNESS_STORAGE == "session":
+                _storage = SessionStateBackend()
+            else:
+                raise ValueError(f"Unknown WELLNESS_STORAGE: {WELLNESS_STORAGE}")
+        return _storage
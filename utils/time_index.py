@@ -0,0 +1,176 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import datetime
+
+
+def to_epoch(value):
+    """Epoch seconds for an ISO timestamp string or a datetime"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+
+class RecordView(Sequence):
+    """Read-only window onto a TimeIndex's records, without copying them.
+
+    A view stays valid until the next write to its index; callers that
+    need to keep results across writes should take ``list(view)``.
+    """
+
+    __slots__ = ("_records", "_lo", "_hi")
+
+    def __init__(self, records, lo, hi):
+        self._records = records
+        self._lo = lo
+        self._hi = hi
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            lo, hi, step = index.indices(len(self))
+            if step == 1:
+                return RecordView(self._records, self._lo + lo, self._lo + max(lo, hi))
+            return [self._records[self._lo + i] for i in range(lo, hi, step)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("RecordView index out of range")
+        return self._records[self._lo + index]
+
+    def __iter__(self):
+        records = self._records
+        for index in range(self._lo, self._hi):
+            yield records[index]
+
+    def __repr__(self):
+        return f"RecordView({len(self)} records)"
+
+
+class TimeIndex:
+    """Records of one kind kept sorted by time, with epoch-second keys.
+
+    Timestamps are parsed once, on insert. Range and last-n queries are two
+    bisects into the key array and return a RecordView over the sorted
+    record list.
+
+    With a ``capacity`` the index is a working set: it holds only the
+    newest ``capacity`` records, dropping the oldest as new ones arrive,
+    and ``total`` counts every record of the kind. ``covers`` and
+    ``covers_last`` tell whether a query can be answered from memory.
+
+    Held records are also mapped by id, for ``get``, ``replace`` and
+    ``remove`` without a scan.
+    """
+
+    def __init__(self, records=(), capacity=None, total=None):
+        self.capacity = capacity
+        self.total = 0
+        self._keys = array("q")
+        self._records = []
+        self._by_id = {}
+        for record in records:
+            self.add(record)
+        if total is not None:
+            self.total = total
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def complete(self):
+        """True when every record of the kind is held"""
+        return len(self._records) == self.total
+
+    def covers(self, start=None):
+        """True if all records at or after ``start`` are held"""
+        if self.complete:
+            return True
+        return start is not None and bool(self._keys) and to_epoch(start) > self._keys[0]
+
+    def covers_last(self, n):
+        return n <= len(self._records) or self.complete
+
+    def add(self, record):
+        """Insert a record in time order; True if it is now the newest"""
+        key = to_epoch(record["timestamp"])
+        complete = self.complete
+        self.total += 1
+        if not self._keys or key >= self._keys[-1]:
+            self._keys.append(key)
+            self._records.append(record)
+            self._by_id[record.get("id")] = record
+            self._trim()
+            return True
+        if not complete and key < self._keys[0]:
+            # Older than the working set: it lives in storage only
+            return False
+        index = bisect_right(self._keys, key)
+        self._keys.insert(index, key)
+        self._records.insert(index, record)
+        self._by_id[record.get("id")] = record
+        self._trim()
+        return False
+
+    def _trim(self):
+        excess = len(self._records) - self.capacity if self.capacity is not None else 0
+        if excess > 0:
+            for record in self._records[:excess]:
+                if self._by_id.get(record.get("id")) is record:
+                    del self._by_id[record.get("id")]
+            del self._keys[:excess]
+            del self._records[:excess]
+
+    def replace_last(self, record):
+        """Swap the newest record for an updated copy with the same timestamp"""
+        if self._records:
+            self._by_id.pop(self._records[-1].get("id"), None)
+            self._records[-1] = record
+            self._by_id[record.get("id")] = record
+
+    def get(self, record_id):
+        """The held record with this id, or None"""
+        return self._by_id.get(record_id)
+
+    def _position(self, record):
+        key = to_epoch(record["timestamp"])
+        index = bisect_left(self._keys, key)
+        while self._records[index] is not record:
+            index += 1
+        return index
+
+    def replace(self, record):
+        """Swap a held record for an updated copy with the same id and
+        timestamp; False if no record with that id is held"""
+        old = self._by_id.get(record.get("id"))
+        if old is None:
+            return False
+        self._records[self._position(old)] = record
+        self._by_id[record.get("id")] = record
+        return True
+
+    def remove(self, record_id):
+        """Drop a record from the index (held or not) and the total; returns
+        the held record, or None if it was only in storage"""
+        self.total -= 1
+        old = self._by_id.pop(record_id, None)
+        if old is not None:
+            index = self._position(old)
+            del self._keys[index]
+            del self._records[index]
+        return old
+
+    def range(self, start=None, end=None):
+        """Records with start <= timestamp < end; either bound may be None"""
+        lo = 0 if start is None else bisect_left(self._keys, to_epoch(start))
+        hi = len(self._keys) if end is None else bisect_left(self._keys, to_epoch(end))
+        return RecordView(self._records, lo, max(lo, hi))
+
+    def last_n(self, n):
+        total = len(self._records)
+        return RecordView(self._records, max(0, total - max(n, 0)), total)
+
+    def all(self):
+        return RecordView(self._records, 0, len(self._records))
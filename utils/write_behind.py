@@ -0,0 +1,378 @@
+import logging
+import os
+import threading
+import time
+
+from utils.metrics import REGISTRY
+from utils.records import as_record
+
+logger = logging.getLogger(__name__)
+
+# Seconds a queued write waits for more writes to batch and coalesce with
+WRITE_BEHIND_DELAY = float(os.environ.get("WELLNESS_WRITE_BEHIND_DELAY", 0.05))
+# Queued writes (after coalescing) before saves block until the flusher
+# catches up
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get("WELLNESS_WRITE_BEHIND_MAX_PENDING", 1000))
+# Seconds between fsyncs of flushed writes (see StorageBackend.sync)
+WRITE_BEHIND_SYNC_INTERVAL = float(os.environ.get("WELLNESS_WRITE_BEHIND_SYNC_INTERVAL", 1.0))
+# Seconds before retrying writes that failed; doubles with each further
+# failure, up to WRITE_BEHIND_MAX_BACKOFF
+WRITE_BEHIND_RETRY = float(os.environ.get("WELLNESS_WRITE_BEHIND_RETRY", 0.5))
+WRITE_BEHIND_MAX_BACKOFF = 30.0
+
+QUEUE_DEPTH = REGISTRY.gauge("storage_write_queue_depth", "Writes queued for storage and not yet flushed")
+FLUSH_LATENCY = REGISTRY.histogram(
+    "storage_flush_seconds",
+    "Time to flush one user's queued writes to storage",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+FLUSHED = REGISTRY.counter("storage_writes_flushed_total", "Queued writes applied to storage", ("op", "outcome"))
+COALESCED = REGISTRY.counter("storage_writes_coalesced_total", "Writes merged into one already queued")
+BACKPRESSURE = REGISTRY.counter(
+    "storage_write_backpressure_total", "Writes that waited because the write queue was full"
+)
+FAILING_USERS = REGISTRY.gauge(
+    "storage_write_failing_users", "Users whose queued writes failed and are waiting to be retried"
+)
+
+
+class WriteBehindError(RuntimeError):
+    """Queued writes could not be saved yet; they stay queued and are retried"""
+
+
+class _Write:
+    __slots__ = ("op", "kind", "records", "record", "record_id", "logical")
+
+    def __init__(self, op, kind=None, records=None, record=None, record_id=None):
+        self.op = op
+        self.kind = kind
+        self.records = records
+        self.record = record
+        self.record_id = record_id
+        # Writes the caller made that this one stands for, after coalescing
+        self.logical = 1
+
+
+def _coalesce(last, write):
+    """Fold ``write`` into ``last``, the user's newest queued write; False
+    if the two must stay separate writes"""
+    if last.kind != write.kind:
+        return False
+    if last.op == "append":
+        if write.op == "append":
+            last.records.extend(write.records)
+            return True
+        if write.op in ("update", "delete"):
+            record_id = write.record.get("id") if write.op == "update" else write.record_id
+            for index, record in enumerate(last.records):
+                if record.get("id") == record_id:
+                    if write.op == "update":
+                        last.records[index] = write.record
+                    else:
+                        del last.records[index]
+                    return True
+        return False
+    if last.op == write.op == "update":
+        if last.record.get("id") == write.record.get("id"):
+            last.record = write.record
+            return True
+        return False
+    if last.op == write.op == "replace_last":
+        last.record = write.record
+        return True
+    return False
+
+
+class WriteBehindStore:
+    """Write-behind queue in front of a persistent StorageBackend.
+
+    Writes return as soon as they are queued; DataManager has already
+    applied them to its in-memory working set and summaries, so a save
+    costs the UI no I/O. A background thread flushes each user's queued
+    writes every ``delay`` seconds, in order, merging rapid edits first:
+    consecutive appends become one batch insert, and edits or deletes of a
+    record still in the queue are folded into it. Flushed writes are
+    fsynced every ``sync_interval`` seconds.
+
+    Any read first flushes that user's queue, so it sees every earlier
+    write. When ``max_pending`` writes are queued, new writes wait for the
+    flusher (backpressure) instead of growing the queue without bound.
+
+    Writes return None. A merged write still counts every write it stands
+    for in the backend's version, so DataManager's version tracking holds
+    (see StorageBackend).
+
+    A write that fails stays at the head of its user's queue and is retried
+    with exponential backoff (``retry`` seconds, doubling up to
+    WRITE_BEHIND_MAX_BACKOFF). Until it succeeds, reads for that user,
+    and DataManager.refresh through ``version``, raise WriteBehindError,
+    so the failure surfaces instead of the session carrying on as if the
+    write were saved. The exception is an edit or delete of a record that
+    is gone from storage (KeyError), e.g. deleted by another replica:
+    retrying cannot help, so it is logged and dropped, and the versions no
+    longer match, so the next refresh reloads what storage holds.
+    """
+
+    def __init__(self, backend, delay=WRITE_BEHIND_DELAY, max_pending=WRITE_BEHIND_MAX_PENDING,
+                 sync_interval=WRITE_BEHIND_SYNC_INTERVAL, retry=WRITE_BEHIND_RETRY):
+        self.backend = backend
+        self.delay = delay
+        self.max_pending = max_pending
+        self.sync_interval = sync_interval
+        self.retry = retry
+        self._cond = threading.Condition()
+        self._pending = {}  # user_id -> [_Write], oldest first
+        self._busy = set()  # users whose writes are being applied
+        self._depth = 0
+        # Per user whose writes failed: (failures in a row, retry at, error)
+        self._failures = {}
+        self._unsynced = False
+        self._synced_at = time.monotonic()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run, name="storage-write-behind", daemon=True)
+        self._flusher.start()
+
+    @property
+    def persistent(self):
+        return self.backend.persistent
+
+    # ------------------------------------------------------
+    # WRITES
+    # ------------------------------------------------------
+    def _enqueue(self, user_id, write):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            if self._depth >= self.max_pending:
+                BACKPRESSURE.inc()
+                while self._depth >= self.max_pending and not self._closed:
+                    if self._failures:
+                        # Waiting on a flusher that is stuck retrying would
+                        # hang the session
+                        raise WriteBehindError("write queue is full and storage writes are failing")
+                    self._cond.wait()
+            writes = self._pending.setdefault(user_id, [])
+            if write.op == "delete_user":
+                # Everything still queued for the user is about to be deleted
+                write.logical += sum(queued.logical for queued in writes)
+                self._depth -= len(writes)
+                COALESCED.inc(len(writes))
+                writes.clear()
+            elif writes and _coalesce(writes[-1], write):
+                writes[-1].logical += write.logical
+                COALESCED.inc()
+                return
+            writes.append(write)
+            self._depth += 1
+            QUEUE_DEPTH.set(self._depth)
+            self._cond.notify_all()
+
+    def append(self, user_id, kind, record):
+        self._enqueue(user_id, _Write("append", kind, records=[as_record(kind, record)]))
+
+    def append_many(self, user_id, kind, records):
+        self._enqueue(user_id, _Write("append", kind, records=[as_record(kind, record) for record in records]))
+
+    def replace_last(self, user_id, kind, record):
+        self._enqueue(user_id, _Write("replace_last", kind, record=as_record(kind, record)))
+
+    def update(self, user_id, kind, record):
+        self._enqueue(user_id, _Write("update", kind, record=as_record(kind, record)))
+
+    def delete(self, user_id, kind, record_id):
+        self._enqueue(user_id, _Write("delete", kind, record_id=record_id))
+
+    def delete_user(self, user_id):
+        self._enqueue(user_id, _Write("delete_user"))
+
+    # ------------------------------------------------------
+    # READS (and other calls that need the user's writes in place)
+    # ------------------------------------------------------
+    def records(self, user_id, kind, since=None, limit=None):
+        self.flush(user_id)
+        return self.backend.records(user_id, kind, since=since, limit=limit)
+
+    def iter_records(self, user_id, kind, batch_size=500):
+        self.flush(user_id)
+        return self.backend.iter_records(user_id, kind, batch_size)
+
+    def count(self, user_id, kind):
+        self.flush(user_id)
+        return self.backend.count(user_id, kind)
+
+    def get(self, user_id, kind, record_id):
+        self.flush(user_id)
+        return self.backend.get(user_id, kind, record_id)
+
+    def version(self, user_id):
+        self.flush(user_id)
+        return self.backend.version(user_id)
+
+    def allocate_ids(self, user_id, kind, count=1):
+        return self.backend.allocate_ids(user_id, kind, count)
+
+    def archive(self, user_id, before):
+        self.flush(user_id)
+        return self.backend.archive(user_id, before)
+
+    # ------------------------------------------------------
+    # FLUSHING
+    # ------------------------------------------------------
+    def _apply_one(self, user_id, write):
+        backend = self.backend
+        if write.op == "append":
+            # No records left (appended, then deleted before the flush)
+            # still bumps the version for the writes it stands for
+            backend.append_many(user_id, write.kind, write.records, versions=write.logical)
+        elif write.op == "replace_last":
+            backend.replace_last(user_id, write.kind, write.record, versions=write.logical)
+        elif write.op == "update":
+            backend.update(user_id, write.kind, write.record, versions=write.logical)
+        elif write.op == "delete":
+            backend.delete(user_id, write.kind, write.record_id, versions=write.logical)
+        else:
+            backend.delete_user(user_id, versions=write.logical)
+
+    def _apply(self, user_id, writes):
+        """Apply writes in order; returns how many are done with, and the
+        error that stopped the rest (None if all were applied)"""
+        for done, write in enumerate(writes):
+            try:
+                self._apply_one(user_id, write)
+            except KeyError:
+                logger.warning("dropping queued %s write: the record is no longer in storage", write.op)
+                FLUSHED.inc(op=write.op, outcome="dropped")
+                continue
+            except Exception as e:
+                FLUSHED.inc(op=write.op, outcome="error")
+                return done, e
+            FLUSHED.inc(op=write.op, outcome="ok")
+        return len(writes), None
+
+    def _due(self, user_id, now):
+        failure = self._failures.get(user_id)
+        return failure is None or failure[1] <= now
+
+    def _flush_user(self, user_id, wait_backoff=False):
+        """Apply the user's queued writes; raises WriteBehindError if some
+        failed. With ``wait_backoff``, skip a user still backing off."""
+        with self._cond:
+            # Wait out a flush of this user already under way, so writes
+            # are applied in the order they were made
+            while user_id in self._busy:
+                self._cond.wait()
+            if wait_backoff and not self._due(user_id, time.monotonic()):
+                return
+            writes = self._pending.pop(user_id, None)
+            if not writes:
+                return
+            self._busy.add(user_id)
+        started = time.perf_counter()
+        done, error = 0, None
+        try:
+            done, error = self._apply(user_id, writes)
+        finally:
+            FLUSH_LATENCY.observe(time.perf_counter() - started)
+            with self._cond:
+                self._busy.discard(user_id)
+                if done < len(writes):
+                    # Keep the rest queued, ahead of anything written since
+                    self._pending[user_id] = writes[done:] + self._pending.get(user_id, [])
+                    failures = self._failures.get(user_id, (0,))[0] + 1
+                    backoff = min(self.retry * 2 ** (failures - 1), WRITE_BEHIND_MAX_BACKOFF)
+                    self._failures[user_id] = (failures, time.monotonic() + backoff, error)
+                else:
+                    self._failures.pop(user_id, None)
+                FAILING_USERS.set(len(self._failures))
+                self._depth -= done
+                if done:
+                    self._unsynced = True
+                QUEUE_DEPTH.set(self._depth)
+                self._cond.notify_all()
+        if error is not None:
+            logger.warning("saving queued writes failed (%d in a row), retrying in %.1fs: %s",
+                           failures, backoff, error)
+            raise WriteBehindError(f"{len(writes) - done} queued writes could not be saved yet: {error}") from error
+
+    def flush(self, user_id=None):
+        """Apply queued writes now: one user's, or everyone's. Raises
+        WriteBehindError if some could not be saved; they stay queued."""
+        if user_id is not None:
+            self._flush_user(user_id)
+            return
+        errors = {}
+        while True:
+            with self._cond:
+                users = [queued_user for queued_user in self._pending if queued_user not in errors]
+            if not users:
+                break
+            for queued_user in users:
+                try:
+                    self._flush_user(queued_user)
+                except WriteBehindError as e:
+                    errors[queued_user] = e
+        if errors:
+            raise next(iter(errors.values()))
+
+    def _sync_backend(self):
+        with self._cond:
+            self._unsynced = False
+            self._synced_at = time.monotonic()
+        self.backend.sync()
+
+    def sync(self, user_id=None):
+        """Flush (one user's or all) queued writes and make them durable"""
+        self.flush(user_id)
+        self._sync_backend()
+
+    def _next_due(self, now):
+        """Seconds until some queued user is due a flush (0: now), or None
+        if nothing is queued outside a flush already under way"""
+        waits = [
+            max(0.0, self._failures[user_id][1] - now) if user_id in self._failures else 0.0
+            for user_id in self._pending if user_id not in self._busy
+        ]
+        return min(waits) if waits else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    wait = self._next_due(time.monotonic())
+                    if wait == 0.0:
+                        break
+                    if not self._cond.wait(timeout=self.sync_interval if wait is None
+                                           else min(wait, self.sync_interval)):
+                        break
+                if self._closed:
+                    return
+                now = time.monotonic()
+                users = [user_id for user_id in self._pending
+                         if user_id not in self._busy and self._due(user_id, now)]
+            if users:
+                time.sleep(self.delay)  # let rapid edits pile up and coalesce
+                for user_id in users:
+                    try:
+                        self._flush_user(user_id, wait_backoff=True)
+                    except WriteBehindError:
+                        pass  # logged; stays queued for the next retry
+            if self._unsynced and time.monotonic() - self._synced_at >= self.sync_interval:
+                try:
+                    self._sync_backend()
+                except Exception:
+                    logger.exception("periodic storage sync failed")
+
+    def close(self):
+        """Stop the flusher, then flush and sync everything still queued"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        try:
+            self.sync()
+        except WriteBehindError:
+            logger.error("closing with %d queued writes that could not be saved", self._depth)
+        finally:
+            self.backend.close()